@@ -1,8 +1,48 @@
-from openai_utils import llm_call
+from openai_utils import llm_call, llm_call_async
+
+
 def response_aggregator(llm_model, question, responses):
     """Aggregates the responses from the subquestions to generate the final response.
     """
     print("-------> ⭐ Aggregating responses...")
+    system_prompt, user_prompt = aggregator_prompts(question, responses)
+
+    response, cost = llm_call(model=llm_model, system_prompt=system_prompt, user_prompt=user_prompt)
+    answer = response.choices[0].message.content
+    # answer = response.generated_text
+
+    return answer, cost
+
+
+async def response_aggregator_async(llm_model, question, responses):
+    """response_aggregator with the LLM call made through llm_call_async."""
+    print("-------> ⭐ Aggregating responses...")
+    system_prompt, user_prompt = aggregator_prompts(question, responses)
+
+    response, cost = await llm_call_async(model=llm_model, system_prompt=system_prompt, user_prompt=user_prompt)
+    answer = response.choices[0].message.content
+    return answer, cost
+
+
+def response_aggregator_stream(llm_model, question, responses):
+    """
+    Streaming response_aggregator: returns an LLMStream that yields the final
+    answer's tokens as they arrive; its .cost is set once it is exhausted.
+    """
+    print("-------> ⭐ Aggregating responses (streaming)...")
+    system_prompt, user_prompt = aggregator_prompts(question, responses)
+    return llm_call(model=llm_model, system_prompt=system_prompt, user_prompt=user_prompt, stream=True)
+
+
+async def response_aggregator_stream_async(llm_model, question, responses):
+    """response_aggregator_stream on the async client; returns an AsyncLLMStream."""
+    print("-------> ⭐ Aggregating responses (streaming)...")
+    system_prompt, user_prompt = aggregator_prompts(question, responses)
+    return await llm_call_async(model=llm_model, system_prompt=system_prompt, user_prompt=user_prompt, stream=True)
+
+
+def aggregator_prompts(question, responses):
+    """(system_prompt, user_prompt) asking the LLM to merge the sub-question answers."""
     system_prompt = """You are an assistant for question-answering tasks.
                 Use the following pieces of retrieved context to answer the question.
                 If you don't know the answer, just say that you don't know.
@@ -15,9 +55,4 @@ def response_aggregator(llm_model, question, responses):
     user_prompt = f"""Question: {question}
                       Context: {context}
                       Answer:"""
-
-    response, cost = llm_call(model=llm_model, system_prompt=system_prompt, user_prompt=user_prompt)
-    answer = response.choices[0].message.content
-    # answer = response.generated_text
-
-    return answer, cost
\ No newline at end of file
+    return system_prompt, user_prompt
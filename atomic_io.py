@@ -0,0 +1,31 @@
+"""
+Atomic file replacement for the files of the embedding store.
+
+A running server memory-maps embeddings.npy and reads the index files while
+ingestion may be rewriting them. Writing in place (truncate + write) can
+leave a reader with half a file, or crash it with SIGBUS when a mapped file
+shrinks. atomic_write writes to a temporary file in the same directory and
+os.replace()s it over the target: readers see the old file or the new one,
+and a process that still maps the old file keeps its (now unlinked) copy.
+"""
+import contextlib
+import os
+import tempfile
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="w", encoding=None):
+    """Open a temporary file for writing that replaces `path` when the block exits without error."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,323 @@
+# benchmark_ingestion.py
+"""
+Ingestion-side benchmarks over synthetic Lever-style postings.
+
+    python benchmark_ingestion.py transform --sizes 1000 5000 --workers 1 2 4 8
+    python benchmark_ingestion.py load --sizes 100 1000 10000
+    python benchmark_ingestion.py embed --postings 1000 --batch-sizes 32 64 128 --workers 1 2 4
+    python benchmark_ingestion.py filters --postings 500
+
+The `transform` benchmark generates N posting dicts shaped like the Lever
+postings API returns them (HTML description, closing text and list sections)
+and times palentir_jobs.load_palantir_job_postings: HTML cleaning, chunking
+and one CSV per posting, written to a scratch directory. Each worker count
+is checked to produce exactly the rows of the serial run, in the same order.
+
+The `load` benchmark times getting N postings into the all_jobs table, the
+way generate_unified_vector_store does it (vector_store.load_all_jobs):
+  - per-posting: load_palantir_job_postings (one CSV per posting) and one
+    LOAD CSV per file
+  - bulk: bulk_load_palantir_job_postings (one consolidated CSV) and a
+    single LOAD CSV
+The CSV stage is timed on its own; the LOAD stage needs EvaDB and is
+skipped if it isn't installed. Embedding all_jobs_features is the same in
+both paths and not included.
+
+The `embed` benchmark chunks N synthetic postings and encodes the chunks
+with embeddings.embed_corpus (needs sentence-transformers), in input order
+and bucketed by length, for each batch size and number of encoder
+processes, reporting chunks/s. Every run is checked against the first one.
+
+The `filters` check builds a metadata_index.MetadataIndex from the real
+chunk rows of N synthetic postings, both the in-memory rows of
+chunk_text_and_attach_metadata and the ALL_JOBS CSV written by
+bulk_load_palantir_job_postings, and verifies that every department, level,
+workplace-type and city filter returns exactly the rows of the postings
+that carry it. It exits non-zero on any mismatch.
+"""
+import argparse
+import csv
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmark_retrieval import (
+    SYNTHETIC_DEPARTMENTS,
+    SYNTHETIC_LEVELS,
+    SYNTHETIC_LOCATIONS,
+    SYNTHETIC_TITLES,
+    SYNTHETIC_WORDS,
+    SYNTHETIC_WORKPLACES,
+)
+
+LIST_HEADINGS = ["Core Responsibilities", "What We Value", "What We Require", "Benefits"]
+
+
+def _sentences(rng, n, words=(8, 20)):
+    return " ".join(
+        " ".join(rng.choice(SYNTHETIC_WORDS) for _ in range(rng.randint(*words))).capitalize() + "."
+        for _ in range(n)
+    )
+
+
+def synthetic_postings(n_postings, seed=0):
+    """n_postings raw posting dicts in the Lever API format scrape_palantir_jobs returns."""
+    rng = random.Random(seed)
+    postings = []
+    for i in range(n_postings):
+        title = rng.choice(SYNTHETIC_TITLES)
+        location = rng.choice(SYNTHETIC_LOCATIONS)
+        lists = [
+            {
+                "text": heading,
+                "content": "".join(f"<li>{_sentences(rng, 1)}</li>" for _ in range(rng.randint(3, 8))),
+            }
+            for heading in rng.sample(LIST_HEADINGS, rng.randint(2, len(LIST_HEADINGS)))
+        ]
+        postings.append({
+            "id": f"{i:08x}-0000-4000-8000-{rng.getrandbits(48):012x}",
+            "text": title,
+            "country": "US",
+            "workplaceType": rng.choice(SYNTHETIC_WORKPLACES),
+            "categories": {
+                "commitment": "Full-time",
+                "department": rng.choice(SYNTHETIC_DEPARTMENTS),
+                "level": rng.choice(SYNTHETIC_LEVELS),
+                "location": location,
+                "team": "Dev",
+                "allLocations": rng.sample(SYNTHETIC_LOCATIONS, 2),
+            },
+            "tags": rng.sample(SYNTHETIC_WORDS, 3),
+            "content": {
+                "descriptionHtml": "".join(
+                    f"<div><b>{title}</b></div><div>{_sentences(rng, rng.randint(3, 6))}</div><div><br></div>"
+                    for _ in range(rng.randint(2, 4))
+                ),
+                "closingHtml": f"<div>{_sentences(rng, 2)}</div>",
+                "lists": lists,
+            },
+        })
+    return postings
+
+
+def _read_csvs(doc_names):
+    contents = []
+    for doc in doc_names:
+        with open(f"data/palantir_careers/{doc}.csv", encoding="utf-8") as f:
+            contents.append(f.read())
+    return contents
+
+
+def bench_transform(sizes, workers_list, chunksize):
+    from palentir_jobs import load_palantir_job_postings
+
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="bench_ingestion_")
+    try:
+        os.chdir(scratch)
+        print(f"{'postings':>9}  {'workers':>7}  {'seconds':>8}  {'postings/s':>10}  {'speedup':>7}  {'same output':>11}")
+        for n in sizes:
+            postings = synthetic_postings(n)
+            baseline = None
+            for workers in workers_list:
+                shutil.rmtree("data", ignore_errors=True)
+                start = time.perf_counter()
+                doc_names = load_palantir_job_postings(postings, workers=workers, chunksize=chunksize)
+                seconds = time.perf_counter() - start
+                output = _read_csvs(doc_names)
+                if baseline is None:
+                    baseline = (seconds, output)
+                print(
+                    f"{n:>9}  {workers:>7}  {seconds:>8.2f}  {n / seconds:>10.0f}  "
+                    f"{baseline[0] / seconds:>6.2f}x  {str(output == baseline[1]):>11}"
+                )
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _time_load(load_postings, postings, workers, with_evadb):
+    """Seconds to write the CSVs and (with_evadb) LOAD them into a scratch all_jobs table."""
+    shutil.rmtree("data", ignore_errors=True)
+    start = time.perf_counter()
+    doc_names = load_postings(postings, workers=workers)
+    write_seconds = time.perf_counter() - start
+    if not with_evadb:
+        return write_seconds, None
+    import evadb
+    from vector_store import load_all_jobs
+
+    shutil.rmtree("evadb_data", ignore_errors=True)
+    cursor = evadb.connect("evadb_data").cursor()
+    start = time.perf_counter()
+    load_all_jobs(cursor, doc_names)
+    return write_seconds, time.perf_counter() - start
+
+
+def bench_load(sizes, workers):
+    from palentir_jobs import bulk_load_palantir_job_postings, load_palantir_job_postings
+
+    try:
+        import evadb  # noqa: F401
+        with_evadb = True
+    except ImportError:
+        print("evadb is not installed: timing the CSV stage only.")
+        with_evadb = False
+
+    def seconds(value):
+        return f"{value:.2f}" if value is not None else "-"
+
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="bench_ingestion_")
+    try:
+        os.chdir(scratch)
+        print(f"{'postings':>9}  {'path':<12}  {'csv (s)':>8}  {'load (s)':>8}  {'total (s)':>9}  {'speedup':>7}")
+        for n in sizes:
+            postings = synthetic_postings(n)
+            totals = {}
+            for path, load_postings in (("per-posting", load_palantir_job_postings),
+                                        ("bulk", bulk_load_palantir_job_postings)):
+                write_seconds, load_seconds = _time_load(load_postings, postings, workers, with_evadb)
+                totals[path] = write_seconds + (load_seconds or 0.0)
+                speedup = totals["per-posting"] / totals[path]
+                print(
+                    f"{n:>9}  {path:<12}  {seconds(write_seconds):>8}  {seconds(load_seconds):>8}  "
+                    f"{totals[path]:>9.2f}  {speedup:>6.2f}x"
+                )
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def bench_embed(n_postings, batch_sizes, workers_list):
+    import numpy as np
+    from embeddings import embed_corpus, get_embedding_model
+    from palentir_jobs import iter_posting_rows
+
+    texts = [row["data"] for rows in iter_posting_rows(synthetic_postings(n_postings)) for row in rows]
+    words = [len(t.split()) for t in texts]
+    print(f"{len(texts)} chunks from {n_postings} postings, {min(words)}-{max(words)} words each.")
+    get_embedding_model()  # model load is not part of the in-process timings
+
+    print(f"{'ordering':<10}  {'batch':>5}  {'workers':>7}  {'seconds':>8}  {'chunks/s':>9}  {'max |diff|':>10}")
+    reference = None
+    for by_length in (False, True):
+        for batch_size in batch_sizes:
+            for workers in workers_list:
+                start = time.perf_counter()
+                vectors = embed_corpus(texts, batch_size=batch_size, workers=workers, by_length=by_length)
+                seconds = time.perf_counter() - start
+                if reference is None:
+                    reference = vectors
+                print(
+                    f"{'length' if by_length else 'input':<10}  {batch_size:>5}  {workers:>7}  {seconds:>8.2f}  "
+                    f"{len(texts) / seconds:>9.1f}  {float(np.abs(vectors - reference).max()):>10.2e}"
+                )
+
+
+def _check_filters(index, source, postings, rows_per_posting):
+    """Print one line per filter value and return the number of mismatches."""
+    import numpy as np
+    from metadata_index import normalize_term
+
+    starts = np.cumsum([0] + rows_per_posting)
+
+    def rows_of(keep):
+        return np.concatenate([
+            np.arange(starts[i], starts[i + 1]) for i, posting in enumerate(postings) if keep(posting)
+        ] + [np.zeros(0, dtype=np.int64)])
+
+    checks = []
+    for column, values, field in (
+        ("department", SYNTHETIC_DEPARTMENTS, lambda p: p["categories"]["department"]),
+        ("level", SYNTHETIC_LEVELS, lambda p: p["categories"]["level"]),
+        ("workplace_type", SYNTHETIC_WORKPLACES, lambda p: p["workplaceType"]),
+    ):
+        for value in values:
+            expected = rows_of(lambda p: field(p) == value)
+            checks.append((f"{column}={value}", expected, index.rows_for(column, normalize_term(value))))
+    for location in SYNTHETIC_LOCATIONS:
+        city = location.split(",")[0]
+        if normalize_term(city) in SYNTHETIC_WORKPLACES:
+            continue  # "Remote" is also a workplace type, so the question intersects both
+        expected = rows_of(lambda p: location == p["categories"]["location"]
+                           or location in p["categories"]["allLocations"])
+        matched = index.candidates(f"Which jobs are in {city}?")
+        checks.append((f"in {city}", expected, matched if matched is not None else np.zeros(0)))
+
+    failures = 0
+    for label, expected, matched in checks:
+        ok = np.array_equal(np.sort(expected), np.sort(matched))
+        failures += not ok
+        print(f"{source:<8}  {label:<32}  {len(expected):>8}  {len(matched):>8}  {'ok' if ok else 'MISMATCH':>8}")
+    return failures
+
+
+def check_filters(n_postings):
+    from metadata_index import FILTER_GROUPS, MetadataIndex
+    from palentir_jobs import BULK_DOC_NAME, bulk_load_palantir_job_postings, iter_posting_rows
+
+    postings = synthetic_postings(n_postings)
+    columns_needed = [col for cols in FILTER_GROUPS.values() for col in cols]
+    posting_rows = list(iter_posting_rows(postings, workers=1))
+    rows_per_posting = [len(rows) for rows in posting_rows]
+    in_memory = {col: [row[col] for rows in posting_rows for row in rows] for col in columns_needed}
+
+    cwd = os.getcwd()
+    scratch = tempfile.mkdtemp(prefix="bench_ingestion_")
+    try:
+        os.chdir(scratch)
+        bulk_load_palantir_job_postings(postings, workers=1)
+        with open(f"data/palantir_careers/{BULK_DOC_NAME}.csv", newline="", encoding="utf-8") as f:
+            csv_rows = list(csv.DictReader(f))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(scratch, ignore_errors=True)
+    from_csv = {col: [row[col] for row in csv_rows] for col in columns_needed}
+
+    print(f"{'source':<8}  {'filter':<32}  {'expected':>8}  {'matched':>8}  {'result':>8}")
+    failures = 0
+    for source, columns in (("memory", in_memory), ("csv", from_csv)):
+        failures += _check_filters(MetadataIndex.build(columns), source, postings, rows_per_posting)
+    if failures:
+        raise SystemExit(f"{failures} metadata filters do not match their postings.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p_transform = sub.add_parser("transform", help="serial vs process-pool HTML cleaning + chunking + CSV writes")
+    p_transform.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000])
+    p_transform.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1],
+                             help="worker counts to compare; the first one is the baseline")
+    p_transform.add_argument("--chunksize", type=int, default=0, help="postings per task (0: automatic)")
+
+    p_load = sub.add_parser("load", help="one CSV + LOAD per posting vs one consolidated CSV + one LOAD")
+    p_load.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    p_load.add_argument("--workers", type=int, default=1, help="transform worker processes (0: one per core)")
+
+    p_embed = sub.add_parser("embed", help="chunks/s of embed_corpus across batch sizes, length bucketing and workers")
+    p_embed.add_argument("--postings", type=int, default=1000)
+    p_embed.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 64, 128])
+    p_embed.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1],
+                         help="encoder processes (pool start-up and model loads are included)")
+
+    p_filters = sub.add_parser("filters", help="check MetadataIndex filters against real chunk rows")
+    p_filters.add_argument("--postings", type=int, default=500)
+
+    args = parser.parse_args()
+    if args.benchmark == "transform":
+        bench_transform(args.sizes, list(dict.fromkeys(args.workers)), args.chunksize)
+    elif args.benchmark == "load":
+        bench_load(args.sizes, args.workers)
+    elif args.benchmark == "embed":
+        bench_embed(args.postings, args.batch_sizes, list(dict.fromkeys(args.workers)))
+    elif args.benchmark == "filters":
+        check_filters(args.postings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# benchmark_job_fetcher.py
+"""
+Exercise job_fetcher.JobBoardFetcher against a local stand-in of a Lever
+postings API: paged JSON with an offset cursor, ETag / Last-Modified on
+every page, 304 for conditional requests that match, and a fixed latency
+per request. No network access is needed.
+
+    python benchmark_job_fetcher.py --postings 1000 --page-size 50 --latency 0.05
+
+Runs these scenarios and prints the wall time, requests received by the
+stand-in, how many were answered 304, the bytes sent and the postings
+returned:
+  - uncached:          no cache, every page downloaded (the old scraper, paginated)
+  - cold:              empty cache, fills it
+  - unchanged:         nothing changed since the cold walk (every page revalidated, 304s)
+  - unchanged (first): the same, with JOB_FETCH_REVALIDATE=first (one conditional request)
+  - edited (first):    one posting on the last page edited, first-page revalidation
+                       (misses the edit)
+  - edited (all):      the same, with the default revalidation of every page
+  - new posting:       a posting added at the top of the board
+"""
+import argparse
+import email.utils
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmark_ingestion import synthetic_postings
+
+
+class StandInBoard:
+    def __init__(self, postings, page_size, latency):
+        self.postings = postings
+        self.page_size = page_size
+        self.latency = latency
+        self.modified_at = time.time()
+        self.received = 0
+        self.not_modified = 0
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+
+    def page(self, offset):
+        """Page body after the posting that the offset cursor [createdAt, id] names."""
+        start = 0
+        if offset:
+            _, after_id = json.loads(offset)
+            start = next((i + 1 for i, p in enumerate(self.postings) if p["id"] == after_id), len(self.postings))
+        items = self.postings[start:start + self.page_size]
+        payload = {"data": items, "hasNext": start + self.page_size < len(self.postings)}
+        if payload["hasNext"]:
+            payload["next"] = json.dumps([items[-1]["createdAt"], items[-1]["id"]])
+        return json.dumps(payload).encode("utf-8")
+
+    def update(self, postings):
+        with self._lock:
+            self.postings = postings
+            self.modified_at = time.time() + 1  # HTTP dates have whole-second resolution
+
+    def reset_counts(self):
+        with self._lock:
+            self.received = 0
+            self.not_modified = 0
+            self.sent_bytes = 0
+
+
+def make_handler(board):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so the client's connection pool matters
+
+        def do_GET(self):
+            time.sleep(board.latency)
+            offset = parse_qs(urlsplit(self.path).query).get("offset", [None])[0]
+            body = board.page(offset)
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            with board._lock:
+                board.received += 1
+                if self.headers.get("If-None-Match") == etag:
+                    board.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                board.sent_bytes += len(body)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", email.utils.formatdate(board.modified_at, usegmt=True))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def run_scenario(name, board, url, **fetcher_kwargs):
+    from job_fetcher import JobBoardFetcher
+
+    board.reset_counts()
+    start = time.perf_counter()
+    with JobBoardFetcher(**fetcher_kwargs) as fetcher:
+        postings = fetcher.walk(url)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>17}  {elapsed:>9.3f}  {board.received:>8}  {board.not_modified:>5}  "
+        f"{board.sent_bytes:>10}  {len(postings):>8}"
+    )
+    return postings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--postings", type=int, default=1000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="stand-in response time in seconds")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    postings = synthetic_postings(args.postings)
+    for i, posting in enumerate(postings):
+        posting["createdAt"] = 1_700_000_000_000 - i * 1000  # newest first, like the real board
+    board = StandInBoard(postings, args.page_size, args.latency)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(board))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/lever/v1/postings?state=published"
+
+    from job_fetcher import HTTPResponseCache
+
+    cache_dir = tempfile.mkdtemp(prefix="bench_job_fetcher_")
+    cache = HTTPResponseCache(os.path.join(cache_dir, "cache.sqlite"))
+    print(f"{'scenario':>17}  {'wall (s)':>9}  {'requests':>8}  {'304s':>5}  {'bytes sent':>10}  {'postings':>8}")
+
+    run_scenario("uncached", board, url, cache=False, workers=args.workers)
+    run_scenario("cold", board, url, cache=cache, workers=args.workers)
+    run_scenario("unchanged", board, url, cache=cache, workers=args.workers)
+    run_scenario("unchanged (first)", board, url, cache=cache, workers=args.workers, revalidate="first")
+
+    edited = [dict(p) for p in board.postings]
+    edited[-1]["text"] += " (updated)"
+    board.update(edited)
+    fetched = run_scenario("edited (first)", board, url, cache=cache, workers=args.workers, revalidate="first")
+    print(f"{'':>17}  sees the edit: {fetched[-1]['text'] == edited[-1]['text']}")
+    fetched = run_scenario("edited (all)", board, url, cache=cache, workers=args.workers)
+    print(f"{'':>17}  sees the edit: {fetched[-1]['text'] == edited[-1]['text']}")
+
+    new_posting = dict(edited[0], id="new-posting", createdAt=edited[0]["createdAt"] + 1000)
+    board.update([new_posting] + edited)
+    fetched = run_scenario("new posting", board, url, cache=cache, workers=args.workers)
+    print(f"{'':>17}  sees it: {fetched[0]['id'] == 'new-posting'}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
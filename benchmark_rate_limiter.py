@@ -0,0 +1,154 @@
+# benchmark_rate_limiter.py
+"""
+Exercise the OpenAI layer's rate limiter and request coalescing against a
+local stub server that answers chat completions and returns 429 (with a
+Retry-After header) once more than --limit requests arrive in a --window
+second window. No API key or network access is needed.
+
+    python benchmark_rate_limiter.py --requests 60 --workers 16 --limit 10 --window 2
+
+Runs three scenarios and prints, for each, the wall time, how many requests
+the stub received, how many of those it rejected with a 429, and how many
+calls still failed after all retries:
+  - no limiter:  client-side limits off; workers find the limit via 429s
+  - limiter:     OPENAI_RPM set to the stub's limit; requests queue locally
+  - coalescing:  every worker asks the same question at once; identical
+                 in-flight requests share one call
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    def __init__(self, limit, window, latency):
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.received = 0
+        self.rejected = 0
+        self._accepted_at = []
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """Return 0 to serve the request, or the Retry-After seconds of a 429."""
+        with self._lock:
+            now = time.monotonic()
+            self.received += 1
+            self._accepted_at = [t for t in self._accepted_at if now - t < self.window]
+            if len(self._accepted_at) >= self.limit:
+                self.rejected += 1
+                return self.window - (now - self._accepted_at[0])
+            self._accepted_at.append(now)
+            return 0
+
+    def reset(self):
+        with self._lock:
+            self.received = 0
+            self.rejected = 0
+            self._accepted_at = []
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            retry_after = state.admit()
+            if retry_after:
+                payload = {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+                self._send(429, payload, {"retry-after-ms": str(int(retry_after * 1000))})
+                return
+            time.sleep(state.latency)
+            self._send(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "stub answer"},
+                }],
+                "usage": {"prompt_tokens": 50, "completion_tokens": 5, "total_tokens": 55},
+            })
+
+        def _send(self, status, payload, headers=None):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def run_scenario(name, state, prompts, workers):
+    import openai_utils
+
+    def ask(prompt):
+        try:
+            openai_utils.llm_call("gpt-3.5-turbo", user_prompt=prompt, use_cache=False)
+            return True
+        except Exception:
+            return False
+
+    state.reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        failed = sum(not ok for ok in pool.map(ask, prompts))
+    elapsed = time.perf_counter() - start
+    print(f"{name:>12}  {len(prompts):>8}  {elapsed:>9.2f}  {state.received:>8}  {state.rejected:>8}  {failed:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=10, help="requests the stub accepts per window")
+    parser.add_argument("--window", type=float, default=2.0, help="stub rate-limit window in seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response time in seconds")
+    args = parser.parse_args()
+
+    state = StubState(args.limit, args.window, args.latency)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # openai_utils builds its clients from these on the first call
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["LLM_CACHE"] = "0"
+    import openai_utils
+    from rate_limiter import RateLimiter
+
+    prompts = [f"question {i}" for i in range(args.requests)]
+    rpm = args.limit * 60 / args.window
+    print(f"{'scenario':>12}  {'requests':>8}  {'wall (s)':>9}  {'received':>8}  {'429s':>8}  {'failed':>6}")
+
+    openai_utils.rate_limiter = RateLimiter(0, 0)
+    run_scenario("no limiter", state, prompts, args.workers)
+
+    # The stub counts a sliding window, so a bucket with a full window of burst
+    # allowance could admit twice the limit in one window; send evenly paced.
+    openai_utils.rate_limiter = RateLimiter(rpm, 0)
+    openai_utils.rate_limiter.requests.capacity = openai_utils.rate_limiter.requests.level = 1
+    run_scenario("limiter", state, prompts, args.workers)
+    print(f"{'':>12}  limiter stats: {openai_utils.rate_limiter.stats()}")
+
+    openai_utils.rate_limiter = RateLimiter(rpm, 0)
+    run_scenario("coalescing", state, ["the same question"] * args.workers, args.workers)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
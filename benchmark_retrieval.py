@@ -0,0 +1,410 @@
+# benchmark_retrieval.py
+"""
+Query-latency benchmarks for the retrieval paths over a synthetic corpus.
+
+    python benchmark_retrieval.py evadb --sizes 1000 10000 100000
+    python benchmark_retrieval.py matrix --sizes 1000 10000 100000
+    python benchmark_retrieval.py hybrid --sizes 1000 10000 100000
+    python benchmark_retrieval.py quantization --sizes 10000 100000
+    python benchmark_retrieval.py ivf --sizes 100000 --nprobe 1 2 4 8 16 32 64
+
+The `evadb` benchmark loads N synthetic chunks into a scratch EvaDB database,
+builds all_jobs_features + all_jobs_index exactly like
+vector_store.generate_unified_vector_store, and times:
+  - old: ORDER BY Similarity(SentenceFeatureExtractor('q'), SentenceFeatureExtractor(data))
+         (re-encodes every chunk for every question)
+  - new: vector_store.similarity_search_query (query embedded once, FAISS index scan)
+
+The `matrix` benchmark needs no EvaDB or encoder: it fills an EmbeddingStore
+with synthetic unit vectors and times store load (server startup) and
+top-k search + row gathering (per query).
+
+The `hybrid` benchmark plants a unique exact term (think "TS/SCI" or a job
+code) in random chunks and asks for it with a query whose embedding is only
+loosely related to the target chunk. It reports recall@k and latency for
+dense-only, BM25-only and hybrid (RRF) retrieval.
+
+The `quantization` benchmark compares scanning the float32 matrix with
+scanning a float16 / int8 copy plus exact float32 rescoring: resident
+matrix memory, recall@k against the exact float32 top-k, and latency.
+
+The `ivf` benchmark builds an IVF index over the synthetic matrix and sweeps
+nprobe, reporting recall@10 against the exact scan and per-query latency.
+The curve is written to a CSV (--out) and, if matplotlib is installed,
+plotted next to it as a PNG.
+"""
+import argparse
+import csv
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+SYNTHETIC_TITLES = [
+    "Forward Deployed Software Engineer", "Deployment Strategist", "Data Scientist",
+    "Product Designer", "Infrastructure Engineer", "Security Engineer",
+    "Technical Program Manager", "Software Engineer, New Grad", "Recruiter",
+]
+SYNTHETIC_LOCATIONS = [
+    "Palo Alto, CA", "New York, NY", "London, United Kingdom", "Washington, D.C.",
+    "Denver, CO", "Seattle, WA", "Tokyo, Japan", "Remote",
+]
+SYNTHETIC_DEPARTMENTS = ["Engineering", "Business Development", "Design", "Operations"]
+SYNTHETIC_LEVELS = ["Intern", "New Grad", "Mid", "Senior", "Lead"]
+SYNTHETIC_WORKPLACES = ["onsite", "hybrid", "remote"]
+SYNTHETIC_WORDS = (
+    "build deploy data platform customers mission critical software teams pipelines "
+    "analytics security clearance TS/SCI government commercial healthcare ontology "
+    "integrate models production scale infrastructure design interfaces operators "
+    "partner problems field travel collaborate engineers strategists salary benefits"
+).split()
+
+BENCHMARK_QUESTIONS = [
+    "Base Salary for a Data Scientist Position?",
+    "What are the software engineering roles available right now?",
+    "Which are the different jobs available in Palo Alto?",
+    "Are there hybrid job opportunities available?",
+]
+
+
+def synthetic_chunk_rows(n_chunks, chunks_per_job=6, seed=0):
+    """
+    Generate n_chunks row dicts with the all_jobs schema.
+    Every `chunks_per_job` consecutive rows share one job_id, like the
+    output of palentir_jobs.chunk_text_and_attach_metadata.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_chunks):
+        job_no = i // chunks_per_job
+        job_rng = random.Random(seed * 1_000_003 + job_no)
+        title = job_rng.choice(SYNTHETIC_TITLES)
+        location = job_rng.choice(SYNTHETIC_LOCATIONS)
+        rows.append({
+            "doc_name": f"PALANTIR_JOBS_{job_no + 1}",
+            "job_id": f"job-{job_no:07d}",
+            "job_title": title,
+            "commitment": "Full-time",
+            "department": job_rng.choice(SYNTHETIC_DEPARTMENTS),
+            "team": "Dev",
+            "level": job_rng.choice(SYNTHETIC_LEVELS),
+            "location": location,
+            "all_locations": location,
+            "country": "US",
+            "workplace_type": job_rng.choice(SYNTHETIC_WORKPLACES),
+            "tags": "",
+            "description": f"{title} in {location}.",
+            "bullet_sections": "",
+            "closing_text": "",
+            "chunk_id": i % chunks_per_job,
+            "data": f"JOB TITLE: {title} LOCATION: {location} "
+                    + " ".join(rng.choice(SYNTHETIC_WORDS) for _ in range(60)),
+        })
+    return rows
+
+
+def synthetic_embeddings(n_chunks, dim=384, chunks_per_job=6, n_topics=64, seed=0):
+    """
+    Unit vectors with some structure: chunks of one job sit near the job's
+    vector, and jobs sit near one of n_topics topic centres.
+    """
+    import numpy as np
+    from embeddings import normalize_rows
+
+    rng = np.random.default_rng(seed)
+    n_jobs = -(-n_chunks // chunks_per_job)
+    topics = rng.standard_normal((n_topics, dim), dtype=np.float32)
+    jobs = topics[rng.integers(0, n_topics, n_jobs)] + 0.5 * rng.standard_normal((n_jobs, dim), dtype=np.float32)
+    chunks = jobs[np.arange(n_chunks) // chunks_per_job] + 0.3 * rng.standard_normal((n_chunks, dim), dtype=np.float32)
+    return normalize_rows(chunks)
+
+
+def synthetic_queries(corpus, n_queries, noise=1.0, seed=1):
+    """Queries that are copies of random corpus rows plus noise of norm ~`noise`."""
+    import numpy as np
+    from embeddings import normalize_rows
+
+    rng = np.random.default_rng(seed)
+    picks = corpus[rng.integers(0, len(corpus), n_queries)]
+    jitter = rng.standard_normal(picks.shape, dtype=np.float32) / np.sqrt(corpus.shape[1])
+    return normalize_rows(picks + noise * jitter)
+
+
+def synthetic_queries_for(corpus, rows, noise, seed=1):
+    """Like synthetic_queries, but for the given corpus rows (in order)."""
+    import numpy as np
+    from embeddings import normalize_rows
+
+    rng = np.random.default_rng(seed)
+    picks = corpus[rows]
+    jitter = rng.standard_normal(picks.shape, dtype=np.float32) / np.sqrt(corpus.shape[1])
+    return normalize_rows(picks + noise * jitter)
+
+
+def synthetic_store(n_chunks, dim=384, seed=0):
+    from embedding_store import EmbeddingStore
+
+    rows = synthetic_chunk_rows(n_chunks, seed=seed)
+    columns = {c: [r[c] for r in rows] for c in rows[0]}
+    return EmbeddingStore(synthetic_embeddings(n_chunks, dim=dim, seed=seed), columns)
+
+
+def _time_queries(cursor, queries, repeat):
+    timings = []
+    for _ in range(repeat):
+        for q in queries:
+            start = time.perf_counter()
+            cursor.query(q).df()
+            timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _old_path_query(question, k):
+    from vector_store import ALL_JOBS_COLUMNS
+
+    # The pre-index query shape: every chunk is re-encoded for each question.
+    select_list = ", ".join(ALL_JOBS_COLUMNS)
+    return f"""
+        SELECT {select_list}
+        FROM all_jobs_features
+        ORDER BY Similarity(
+            SentenceFeatureExtractor('{question.replace("'", "''")}'),
+            SentenceFeatureExtractor(data)
+        )
+        LIMIT {k};
+    """
+
+
+def bench_evadb(sizes, k, repeat, skip_old_above):
+    import evadb
+    from vector_store import ALL_JOBS_COLUMNS, generate_unified_vector_store, similarity_search_query
+
+    print(f"{'chunks':>8}  {'old p50 (s)':>12}  {'new p50 (s)':>12}  {'speedup':>8}")
+    for n in sizes:
+        workdir = tempfile.mkdtemp(prefix="bench_retrieval_")
+        cwd = os.getcwd()
+        try:
+            # generate_unified_vector_store reads data/palantir_careers/<doc>.csv
+            os.chdir(workdir)
+            os.makedirs("data/palantir_careers", exist_ok=True)
+            rows = synthetic_chunk_rows(n)
+            with open("data/palantir_careers/BENCH.csv", "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+                writer.writeheader()
+                writer.writerows(rows)
+
+            cursor = evadb.connect(os.path.join(workdir, "evadb_data")).cursor()
+            generate_unified_vector_store(cursor, ["BENCH"])
+
+            new_queries = [similarity_search_query(q, ALL_JOBS_COLUMNS, k) for q in BENCHMARK_QUESTIONS]
+            new_p50 = statistics.median(_time_queries(cursor, new_queries, repeat))
+
+            if skip_old_above and n > skip_old_above:
+                print(f"{n:>8}  {'skipped':>12}  {new_p50:>12.4f}  {'-':>8}")
+                continue
+            old_queries = [_old_path_query(q, k) for q in BENCHMARK_QUESTIONS]
+            old_p50 = statistics.median(_time_queries(cursor, old_queries, repeat))
+            print(f"{n:>8}  {old_p50:>12.4f}  {new_p50:>12.4f}  {old_p50 / new_p50:>7.1f}x")
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_matrix(sizes, k, n_queries):
+    import numpy as np
+    from embedding_store import EmbeddingStore
+
+    print(f"{'chunks':>8}  {'load (ms)':>10}  {'search p50 (ms)':>16}  {'search+rows p50 (ms)':>21}")
+    for n in sizes:
+        workdir = tempfile.mkdtemp(prefix="bench_matrix_")
+        try:
+            synthetic_store(n).save(workdir)
+
+            start = time.perf_counter()
+            store = EmbeddingStore.load(workdir)
+            load_ms = (time.perf_counter() - start) * 1000
+
+            queries = synthetic_queries(np.asarray(store.embeddings), n_queries)
+            search_ms, total_ms = [], []
+            for q in queries:
+                start = time.perf_counter()
+                indices, scores = store.search(q, k)
+                search_ms.append((time.perf_counter() - start) * 1000)
+                store.rows(indices, scores)
+                total_ms.append((time.perf_counter() - start) * 1000)
+            print(f"{n:>8}  {load_ms:>10.1f}  {statistics.median(search_ms):>16.3f}  {statistics.median(total_ms):>21.3f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_hybrid(sizes, k, n_queries, dense_noise):
+    import numpy as np
+    from embedding_store import EmbeddingStore
+    from keyword_index import BM25Index
+
+    print(f"{'chunks':>8}  {'mode':>7}  {'recall@k':>9}  {'p50 (ms)':>9}")
+    for n in sizes:
+        store = synthetic_store(n)
+        rng = np.random.default_rng(7)
+        targets = rng.choice(n, size=n_queries, replace=False)
+        texts = list(store.columns["data"])
+        for t in targets:
+            texts[t] = f"{texts[t]} requires clearance code{t}x"
+        store = EmbeddingStore(store.embeddings, {**store.columns, "data": texts},
+                               keyword_index=BM25Index.build(texts))
+
+        query_texts = [f"Which roles need clearance code{t}x?" for t in targets]
+        query_vectors = synthetic_queries_for(store.embeddings, targets, dense_noise)
+
+        runs = {
+            "dense": lambda qv, qt: store.search(qv, k)[0],
+            "bm25": lambda qv, qt: store.keyword_index.search(qt, k)[0],
+            "hybrid": lambda qv, qt: store.hybrid_search(qv, qt, k)[0],
+        }
+        for mode, run in runs.items():
+            hits, timings = 0, []
+            for target, qv, qt in zip(targets, query_vectors, query_texts):
+                start = time.perf_counter()
+                rows = run(qv, qt)
+                timings.append((time.perf_counter() - start) * 1000)
+                hits += int(target in rows)
+            print(f"{n:>8}  {mode:>7}  {hits / n_queries:>9.2f}  {statistics.median(timings):>9.3f}")
+
+
+def bench_quantization(sizes, k, n_queries, rescore_depth):
+    print(f"{'chunks':>8}  {'storage':>8}  {'matrix MB':>10}  {'recall@k':>9}  {'p50 (ms)':>9}")
+    for n in sizes:
+        store = synthetic_store(n)
+        queries = synthetic_queries(store.embeddings, n_queries)
+        exact = [set(store.search(q, k)[0].tolist()) for q in queries]
+
+        for dtype in ("none", "float16", "int8"):
+            compact = store.quantize(dtype, rescore_depth=rescore_depth)
+            resident = store.embeddings.nbytes if compact is None else compact.nbytes
+            hits, timings = 0, []
+            for q, truth in zip(queries, exact):
+                start = time.perf_counter()
+                rows, _ = store.search(q, k)
+                timings.append((time.perf_counter() - start) * 1000)
+                hits += len(truth & set(rows.tolist()))
+            label = "float32" if dtype == "none" else dtype
+            print(f"{n:>8}  {label:>8}  {resident / 2**20:>10.1f}  "
+                  f"{hits / (k * n_queries):>9.3f}  {statistics.median(timings):>9.3f}")
+
+
+def bench_ivf(sizes, k, n_queries, n_lists, nprobes, out):
+    records = []
+    print(f"{'chunks':>8}  {'nlist':>6}  {'nprobe':>7}  {'recall@k':>9}  {'p50 (ms)':>9}")
+    for n in sizes:
+        store = synthetic_store(n)
+        queries = synthetic_queries(store.embeddings, n_queries)
+
+        exact, timings = [], []
+        for q in queries:
+            start = time.perf_counter()
+            rows, _ = store.search(q, k)
+            timings.append((time.perf_counter() - start) * 1000)
+            exact.append(set(rows.tolist()))
+        exact_p50 = statistics.median(timings)
+        print(f"{n:>8}  {'-':>6}  {'exact':>7}  {1.0:>9.3f}  {exact_p50:>9.3f}")
+        records.append({"chunks": n, "nlist": 0, "nprobe": 0, "recall": 1.0, "p50_ms": exact_p50})
+
+        start = time.perf_counter()
+        ivf = store.build_ivf(n_lists=n_lists)
+        print(f"{'':>8}  built {ivf.n_lists} cells in {time.perf_counter() - start:.1f} s")
+        for nprobe in nprobes:
+            store.nprobe = nprobe
+            hits, timings = 0, []
+            for q, truth in zip(queries, exact):
+                start = time.perf_counter()
+                rows, _ = store.search(q, k)
+                timings.append((time.perf_counter() - start) * 1000)
+                hits += len(truth & set(rows.tolist()))
+            recall, p50 = hits / (k * n_queries), statistics.median(timings)
+            print(f"{n:>8}  {ivf.n_lists:>6}  {nprobe:>7}  {recall:>9.3f}  {p50:>9.3f}")
+            records.append({"chunks": n, "nlist": ivf.n_lists, "nprobe": nprobe, "recall": recall, "p50_ms": p50})
+        store.nprobe = 0
+
+    with open(out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(records[0].keys()))
+        writer.writeheader()
+        writer.writerows(records)
+    print(f"Wrote {out}")
+
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib not installed; skipping the plot.")
+        return
+    fig, ax = plt.subplots()
+    for n in sizes:
+        curve = [r for r in records if r["chunks"] == n and r["nprobe"] > 0]
+        exact_ms = next(r["p50_ms"] for r in records if r["chunks"] == n and r["nprobe"] == 0)
+        line, = ax.plot([r["p50_ms"] for r in curve], [r["recall"] for r in curve], marker="o", label=f"IVF, {n} chunks")
+        ax.scatter([exact_ms], [1.0], marker="*", s=120, color=line.get_color(), label=f"exact, {n} chunks")
+    ax.set_xlabel("p50 latency per query (ms)")
+    ax.set_ylabel(f"recall@{k}")
+    ax.legend()
+    png = os.path.splitext(out)[0] + ".png"
+    fig.savefig(png, dpi=120)
+    print(f"Wrote {png}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    p_evadb = sub.add_parser("evadb", help="old full-scan query vs FAISS index query in EvaDB")
+    p_evadb.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    p_evadb.add_argument("--k", type=int, default=3)
+    p_evadb.add_argument("--repeat", type=int, default=3)
+    p_evadb.add_argument(
+        "--skip-old-above", type=int, default=0,
+        help="skip the (very slow) old path for corpora larger than this; 0 = never skip",
+    )
+
+    p_matrix = sub.add_parser("matrix", help="in-process EmbeddingStore load + top-k latency")
+    p_matrix.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    p_matrix.add_argument("--k", type=int, default=3)
+    p_matrix.add_argument("--queries", type=int, default=200)
+
+    p_hybrid = sub.add_parser("hybrid", help="recall@k + latency of dense vs BM25 vs hybrid (RRF)")
+    p_hybrid.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    p_hybrid.add_argument("--k", type=int, default=3)
+    p_hybrid.add_argument("--queries", type=int, default=100)
+    p_hybrid.add_argument("--dense-noise", type=float, default=4.0,
+                          help="how far the query embedding drifts from the target chunk")
+
+    p_quant = sub.add_parser("quantization", help="float32 vs float16 / int8 + rescoring: memory, recall@k, latency")
+    p_quant.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    p_quant.add_argument("--k", type=int, default=10)
+    p_quant.add_argument("--queries", type=int, default=100)
+    p_quant.add_argument("--rescore-depth", type=int, default=200)
+
+    p_ivf = sub.add_parser("ivf", help="IVF recall@k vs latency across nprobe, against the exact scan")
+    p_ivf.add_argument("--sizes", type=int, nargs="+", default=[100000])
+    p_ivf.add_argument("--k", type=int, default=10)
+    p_ivf.add_argument("--queries", type=int, default=100)
+    p_ivf.add_argument("--nlist", type=int, default=None, help="IVF cells; default 4 * sqrt(chunks)")
+    p_ivf.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    p_ivf.add_argument("--out", default="ivf_recall_latency.csv")
+
+    args = parser.parse_args()
+    if args.benchmark == "evadb":
+        bench_evadb(args.sizes, args.k, args.repeat, args.skip_old_above)
+    elif args.benchmark == "matrix":
+        bench_matrix(args.sizes, args.k, args.queries)
+    elif args.benchmark == "hybrid":
+        bench_hybrid(args.sizes, args.k, args.queries, args.dense_noise)
+    elif args.benchmark == "quantization":
+        bench_quantization(args.sizes, args.k, args.queries, args.rescore_depth)
+    elif args.benchmark == "ivf":
+        bench_ivf(args.sizes, args.k, args.queries, args.nlist, args.nprobe, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmark_server_load.py
+"""
+Synthetic load against a running server's /ask_question endpoint. Start the
+server on the fake LLM backend to load-test it offline, with no API key or
+bill (see llm_backends.py for the FAKE_LLM_* latency / token settings):
+
+    LLM_BACKEND=fake RETRIEVAL_BACKEND=matrix uvicorn server:app --port 8000
+    python benchmark_server_load.py --url http://127.0.0.1:8000 --requests 200 --concurrency 16
+
+Each of --concurrency workers posts questions back to back (cycling through
+a fixed question set, so runs are comparable) and the script prints the
+throughput, latency percentiles and errors; the server's /metrics has the
+per-stage breakdown.
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+QUESTIONS = [
+    "I'm looking for senior engineering roles in London. What do you have?",
+    "What are the responsibilities for a Data Scientist role?",
+    "Which roles are fully remote and what do they require?",
+    "What does a Forward Deployed Engineer do day to day?",
+    "Summarize the internship positions offered in the US.",
+    "Are there any product design roles in New York?",
+    "What qualifications do Deployment Strategist postings ask for?",
+    "Which teams are hiring in Denver and what levels are open?",
+]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def ask(url, question, k, timeout):
+    body = json.dumps({"question": question, "k": k}).encode("utf-8")
+    request = urllib.request.Request(
+        url.rstrip("/") + "/ask_question", data=body, headers={"Content-Type": "application/json"}
+    )
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        payload = json.loads(response.read())
+    return time.perf_counter() - start, payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(i):
+        try:
+            latency, payload = ask(args.url, QUESTIONS[i % len(QUESTIONS)], args.k, args.timeout)
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+            return
+        with lock:
+            if isinstance(payload, dict) and "error" in payload:
+                errors.append(payload["error"])
+            else:
+                latencies.append(latency)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    print(f"requests     {args.requests} ({args.concurrency} concurrent)")
+    print(f"wall (s)     {elapsed:.2f}")
+    print(f"throughput   {len(latencies) / elapsed:.2f} req/s")
+    print(f"latency (s)  p50 {percentile(latencies, 50):.3f}  p95 {percentile(latencies, 95):.3f}  "
+          f"p99 {percentile(latencies, 99):.3f}  max {max(latencies, default=float('nan')):.3f}")
+    print(f"errors       {len(errors)}" + (f"  (first: {errors[0]})" if errors else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Token-budgeted packing of retrieved chunks into an LLM prompt.
+
+Every retrieved row carries its chunk text plus the job-level fields
+(description, bullet sections, closing text) of the posting it came from,
+and those are repeated for every chunk of the same job. Instead of pasting
+everything, the packer counts tokens (with the cached tiktoken encoder) and
+fills a per-model budget greedily, most relevant first:
+
+  1. metadata + chunk text of each row, in relevance order;
+  2. the job-level fields of each row's posting, in relevance order.
+
+Fields are never cut in the middle; a field that doesn't fit is left out.
+Job-level fields already included for an earlier chunk of the same job, and
+texts identical to one already included (e.g. the shared closing text), are
+dropped as redundant.
+"""
+import logging
+import os
+
+from openai_utils import get_context_length, get_num_tokens_simple, truncate_to_tokens
+
+# Tokens kept free for the model's answer.
+CONTEXT_ANSWER_TOKENS = int(os.getenv("CONTEXT_ANSWER_TOKENS", "512"))
+# Cap on context tokens even when the model's window allows more (0 = no cap).
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+
+# (section label, column) of the per-job fields, in prompt order.
+JOB_FIELDS = [
+    ("DESCRIPTION", "description"),
+    ("BULLET SECTIONS", "bullet_sections"),
+    ("CLOSING TEXT", "closing_text"),
+]
+
+CHUNK_SEPARATOR = "\n---\n"
+
+logger = logging.getLogger(__name__)
+
+
+def context_budget(model, prompt_tokens, max_tokens=CONTEXT_MAX_TOKENS, answer_tokens=CONTEXT_ANSWER_TOKENS):
+    """Tokens available for context once the rest of the prompt and the answer are accounted for."""
+    budget = get_context_length(model) - prompt_tokens - answer_tokens
+    if max_tokens > 0:
+        budget = min(budget, max_tokens)
+    return max(budget, 0)
+
+
+def metadata_header(row):
+    return f"""[METADATA]
+Source Doc: {row["doc_name"]}
+Job Title: {row["job_title"]}
+Department: {row["department"]}
+Location: {row["location"]}
+Workplace Type: {row["workplace_type"]}
+Tags: {row["tags"]}
+"""
+
+
+def _is_empty(value):
+    return value is None or (isinstance(value, float) and value != value) or not str(value).strip()
+
+
+def pack_chunks(res_batch, model, budget):
+    """
+    Pack the retrieved rows (a dataframe, best first) into at most `budget`
+    tokens. Returns (context, stats).
+    """
+    def count(text):
+        return get_num_tokens_simple(model, text)
+
+    separator_tokens = count(CHUNK_SEPARATOR)
+    blocks = []  # [(row, {section label: text})] in relevance order
+    seen_texts = set()
+    used = 0
+    dropped_rows = 0
+
+    # 1) Metadata + chunk text of each row
+    for i in range(len(res_batch)):
+        row = res_batch.iloc[i]
+        chunk = str(row["data"])
+        if chunk in seen_texts:
+            continue
+        header = metadata_header(row)
+        sections = {"METADATA": header, "CHUNK DATA": f"[CHUNK DATA]\n{chunk}\n"}
+        cost = count(header) + count(sections["CHUNK DATA"]) + (separator_tokens if blocks else 0)
+        if used + cost > budget:
+            if blocks:
+                dropped_rows += 1
+                continue
+            # Not even the best chunk fits: keep as much of it as we can
+            room = budget - count(header) - count("[CHUNK DATA]\n")
+            sections["CHUNK DATA"] = f"[CHUNK DATA]\n{truncate_to_tokens(model, chunk, room)}\n"
+            cost = count(header) + count(sections["CHUNK DATA"])
+        seen_texts.add(chunk)
+        blocks.append((row, sections))
+        used += cost
+
+    # 2) Job-level fields, skipping the ones another chunk of the job already brought
+    dropped_fields = 0
+    included_jobs = set()
+    for row, sections in blocks:
+        job_id = row["job_id"]
+        for label, column in JOB_FIELDS:
+            value = row[column]
+            if (job_id, column) in included_jobs or _is_empty(value) or str(value) in seen_texts:
+                continue
+            text = f"[{label}]\n{value}\n"
+            cost = count(text)
+            if used + cost > budget:
+                dropped_fields += 1
+                continue
+            sections[label] = text
+            seen_texts.add(str(value))
+            included_jobs.add((job_id, column))
+            used += cost
+
+    order = ["METADATA"] + [label for label, _ in JOB_FIELDS] + ["CHUNK DATA"]
+    context = CHUNK_SEPARATOR.join(
+        "\n".join(sections[label] for label in order if label in sections) for _, sections in blocks
+    )
+    stats = {
+        "tokens": used,
+        "budget": budget,
+        "rows": len(blocks),
+        "dropped_rows": dropped_rows,
+        "dropped_fields": dropped_fields,
+    }
+    logger.info(f"Packed context: {stats}")
+    return context, stats
+
+
+def pack_text(text, model, budget):
+    """Keep whole lines of text, in order, while they fit in `budget` tokens."""
+    kept, used = [], 0
+    for line in str(text).split("\n"):
+        cost = get_num_tokens_simple(model, line + "\n")
+        if used + cost > budget:
+            if not kept:
+                kept.append(truncate_to_tokens(model, line, budget))
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
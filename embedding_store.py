@@ -0,0 +1,402 @@
+"""
+In-process retrieval engine over the all_jobs_features embeddings.
+
+All chunk embeddings live in one contiguous float32 matrix, persisted as a
+memory-mapped `.npy` next to the EvaDB data. The row metadata is held
+column-wise (one array per all_jobs column, row i of every column belongs to
+row i of the matrix). A top-k query is a single matrix-vector product
+followed by argpartition; no SQL parse/execute/.df() round trip is needed.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from atomic_io import atomic_write
+from embeddings import normalize_rows
+from metadata_index import MetadataIndex
+from keyword_index import BM25Index, reciprocal_rank_fusion
+from ivf_index import IVFIndex
+from quantization import QUANTIZATIONS, QuantizedMatrix
+
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.json"
+# Rewritten with a new token every time the index is rebuilt, so other
+# processes (e.g. a running server) can tell their caches are stale.
+INDEX_VERSION_FILE = "index_version"
+DEFAULT_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "./evadb_data/all_jobs_matrix")
+
+# "evadb": SQL query against all_jobs_features + FAISS index.
+# "matrix": in-process EmbeddingStore (this module).
+RETRIEVAL_BACKENDS = ("evadb", "matrix")
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "evadb")
+
+# "dense": embedding similarity only. "hybrid": BM25 + dense fused with
+# reciprocal rank fusion (matrix backend only).
+RETRIEVAL_MODES = ("dense", "hybrid")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+
+# How many candidates each leg of a hybrid search contributes to the fusion.
+HYBRID_DEPTH = int(os.getenv("HYBRID_DEPTH", "50"))
+
+# Collapse results so top-k holds k distinct postings (each scored by its best
+# chunk) instead of several chunks of the same job.
+RETRIEVAL_DISTINCT_JOBS = os.getenv("RETRIEVAL_DISTINCT_JOBS", "1") == "1"
+
+# Scan a float16 / int8 copy of the matrix instead of the float32 one, then
+# rescore the best EMBEDDING_RESCORE_DEPTH candidates exactly in float32.
+EMBEDDING_QUANTIZATION = os.getenv("EMBEDDING_QUANTIZATION", "none")
+EMBEDDING_RESCORE_DEPTH = int(os.getenv("EMBEDDING_RESCORE_DEPTH", "200"))
+
+# Number of IVF cells an unfiltered search visits; 0 scans every row (exact).
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "0"))
+
+logger = logging.getLogger(__name__)
+
+
+def top_k_groups(groups, scores, k, num_groups):
+    """
+    Group-by top-k: score each group (job) by its best element (chunk) and
+    return the positions of the best element of the k best groups, best first.
+    groups and scores are parallel arrays; groups holds codes in [0, num_groups).
+    """
+    if len(scores) == 0 or k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    best = np.full(num_groups, -np.inf, dtype=np.float32)
+    np.maximum.at(best, groups, scores)
+    present = np.flatnonzero(best > -np.inf)
+    k = min(k, len(present))
+    top_groups = present[np.argpartition(-best[present], k - 1)[:k]]
+    positions = np.flatnonzero(np.isin(groups, top_groups) & (scores >= best[groups]))
+    # Ties inside a group: keep the first position only
+    _, first = np.unique(groups[positions], return_index=True)
+    positions = positions[first]
+    return positions[np.argsort(-scores[positions], kind="stable")]
+
+
+class EmbeddingStore:
+    def __init__(self, embeddings, columns, metadata_index=None, keyword_index=None, ivf_index=None):
+        """
+        embeddings: (n, dim) float32 matrix with unit-length rows.
+        columns: dict of column name -> sequence of length n.
+        metadata_index: optional MetadataIndex over the same rows, for pre-filtering.
+        keyword_index: optional BM25Index over the same rows, for hybrid search.
+        ivf_index: optional IVFIndex over the same rows, for approximate search.
+        """
+        self.embeddings = embeddings
+        self.metadata_index = metadata_index
+        self.keyword_index = keyword_index
+        self.ivf_index = ivf_index
+        self.nprobe = IVF_NPROBE
+        # Optional QuantizedMatrix that search() scans before exact rescoring
+        self.compact = None
+        self.rescore_depth = EMBEDDING_RESCORE_DEPTH
+        self.columns = {name: np.asarray(values, dtype=object) for name, values in columns.items()}
+        for name, values in self.columns.items():
+            if len(values) != len(embeddings):
+                raise ValueError(
+                    f"Column '{name}' has {len(values)} rows but there are {len(embeddings)} embeddings."
+                )
+        # Integer job code per row, for collapsing chunks of the same posting
+        job_ids = self.columns.get("job_id", np.arange(len(embeddings)))
+        _, self.job_codes = np.unique(np.asarray(job_ids).astype(str), return_inverse=True)
+        self.num_jobs = int(self.job_codes.max()) + 1 if len(self.job_codes) else 0
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    @classmethod
+    def from_dataframe(cls, df, features_column, columns):
+        """Build a store from an all_jobs_features dataframe (one embedding per row)."""
+        embeddings = np.vstack(
+            [np.asarray(f, dtype=np.float32).reshape(-1) for f in df[features_column]]
+        ) if len(df) else np.zeros((0, 0), dtype=np.float32)
+        return cls(normalize_rows(embeddings), {c: df[c].tolist() for c in columns})
+
+    def save(self, store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+        # Replaced, not rewritten: a running server may have the old matrix memory-mapped
+        with atomic_write(os.path.join(store_dir, EMBEDDINGS_FILE), "wb") as f:
+            np.save(f, np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        with atomic_write(os.path.join(store_dir, METADATA_FILE), encoding="utf-8") as f:
+            json.dump({name: values.tolist() for name, values in self.columns.items()}, f, default=str)
+
+    @classmethod
+    def load(cls, store_dir, mmap=True, quantization=EMBEDDING_QUANTIZATION):
+        """
+        Open a saved store. With mmap=True the matrix is paged in lazily by the OS.
+        quantization="float16"/"int8" keeps only a compact copy in memory for
+        scanning; the float32 rows are read from the memory map for rescoring.
+        """
+        embeddings = np.load(os.path.join(store_dir, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+        with open(os.path.join(store_dir, METADATA_FILE), encoding="utf-8") as f:
+            columns = json.load(f)
+        metadata_index = MetadataIndex.load(store_dir) if MetadataIndex.exists(store_dir) else None
+        keyword_index = BM25Index.load(store_dir) if BM25Index.exists(store_dir) else None
+        ivf_index = IVFIndex.load(store_dir) if IVFIndex.exists(store_dir) else None
+        store = cls(embeddings, columns, metadata_index, keyword_index, ivf_index)
+        if quantization != "none":
+            if QuantizedMatrix.exists(store_dir, quantization):
+                store.compact = QuantizedMatrix.load(store_dir, quantization)
+            else:
+                store.quantize(quantization)
+        return store
+
+    def quantize(self, dtype, rescore_depth=None):
+        """Attach a float16/int8 copy of the matrix for search ("none" detaches it)."""
+        if dtype not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {dtype}")
+        self.compact = None if dtype == "none" else QuantizedMatrix.quantize(self.embeddings, dtype)
+        if rescore_depth is not None:
+            self.rescore_depth = rescore_depth
+        return self.compact
+
+    @property
+    def uses_ivf(self):
+        return self.ivf_index is not None and self.nprobe > 0
+
+    def build_ivf(self, n_lists=None, **kwargs):
+        """Train and attach an IVF index over the current embeddings."""
+        self.ivf_index = IVFIndex.build(self.embeddings, n_lists=n_lists, **kwargs)
+        return self.ivf_index
+
+    def apply_delta(self, columns, reuse_rows, new_embeddings):
+        """
+        Store over an updated set of rows that re-uses the embeddings of this one.
+
+        columns: column name -> sequence of length n, the complete new metadata.
+        reuse_rows: length-n ints; row i keeps the embedding of this store's row
+            reuse_rows[i], or takes the next row of new_embeddings where it is -1.
+        Rows of this store that are not reused are dropped. The IVF index keeps
+        its centroids (new rows join their closest cell); the metadata and BM25
+        indexes are rebuilt from the text, which needs no encoder.
+        """
+        reuse_rows = np.asarray(reuse_rows, dtype=np.int64)
+        new_embeddings = normalize_rows(new_embeddings)
+        if int((reuse_rows < 0).sum()) != len(new_embeddings):
+            raise ValueError(
+                f"{int((reuse_rows < 0).sum())} rows need a new embedding but {len(new_embeddings)} were given."
+            )
+        dim = self.embeddings.shape[1] if len(self.embeddings) else new_embeddings.shape[1]
+        embeddings = np.empty((len(reuse_rows), dim), dtype=np.float32)
+        reused = reuse_rows >= 0
+        embeddings[reused] = self.embeddings[reuse_rows[reused]]
+        embeddings[~reused] = new_embeddings
+        metadata_index = MetadataIndex.build(columns) if self.metadata_index is not None else None
+        keyword_index = BM25Index.build(columns["data"]) if self.keyword_index is not None else None
+        ivf_index = self.ivf_index.updated(reuse_rows, new_embeddings) if self.ivf_index is not None else None
+        store = EmbeddingStore(embeddings, columns, metadata_index, keyword_index, ivf_index)
+        store.nprobe = self.nprobe
+        store.rescore_depth = self.rescore_depth
+        if self.compact is not None and len(store):
+            store.quantize(self.compact.dtype)
+        return store
+
+    def filter_candidates(self, question):
+        """
+        Row ids passing the metadata filters mentioned in the question, or None
+        to search every row (no index, no filter mentioned, or no row survives).
+        """
+        if self.metadata_index is None:
+            return None
+        candidates = self.metadata_index.candidates(question)
+        if candidates is not None and len(candidates) == 0:
+            logger.info(f"No rows match every filter in {question!r}; searching all rows.")
+            return None
+        return candidates
+
+    def search(self, query_vector, k, candidates=None, distinct_jobs=False):
+        """
+        Return (row_indices, scores) of the k rows most similar to query_vector,
+        best first. Scores are cosine similarities.
+        If candidates (sorted row ids) is given, only those rows are scored.
+        Otherwise, with an IVF index and nprobe > 0, only the rows of the
+        nprobe closest cells are scored (approximate).
+        With distinct_jobs=True the k rows are the best chunks of k different jobs.
+        """
+        if len(self) == 0 or k <= 0 or (candidates is not None and len(candidates) == 0):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.asarray(query_vector, dtype=np.float32)
+        if candidates is None and self.uses_ivf:
+            candidates = self.ivf_index.probe(query, self.nprobe)
+        rows = None if candidates is None else np.asarray(candidates, dtype=np.int64)
+        if self.compact is None:
+            matrix = self.embeddings if rows is None else self.embeddings[rows]
+            scores = matrix @ query
+        else:
+            rows, scores = self._rescored_candidates(query, rows, k)
+        if distinct_jobs:
+            return self._collapse_by_job(scores, rows, k)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is None:
+            return top, scores[top]
+        return rows[top], scores[top]
+
+    def _rescored_candidates(self, query, rows, k):
+        """
+        Scan the compact matrix, keep the best rescore_depth rows and rescore
+        them exactly against the float32 matrix. Returns (rows, exact_scores).
+        """
+        approx = self.compact.scores(query, rows)
+        depth = min(len(approx), max(self.rescore_depth, k))
+        top = np.argpartition(-approx, depth - 1)[:depth]
+        # Sorted row ids read the memory-mapped float32 matrix sequentially
+        best_rows = np.sort(top if rows is None else rows[top])
+        return best_rows, self.embeddings[best_rows] @ query
+
+    def _collapse_by_job(self, scores, rows, k):
+        """scores[i] belongs to row rows[i] (or row i if rows is None); keep the best row of the k best jobs."""
+        rows = np.arange(len(scores)) if rows is None else np.asarray(rows, dtype=np.int64)
+        positions = top_k_groups(self.job_codes[rows], scores, k, self.num_jobs)
+        return rows[positions], scores[positions]
+
+    def hybrid_search(self, query_vector, query_text, k, candidates=None, depth=HYBRID_DEPTH,
+                      distinct_jobs=False):
+        """
+        Run the dense and BM25 searches concurrently (numpy releases the GIL
+        for the heavy parts), each returning `depth` rows, and fuse the two
+        rankings with reciprocal rank fusion. Returns (row_indices, rrf_scores).
+        """
+        if self.keyword_index is None:
+            raise ValueError("Hybrid search needs a keyword index; rebuild the vector store.")
+        depth = max(depth, k)
+        dense = _hybrid_executor.submit(self.search, query_vector, depth, candidates)
+        keyword = _hybrid_executor.submit(self.keyword_index.search, query_text, depth, candidates)
+        rows, scores = reciprocal_rank_fusion([dense.result()[0], keyword.result()[0]])
+        if distinct_jobs:
+            return self._collapse_by_job(scores, rows, k)
+        return rows[:k], scores[:k]
+
+    def search_batch(self, query_matrix, k, distinct_jobs=False):
+        """
+        Batched search: query_matrix is (m, dim). Scores all m queries in one
+        matrix-matrix product and returns (row_indices, scores), each (m, k), best first.
+        With distinct_jobs=True each query's rows are the best chunks of k different jobs.
+        """
+        query_matrix = np.asarray(query_matrix, dtype=np.float32)
+        if len(self) == 0 or k <= 0:
+            empty = np.zeros((len(query_matrix), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        if self.compact is not None or self.uses_ivf:
+            # Each query needs its own rescoring pass / probe over different rows
+            results = [self.search(q, k, distinct_jobs=distinct_jobs) for q in query_matrix]
+            return [r[0] for r in results], [r[1] for r in results]
+        scores = query_matrix @ self.embeddings.T
+        if distinct_jobs:
+            collapsed = [self._collapse_by_job(row_scores, None, k) for row_scores in scores]
+            return [c[0] for c in collapsed], [c[1] for c in collapsed]
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def rows(self, indices, scores=None):
+        """Gather the metadata columns for the given rows into a dataframe."""
+        df = pd.DataFrame({name: values[indices] for name, values in self.columns.items()})
+        if scores is not None:
+            df["similarity"] = scores
+        return df
+
+
+_active_store = None
+_active_store_dir = None
+# index_version of _active_store_dir when _active_store was loaded
+_active_store_version = None
+_active_store_lock = threading.RLock()
+# Runs the two legs of hybrid_search; worker threads are only started on first use.
+_hybrid_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-search")
+
+
+def load_embedding_store(store_dir=DEFAULT_STORE_DIR):
+    """Open the store saved in store_dir and make it the one retrieval uses."""
+    global _active_store, _active_store_dir, _active_store_version
+    with _active_store_lock:
+        logger.info(f"Loading embedding store from {store_dir}...")
+        # Read before loading: a rebuild that lands mid-load triggers another reload
+        version = index_version(store_dir)
+        _active_store = EmbeddingStore.load(store_dir)
+        _active_store_dir = store_dir
+        _active_store_version = version
+        return _active_store
+
+
+def get_embedding_store():
+    """
+    Return the active store, loading it (DEFAULT_STORE_DIR unless told otherwise)
+    on first use, and reloading it when another process (ingestion) has
+    rebuilt the index since, i.e. the store's index_version changed.
+    """
+    store_dir = _active_store_dir or DEFAULT_STORE_DIR
+    if _active_store is not None and index_version(store_dir) == _active_store_version:
+        return _active_store
+    with _active_store_lock:
+        # Another thread may have (re)loaded it while we waited
+        if _active_store is None:
+            return load_embedding_store(store_dir)
+        if index_version(store_dir) != _active_store_version:
+            logger.info(f"Index in {store_dir} was rebuilt; reloading the embedding store.")
+            return load_embedding_store(store_dir)
+        return _active_store
+
+
+_index_rebuilt_callbacks = []
+
+
+def on_index_rebuilt(callback):
+    """Call callback(store_dir) whenever mark_index_rebuilt runs in this process."""
+    _index_rebuilt_callbacks.append(callback)
+
+
+def mark_index_rebuilt(store_dir):
+    """Record that the index in store_dir was rebuilt: new version token + in-process callbacks."""
+    with atomic_write(os.path.join(store_dir, INDEX_VERSION_FILE)) as f:
+        f.write(f"{time.time():.6f}-{uuid.uuid4().hex}")
+    for callback in list(_index_rebuilt_callbacks):
+        callback(store_dir)
+
+
+def index_version(store_dir):
+    """The token written by the last mark_index_rebuilt for store_dir, or None."""
+    try:
+        with open(os.path.join(store_dir, INDEX_VERSION_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def export_embedding_store(cursor, store_dir, features_column, columns, table="all_jobs_features"):
+    """
+    Copy the embeddings + metadata of an EvaDB features table into an
+    EmbeddingStore on disk. Runs once at ingestion time.
+    """
+    global _active_store
+    select_list = ", ".join([features_column] + list(columns))
+    df = cursor.query(f"SELECT {select_list} FROM {table};").df()
+    store = EmbeddingStore.from_dataframe(df, features_column, columns)
+    store.save(store_dir)
+    if store_dir == _active_store_dir:
+        _active_store = None
+    return store
+
+
+def update_embedding_store(store, store_dir):
+    """Save an updated store (and its indexes) over the one in store_dir."""
+    global _active_store
+    store.save(store_dir)
+    for dtype in ("float16", "int8") if len(store) else ():
+        compact = store.compact if store.compact is not None and store.compact.dtype == dtype else None
+        (compact or QuantizedMatrix.quantize(store.embeddings, dtype)).save(store_dir)
+    for index in (store.metadata_index, store.keyword_index, store.ivf_index):
+        if index is not None:
+            index.save(store_dir)
+    if store_dir == _active_store_dir:
+        _active_store = None
@@ -0,0 +1,247 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from telemetry import span
+
+# Same encoder EvaDB's SentenceFeatureExtractor uses to fill all_jobs_features,
+# so query vectors computed here are comparable with the stored ones.
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# Query-embedding cache bounds (entries / seconds). TTL <= 0 disables expiry.
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "3600"))
+
+# Ingestion-time encoding (embed_corpus): chunks per encoder call, and encoder
+# processes (1 encodes in this process, 0 starts one per core).
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "1"))
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache of text embeddings with a TTL.
+    Keys are (model id, normalised text), so the same string encoded by two
+    different models never collides.
+    """
+
+    def __init__(self, max_size=EMBEDDING_CACHE_SIZE, ttl=EMBEDDING_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (vector, expires_at)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_name, text):
+        # Collapse whitespace so "  hybrid jobs?\n" and "hybrid jobs?" share an entry.
+        return model_name, " ".join(text.split())
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl <= 0 or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, vector):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (vector, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+embedding_cache = EmbeddingCache()
+
+
+class EmbeddingModelRegistry:
+    """
+    Process-wide registry of sentence encoders. Each model is loaded at most
+    once per process, even if several requests ask for it at the same time.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._load_seconds = {}
+        self._warm = set()
+        self._lock = threading.Lock()
+
+    def get(self, model_name=DEFAULT_EMBEDDING_MODEL):
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+        with self._lock:
+            if model_name not in self._models:
+                from sentence_transformers import SentenceTransformer
+
+                logger.info(f"Loading embedding model {model_name}...")
+                start = time.perf_counter()
+                self._models[model_name] = SentenceTransformer(model_name)
+                self._load_seconds[model_name] = time.perf_counter() - start
+                logger.info(f"Loaded {model_name} in {self._load_seconds[model_name]:.2f} seconds.")
+            return self._models[model_name]
+
+    def warm_up(self, model_name=DEFAULT_EMBEDDING_MODEL):
+        """Load the model and run one dummy encode so the first real request doesn't pay for it."""
+        self.get(model_name).encode(["warm up"], convert_to_numpy=True)
+        self._warm.add(model_name)
+
+    def status(self, model_name=DEFAULT_EMBEDDING_MODEL):
+        return {
+            "name": model_name,
+            "loaded": model_name in self._models,
+            "warm": model_name in self._warm,
+            "load_seconds": self._load_seconds.get(model_name),
+        }
+
+
+model_registry = EmbeddingModelRegistry()
+
+
+def get_embedding_model(model_name=DEFAULT_EMBEDDING_MODEL):
+    """Return the process-wide instance of the encoder (loaded on first use)."""
+    return model_registry.get(model_name)
+
+
+def normalize_rows(matrix):
+    """L2-normalise each row so that a dot product is a cosine similarity."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def embed_texts(texts, use_cache=True, model_name=DEFAULT_EMBEDDING_MODEL):
+    """
+    Encode a list of strings, with every cache miss encoded in one encoder call.
+    Returns a (len(texts), dim) float32 matrix with unit-length rows.
+    """
+    texts = list(texts)
+    if not use_cache:
+        with span("embedding"):
+            return normalize_rows(get_embedding_model(model_name).encode(texts, convert_to_numpy=True))
+
+    keys = [EmbeddingCache.make_key(model_name, t) for t in texts]
+    vectors = [embedding_cache.get(key) for key in keys]
+
+    # Encode each distinct missing text once
+    missing = list(dict.fromkeys(key for key, vec in zip(keys, vectors) if vec is None))
+    if missing:
+        with span("embedding"):
+            encoded = normalize_rows(
+                get_embedding_model(model_name).encode([text for _, text in missing], convert_to_numpy=True)
+            )
+        fresh = {key: vec.copy() for key, vec in zip(missing, encoded)}
+        for key, vec in fresh.items():
+            embedding_cache.put(key, vec)
+        vectors = [vec if vec is not None else fresh[key] for key, vec in zip(keys, vectors)]
+
+    return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+
+def length_buckets(texts, batch_size, by_length=True):
+    """
+    Split range(len(texts)) into batches of at most batch_size positions of
+    texts of similar length (word count as a stand-in for token count), so
+    each encoder call pads its batch to about the length of its own texts
+    rather than of the longest chunk in the corpus. by_length=False keeps
+    the input order.
+    """
+    order = list(range(len(texts)))
+    if by_length:
+        order.sort(key=lambda i: len(texts[i].split()))
+    return [order[start:start + batch_size] for start in range(0, len(order), max(1, batch_size))]
+
+
+def _init_embed_worker(model_name, threads):
+    """Encoder process initializer: split the cores between workers, then load the model once."""
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    model_registry.get(model_name)
+
+
+def _encode_batch(args):
+    model_name, texts = args
+    return get_embedding_model(model_name).encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+
+def corpus_workers(n_texts, batch_size=INGEST_EMBED_BATCH_SIZE, workers=INGEST_EMBED_WORKERS):
+    """Encoder processes embed_corpus runs for n_texts chunks: `workers` (0: one per core), at most one per batch."""
+    n_batches = -(-n_texts // max(1, batch_size))
+    return max(1, min(workers or os.cpu_count() or 1, n_batches))
+
+
+def embed_corpus(texts, batch_size=INGEST_EMBED_BATCH_SIZE, workers=INGEST_EMBED_WORKERS,
+                 model_name=DEFAULT_EMBEDDING_MODEL, by_length=True):
+    """
+    Encode a corpus of chunks at ingestion time (no query cache). Chunks are
+    bucketed by length (see length_buckets) and the batches are encoded in
+    this process or, with workers != 1, spread over a pool of encoder
+    processes. Returns a (len(texts), dim) float32 matrix with unit-length
+    rows, in the order of texts.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    batches = length_buckets(texts, batch_size, by_length)
+    tasks = [(model_name, [texts[i] for i in batch]) for batch in batches]
+    workers = corpus_workers(len(texts), batch_size, workers)
+    if workers == 1:
+        return _scatter(batches, map(_encode_batch, tasks), len(texts))
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # spawn, not fork: a forked copy of a process that already runs torch threads can deadlock
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_embed_worker, initargs=(model_name, threads),
+    ) as pool:
+        return _scatter(batches, pool.map(_encode_batch, tasks), len(texts))
+
+
+def _scatter(batches, encoded, n):
+    """Put each encoded batch back at its texts' positions."""
+    out = None
+    for batch, vectors in zip(batches, encoded):
+        if out is None:
+            out = np.empty((n, vectors.shape[1]), dtype=np.float32)
+        out[batch] = vectors
+    return normalize_rows(out)
@@ -0,0 +1,122 @@
+"""
+Local router that decides whether a question needs LLM decomposition.
+
+Most questions asked of the jobs bot are single-intent lookups ("Which jobs
+are in Palo Alto?") that the decomposition LLM call would return unchanged,
+as one vector_retrieval sub-question. IntentRouter embeds the question with
+the retrieval encoder and compares it with two small sets of labelled
+example questions: single-intent lookups, and questions that need to be
+split up, compared or summarised (or are out of scope). When the question
+is clearly closer (nearest-neighbour similarity) to the single-intent
+examples it skips the LLM call; anything ambiguous is still decomposed.
+
+A few lexical cues (several question marks, "compare", "summarize", ...)
+mark a question as compound regardless of the embeddings.
+"""
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+from embeddings import embed_texts
+from telemetry import ROUTER_DECISIONS
+
+# SUBQUESTION_ROUTER=0 always sends questions through LLM decomposition.
+SUBQUESTION_ROUTER_ENABLED = os.getenv("SUBQUESTION_ROUTER", "1") == "1"
+# A question takes the fast path when its similarity to the nearest simple
+# examples beats the compound ones by ROUTER_MARGIN and is at least ROUTER_MIN_SIMILARITY.
+ROUTER_MARGIN = float(os.getenv("ROUTER_MARGIN", "0.05"))
+ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", "0.45"))
+# Scores average the similarity to this many nearest examples of each class.
+ROUTER_NEIGHBOURS = 3
+
+SIMPLE_EXAMPLES = [
+    "Which jobs are in Palo Alto?",
+    "What roles are open in London?",
+    "Are there any remote software engineering jobs?",
+    "What does a Forward Deployed Engineer do?",
+    "What are the responsibilities of a Data Scientist?",
+    "Which positions are in the Defense department?",
+    "What qualifications are needed for the Deployment Strategist role?",
+    "Do you have internships in New York?",
+    "What senior engineering roles are available?",
+    "Which jobs mention Kubernetes?",
+    "What is the workplace type for the product designer role?",
+    "Is there a machine learning engineer opening?",
+]
+
+COMPOUND_EXAMPLES = [
+    "Compare the software engineer roles in London and New York.",
+    "What is the difference between a Forward Deployed Engineer and a Deployment Strategist?",
+    "Summarize the internship positions offered in the US.",
+    "Give me an overview of all the teams that are hiring.",
+    "Which roles are in Denver, and what do the data science jobs there require?",
+    "What are the most common skills across all engineering postings?",
+    "How do the responsibilities of senior roles differ from junior ones?",
+    "List the remote jobs and then tell me which of them pay the most.",
+    "What's the company's official stance on crocheting hats in the office?",
+    "Tell me about the culture, benefits and interview process.",
+]
+
+# Cues of a question that asks for more than one lookup.
+_COMPOUND_PATTERN = re.compile(
+    r"\?.*\?|\b(compare|comparison|versus|vs\.?|differen(ce|t from)|summari[sz]e|summary|overview|"
+    r"all of the|across all|and then|as well as)\b",
+    re.IGNORECASE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class IntentRouter:
+    def __init__(self, simple_examples=SIMPLE_EXAMPLES, compound_examples=COMPOUND_EXAMPLES,
+                 margin=ROUTER_MARGIN, min_similarity=ROUTER_MIN_SIMILARITY, neighbours=ROUTER_NEIGHBOURS):
+        self.simple_examples = list(simple_examples)
+        self.compound_examples = list(compound_examples)
+        self.margin = margin
+        self.min_similarity = min_similarity
+        self.neighbours = neighbours
+        self._vectors = None  # (simple, compound) example embeddings, built on first use
+        self._lock = threading.Lock()
+
+    def _example_vectors(self):
+        if self._vectors is None:
+            with self._lock:
+                if self._vectors is None:
+                    # Kept here rather than in the query cache, where they could be evicted
+                    vectors = embed_texts(self.simple_examples + self.compound_examples, use_cache=False)
+                    n = len(self.simple_examples)
+                    self._vectors = (vectors[:n], vectors[n:])
+        return self._vectors
+
+    def warm_up(self):
+        """Embed the example questions now rather than on the first routed request."""
+        self._example_vectors()
+
+    def _score(self, vector, examples):
+        similarities = examples @ vector
+        k = min(self.neighbours, len(similarities))
+        return float(np.sort(similarities)[-k:].mean())
+
+    def scores(self, question):
+        """(simple score, compound score) of the question."""
+        simple, compound = self._example_vectors()
+        vector = embed_texts([question])[0]
+        return self._score(vector, simple), self._score(vector, compound)
+
+    def is_simple(self, question):
+        """True if the question can be answered by one vector_retrieval over the question itself."""
+        if _COMPOUND_PATTERN.search(question):
+            route = "compound_cue"
+        else:
+            simple, compound = self.scores(question)
+            simple_enough = simple >= self.min_similarity and simple - compound >= self.margin
+            route = "simple" if simple_enough else "decompose"
+            logger.info(f"Router: {route} (simple {simple:.3f}, compound {compound:.3f}) for {question!r}")
+        ROUTER_DECISIONS.inc(route=route)
+        return route == "simple"
+
+
+intent_router = IntentRouter()
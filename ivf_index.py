@@ -0,0 +1,132 @@
+"""
+IVF (inverted file) approximate nearest neighbour index in pure NumPy.
+
+A spherical k-means coarse quantizer splits the unit-length embeddings into
+n_lists cells; each cell keeps the ids of its rows (an inverted list, stored
+CSR-style: list i holds rows[offsets[i]:offsets[i + 1]]). A query scores the
+centroids, visits only the `nprobe` closest cells and scores the rows found
+there exactly, so the work per query is about nprobe / n_lists of a full scan.
+nprobe trades recall for latency; nprobe = n_lists is an exact search.
+"""
+import json
+import os
+
+import numpy as np
+
+from atomic_io import atomic_write
+from embeddings import normalize_rows
+
+IVF_INDEX_FILE = "ivf_index.npz"
+IVF_META_FILE = "ivf_index.json"
+
+# Rows assigned to centroids at a time during build, to bound scratch memory.
+ASSIGN_BLOCK_ROWS = 16384
+
+
+def default_n_lists(num_rows):
+    """Roughly 4 * sqrt(n) cells, the usual IVF rule of thumb."""
+    return max(1, min(num_rows, int(4 * np.sqrt(num_rows))))
+
+
+def _assign(matrix, centroids):
+    """Index of the most similar centroid for every row."""
+    labels = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), ASSIGN_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        labels[start:start + ASSIGN_BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(matrix, n_clusters, n_iter=10, seed=0):
+    """k-means on the unit sphere (cosine similarity). Returns (n_clusters, dim) unit centroids."""
+    rng = np.random.default_rng(seed)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    centroids = matrix[rng.choice(len(matrix), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        labels = _assign(matrix, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=n_clusters)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        non_empty = counts > 0
+        sums = np.add.reduceat(matrix[order], starts[non_empty], axis=0)
+        centroids[non_empty] = sums
+        # Re-seed empty cells with random rows so no centroid is wasted
+        n_empty = int((~non_empty).sum())
+        if n_empty:
+            centroids[~non_empty] = matrix[rng.choice(len(matrix), n_empty, replace=False)]
+        centroids = normalize_rows(centroids)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids, list_rows, list_offsets):
+        self.centroids = centroids
+        self.list_rows = list_rows
+        self.list_offsets = list_offsets
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, n_iter=10, train_size=65536, seed=0):
+        """
+        Train the coarse quantizer on (a sample of) the embeddings and bucket
+        every row into its closest cell.
+        """
+        n = len(embeddings)
+        n_lists = min(n_lists or default_n_lists(n), n)
+        rng = np.random.default_rng(seed)
+        train_rows = np.sort(rng.choice(n, min(n, max(train_size, n_lists)), replace=False))
+        centroids = spherical_kmeans(embeddings[train_rows], n_lists, n_iter=n_iter, seed=seed)
+        return cls.from_labels(centroids, _assign(embeddings, centroids))
+
+    @classmethod
+    def from_labels(cls, centroids, labels):
+        """Bucket rows into the inverted lists given the cell of every row."""
+        list_rows = np.argsort(labels, kind="stable").astype(np.int64)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=len(centroids)))]).astype(np.int64)
+        return cls(centroids, list_rows, list_offsets)
+
+    def labels(self):
+        """Cell of every row (the inverse of the inverted lists)."""
+        labels = np.empty(len(self.list_rows), dtype=np.int32)
+        labels[self.list_rows] = np.repeat(np.arange(self.n_lists, dtype=np.int32), np.diff(self.list_offsets))
+        return labels
+
+    def updated(self, reuse_rows, new_embeddings):
+        """
+        Index over a new set of rows without retraining the centroids: row i
+        is old row reuse_rows[i] (keeping its cell) or, where reuse_rows[i] is
+        -1, the next row of new_embeddings (assigned to its closest centroid).
+        """
+        reuse_rows = np.asarray(reuse_rows, dtype=np.int64)
+        labels = np.empty(len(reuse_rows), dtype=np.int32)
+        reused = reuse_rows >= 0
+        labels[reused] = self.labels()[reuse_rows[reused]]
+        labels[~reused] = _assign(new_embeddings, self.centroids)
+        return IVFIndex.from_labels(self.centroids, labels)
+
+    def probe(self, query_vector, nprobe):
+        """Sorted ids of the rows in the nprobe cells closest to the query."""
+        nprobe = max(1, min(nprobe, self.n_lists))
+        centroid_scores = self.centroids @ np.asarray(query_vector, dtype=np.float32)
+        cells = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in cells])
+        return np.sort(rows)
+
+    def save(self, store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+        with atomic_write(os.path.join(store_dir, IVF_INDEX_FILE), "wb") as f:
+            np.savez(f, centroids=self.centroids, list_rows=self.list_rows, list_offsets=self.list_offsets)
+        with atomic_write(os.path.join(store_dir, IVF_META_FILE), encoding="utf-8") as f:
+            json.dump({"n_lists": self.n_lists, "num_rows": int(len(self.list_rows))}, f)
+
+    @classmethod
+    def load(cls, store_dir):
+        with np.load(os.path.join(store_dir, IVF_INDEX_FILE)) as arrays:
+            return cls(arrays["centroids"], arrays["list_rows"], arrays["list_offsets"])
+
+    @staticmethod
+    def exists(store_dir):
+        return os.path.exists(os.path.join(store_dir, IVF_INDEX_FILE))
@@ -0,0 +1,272 @@
+"""
+Fetcher for Lever-style job boards, with an on-disk cache of raw responses.
+
+A board lists its postings over several pages: each response carries
+{"data": [...postings], "hasNext": bool, "next": <offset cursor>} and the
+next page is the same URL with offset=<cursor>. JobBoardFetcher walks the
+pages over one pooled requests.Session (keep-alive connections, timeouts,
+retries on 429/5xx) and keeps every page body in SQLite with its ETag /
+Last-Modified, so a refresh revalidates with If-None-Match /
+If-Modified-Since and only downloads pages that changed.
+
+The cache also remembers the page URLs of the last walk of each board. On a
+refresh:
+  - JOB_FETCH_REVALIDATE=all (default): every known page is revalidated;
+    the pages are requested concurrently, so an unchanged board costs one
+    round of conditional requests answered 304.
+  - JOB_FETCH_REVALIDATE=first (opt-in): if the first page comes back 304,
+    the board is taken as unchanged and the cached walk is returned, for one
+    conditional request. Edits and closings on later pages are missed until
+    the first page changes, so the refreshed postings can be stale (closed
+    postings are kept by vector_store.update_unified_vector_store).
+Either way, once the walk has to go past the first page, the known pages
+are requested concurrently (JOB_FETCH_WORKERS at a time) instead of one
+cursor at a time; the chain of "next" cursors is then checked, and the walk
+continues page by page from wherever it diverges from the cached one.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# JOB_FETCH_CACHE=0 downloads every page on every run.
+JOB_FETCH_CACHE_ENABLED = os.getenv("JOB_FETCH_CACHE", "1") == "1"
+JOB_FETCH_CACHE_PATH = os.getenv("JOB_FETCH_CACHE_PATH", "./job_board_cache.sqlite")
+# "all": revalidate every page. "first": an unchanged first page means an
+# unchanged board (cheaper, but misses changes on later pages).
+JOB_FETCH_REVALIDATE = os.getenv("JOB_FETCH_REVALIDATE", "all")
+# Concurrent page requests (and pooled connections per host).
+JOB_FETCH_WORKERS = int(os.getenv("JOB_FETCH_WORKERS", "8"))
+JOB_FETCH_TIMEOUT = float(os.getenv("JOB_FETCH_TIMEOUT", "10"))
+# Safety stop for boards whose cursors never run out.
+JOB_FETCH_MAX_PAGES = int(os.getenv("JOB_FETCH_MAX_PAGES", "200"))
+
+logger = logging.getLogger(__name__)
+
+
+def page_postings(data):
+    """The postings of one page of the board's JSON."""
+    # Often the JSON might be a dict with a 'data' key or it might be a list.
+    if isinstance(data, dict) and "data" in data:
+        return data["data"]
+    if isinstance(data, list):
+        return data
+    return []
+
+
+def next_page_url(url, data):
+    """URL of the page after `data` (fetched from url), or None on the last page."""
+    if not isinstance(data, dict) or not data.get("hasNext") or not data.get("next"):
+        return None
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    params = [(name, value) for name, value in parse_qsl(query, keep_blank_values=True) if name != "offset"]
+    # The cursor may come back percent-encoded; urlencode encodes it again
+    params.append(("offset", unquote(str(data["next"]))))
+    return urlunsplit((scheme, netloc, path, urlencode(params), fragment))
+
+
+class HTTPResponseCache:
+    """
+    SQLite-backed cache of raw GET responses (body + validators), keyed by
+    URL, plus the page URLs of the last walk of each board.
+    """
+
+    def __init__(self, path=JOB_FETCH_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, url TEXT NOT NULL, etag TEXT, last_modified TEXT, "
+                "body TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS walks (start_url TEXT PRIMARY KEY, pages TEXT NOT NULL)")
+        return self._conn
+
+    @staticmethod
+    def make_key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def get(self, url):
+        """Return {"etag", "last_modified", "body"} of the cached response, or None."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT etag, last_modified, body FROM responses WHERE key = ?", (self.make_key(url),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "body": row[2]}
+
+    def put(self, url, etag, last_modified, body):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, etag, last_modified, body, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.make_key(url), url, etag, last_modified, body, time.time()),
+            )
+            conn.commit()
+
+    def get_walk(self, start_url):
+        """Page URLs of the last complete walk from start_url (first page included), or []."""
+        with self._lock:
+            row = self._connection().execute("SELECT pages FROM walks WHERE start_url = ?", (start_url,)).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def put_walk(self, start_url, page_urls):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO walks (start_url, pages) VALUES (?, ?)", (start_url, json.dumps(page_urls))
+            )
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM walks")
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JobBoardFetcher:
+    def __init__(self, cache=None, workers=JOB_FETCH_WORKERS, timeout=JOB_FETCH_TIMEOUT,
+                 revalidate=JOB_FETCH_REVALIDATE, max_pages=JOB_FETCH_MAX_PAGES, retries=3):
+        """cache: HTTPResponseCache (default: one at JOB_FETCH_CACHE_PATH unless JOB_FETCH_CACHE=0), False for none."""
+        if revalidate not in ("first", "all"):
+            raise ValueError(f"Unknown revalidation mode: {revalidate}")
+        if cache is None and JOB_FETCH_CACHE_ENABLED:
+            cache = HTTPResponseCache()
+        self.cache = cache or None
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.revalidate = revalidate
+        self.max_pages = max_pages
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=self.workers,
+            max_retries=Retry(
+                total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",), respect_retry_after_header=True,
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-fetch")
+        self.requests = 0
+        self.not_modified = 0
+        self.downloaded_bytes = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def fetch(self, url):
+        """
+        GET url, conditionally if it is cached. Returns (parsed JSON, changed),
+        where changed is False when the cached body is still current.
+        """
+        cached = self.cache.get(url) if self.cache is not None else None
+        headers = {"Accept": "application/json"}
+        if cached is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        resp = self.session.get(url, headers=headers, timeout=self.timeout)
+        with self._lock:
+            self.requests += 1
+            if resp.status_code == 304:
+                self.not_modified += 1
+            else:
+                self.downloaded_bytes += len(resp.content)
+        if resp.status_code == 304 and cached is not None:
+            return json.loads(cached["body"]), False
+        resp.raise_for_status()
+        body = resp.text
+        if self.cache is not None:
+            self.cache.put(url, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), body)
+        return json.loads(body), cached is None or cached["body"] != body
+
+    def _cached_walk(self, page_urls):
+        """Parsed bodies of the given pages from the cache, or None if one is missing."""
+        pages = []
+        for url in page_urls:
+            cached = self.cache.get(url)
+            if cached is None:
+                return None
+            pages.append(json.loads(cached["body"]))
+        return pages
+
+    def walk(self, start_url):
+        """All postings of the board, following the offset cursor from start_url."""
+        known = self.cache.get_walk(start_url) if self.cache is not None else []
+        first, changed = self.fetch(start_url)
+        if not changed and known and self.revalidate == "first":
+            cached = self._cached_walk(known[1:])
+            if cached is not None:
+                logger.info(f"{start_url}: first page not modified, reusing {len(known)} cached pages.")
+                return [p for data in [first] + cached for p in page_postings(data)]
+
+        urls, pages = [start_url], [first]
+        next_url = next_page_url(start_url, first)
+        # Request the pages of the last walk all at once, then keep the ones the cursors still lead to
+        if next_url is not None and next_url in known[1:]:
+            speculative = known[known.index(next_url):][:self.max_pages - 1]
+            for url, (data, _) in zip(speculative, self._executor.map(self.fetch, speculative)):
+                if url != next_url:
+                    break
+                urls.append(url)
+                pages.append(data)
+                next_url = next_page_url(url, data)
+        # Then one page at a time past the end of the known walk (or where it diverged)
+        while next_url is not None and next_url not in urls and len(urls) < self.max_pages:
+            data, _ = self.fetch(next_url)
+            urls.append(next_url)
+            pages.append(data)
+            next_url = next_page_url(next_url, data)
+        if next_url is not None:
+            logger.warning(f"{start_url}: stopped after {len(urls)} pages.")
+        if self.cache is not None:
+            self.cache.put_walk(start_url, urls)
+        return [p for data in pages for p in page_postings(data)]
+
+    def walk_many(self, start_urls):
+        """walk() several boards concurrently; returns {start_url: postings}."""
+        with ThreadPoolExecutor(max_workers=min(self.workers, max(1, len(start_urls)))) as pool:
+            return dict(zip(start_urls, pool.map(self.walk, start_urls)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "not_modified": self.not_modified,
+                "downloaded_bytes": self.downloaded_bytes,
+            }
@@ -1,8 +1,11 @@
-from sentence_transformers import SentenceTransformer
 import logging
 from typing import List, Dict, Any
 import sys
 
+from vector_store import similarity_scores, similarity_search_query
+from embedding_store import RETRIEVAL_BACKEND, RETRIEVAL_DISTINCT_JOBS, get_embedding_store
+from embeddings import embed_texts
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s"
@@ -27,41 +30,26 @@ def get_user_profile_info():
 
 def embed_text(text):
     """
-    Use your favorite embedding model/LLM to embed the text.
-    Could be a local function, or call an external API (OpenAI, etc.)
+    Embed the text with the shared sentence encoder.
+    Repeated texts (e.g. a resubmitted profile) are served from the embedding cache.
     """
     logging.info("Embedding the user profile text...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')  # Loaded once globally, ideally
-    vector = model.encode(text)
+    vector = embed_texts([text])[0]
     return vector.tolist()
 
 def retrieve_relevant_jobs(cursor, user_profile_text, top_k=5):
     """
-    If you do NOT have a 'features' column in all_jobs_features,
-    but instead rely on computing embeddings on the fly,
-    do something like: 
-      ORDER BY Similarity(SentenceFeatureExtractor('{text}'), SentenceFeatureExtractor(data))
+    Embed the profile text once and let the all_jobs_index FAISS index
+    return the top_k closest chunks from all_jobs_features.
     """
-    safe_text = sanitize_eva_string(user_profile_text)
     logging.info(f"Retrieving top {top_k} relevant jobs from EVA...")
 
-    query = f"""
-        SELECT
-            doc_name,
-            job_id,
-            job_title,
-            department,
-            location,
-            workplace_type,
-            data,
-            Similarity(
-                SentenceFeatureExtractor('{safe_text}'),
-                SentenceFeatureExtractor(data)
-            ) as sim
-        FROM all_jobs_features
-        ORDER BY sim DESC
-        LIMIT {top_k};
-    """
+    query = similarity_search_query(
+        user_profile_text,
+        ["doc_name", "job_id", "job_title", "department", "location", "workplace_type", "data"],
+        top_k,
+        with_distance=True,
+    )
 
     logging.debug(f"[DEBUG] retrieve_relevant_jobs query:\n{query}")
     df = cursor.query(query).df()
@@ -69,7 +57,7 @@ def retrieve_relevant_jobs(cursor, user_profile_text, top_k=5):
 
     results = []
     if not df.empty:
-        for _, row in df.iterrows():
+        for (_, row), similarity in zip(df.iterrows(), similarity_scores(df)):
             row_dict = {
                 "doc_name":        row.get("doc_name"),
                 "job_id":          row.get("job_id"),
@@ -78,24 +66,14 @@ def retrieve_relevant_jobs(cursor, user_profile_text, top_k=5):
                 "location":        row.get("location"),
                 "workplace_type":  row.get("workplace_type"),
                 "data":            row.get("data"),
-                "similarity":      row.get("sim"),
+                # Cosine score, comparable with the matrix backend's.
+                "similarity":      similarity,
             }
             results.append(row_dict)
 
     return results
 
 
-def sanitize_eva_string(input_str: str) -> str:
-    """
-    Replace single quotes with double single-quotes
-    and remove newline characters, which can break EVA's parser.
-    """
-    # Replace any single quote ' with ''
-    sanitized = input_str.replace("'", "''")
-    # Replace or remove newline characters
-    sanitized = sanitized.replace("\n", " ")
-    return sanitized
-
 def make_eva_array_literal(vector: list[float]) -> str:
     """
     Given a Python list of floats, convert it to a string like:
@@ -108,60 +86,74 @@ def make_eva_array_literal(vector: list[float]) -> str:
 def job_match_retrieval(cursor, user_profile_text: str, limit: int = 3):
     """
     Similar to retrieve_relevant_jobs, but we embed the user text inline
-    using SentenceFeatureExtractor. This queries the single table `all_jobs_features`.
-    """
-    safe_text = sanitize_eva_string(user_profile_text)
-
-    query = f"""
-        SELECT
-            doc_name,
-            job_id,
-            job_title,
-            department,
-            location,
-            workplace_type,
-            data,
-            Similarity(
-                SentenceFeatureExtractor('{safe_text}'),
-                SentenceFeatureExtractor(data)
-            )
-        FROM all_jobs_features
-        ORDER BY Similarity(
-                SentenceFeatureExtractor('{safe_text}'),
-                SentenceFeatureExtractor(data)
-            )
-        LIMIT {limit};
+    using SentenceFeatureExtractor. This queries the single table `all_jobs_features`
+    through its FAISS index, so the profile is embedded once per call.
     """
+    query = similarity_search_query(
+        user_profile_text,
+        ["doc_name", "job_id", "job_title", "department", "location", "workplace_type", "data"],
+        limit,
+        with_distance=True,
+    )
 
     print("[DEBUG] job_match_retrieval() query:\n", query)
     df = cursor.query(query).df()
     print(f"[DEBUG] Rows returned: {len(df)}")
 
     results = []
-    similarity_col = df.columns[-1]
     if not df.empty:
-        for _, row in df.iterrows():
+        for (_, row), similarity in zip(df.iterrows(), similarity_scores(df)):
             row_dict = {
+                "doc_name":        row.get("doc_name"),
                 "job_id":          row.get("job_id"),
                 "job_title":       row.get("job_title"),
                 "department":      row.get("department"),
                 "location":        row.get("location"),
                 "workplace_type":  row.get("workplace_type"),
                 "data":            row.get("data"),
-                "similarity":      row.get(similarity_col)
+                # Cosine score, comparable with the matrix backend's.
+                "similarity":      similarity,
             }
             results.append(row_dict)
 
     return results
 
-def aggregate_job_matches(cursor, user_profile_text, limit=5):
+def matrix_job_match_retrieval(user_profile_text: str, limit: int = 3, distinct_jobs: bool = True):
+    """
+    Same result shape as job_match_retrieval, served from the in-process
+    EmbeddingStore instead of an EvaDB query. 'similarity' is the cosine score.
+    With distinct_jobs, each job is scored by its best chunk and appears once.
+    """
+    store = get_embedding_store()
+    indices, scores = store.search(embed_texts([user_profile_text])[0], limit, distinct_jobs=distinct_jobs)
+    df = store.rows(indices, scores)
+    fields = ["doc_name", "job_id", "job_title", "department", "location", "workplace_type", "data"]
+    results = []
+    for row in df.to_dict("records"):
+        row_dict = {f: row[f] for f in fields}
+        row_dict["similarity"] = float(row["similarity"])
+        results.append(row_dict)
+    return results
+
+def aggregate_job_matches(cursor, user_profile_text, limit=5, backend=None, distinct_jobs=None):
     """
     Retrieves matches from the single table all_jobs_features
     and returns the top 'limit' rows (already sorted by similarity).
+    backend="matrix" uses the in-process EmbeddingStore (see RETRIEVAL_BACKEND).
+    With distinct_jobs (default RETRIEVAL_DISTINCT_JOBS) every match is a different job.
     """
-    all_matches = job_match_retrieval(cursor, user_profile_text, limit=limit)
+    distinct_jobs = RETRIEVAL_DISTINCT_JOBS if distinct_jobs is None else distinct_jobs
+    if (backend or RETRIEVAL_BACKEND) == "matrix":
+        all_matches = matrix_job_match_retrieval(user_profile_text, limit=limit, distinct_jobs=distinct_jobs)
+    else:
+        # Over-fetch chunks so there are still `limit` jobs left after collapsing
+        fetch = limit * 4 if distinct_jobs else limit
+        all_matches = job_match_retrieval(cursor, user_profile_text, limit=fetch)
 
     # If you prefer to re-sort or do a second pass:
     all_matches.sort(key=lambda x: x["similarity"], reverse=True)
+    if distinct_jobs:
+        seen = set()
+        all_matches = [m for m in all_matches if not (m["job_id"] in seen or seen.add(m["job_id"]))]
     return all_matches[:limit]
 
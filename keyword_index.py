@@ -0,0 +1,140 @@
+"""
+BM25 keyword index over the chunk text (`data` column).
+
+Dense similarity misses exact terms such as "TS/SCI", "Deployment
+Strategist" or a specific city; BM25 catches them. The index is built at
+ingestion time next to the FAISS index / embedding store and kept compact:
+per-term postings lists live in flat numpy arrays (CSR layout), so the
+postings of term t are doc_ids[offsets[t]:offsets[t + 1]] with matching
+term frequencies in tfs[...].
+"""
+import json
+import os
+import re
+
+import numpy as np
+
+from atomic_io import atomic_write
+
+KEYWORD_INDEX_FILE = "bm25_index.json"
+KEYWORD_POSTINGS_FILE = "bm25_index.npz"
+
+# Keep internal "/", "-", "'" so TS/SCI or full-stack survive as one token.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[/'\-][a-z0-9]+)*")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class BM25Index:
+    def __init__(self, vocab, doc_ids, tfs, offsets, doc_lengths, k1=1.5, b=0.75):
+        self.vocab = vocab  # term -> term id
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.offsets = offsets
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        num_docs = len(doc_lengths)
+        doc_freq = np.diff(offsets)
+        self.idf = np.log(1.0 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        avg_len = float(doc_lengths.mean()) if num_docs else 0.0
+        # Per-document part of the BM25 denominator, precomputed once.
+        self._length_norm = (k1 * (1 - b + b * doc_lengths / avg_len)).astype(np.float32) if num_docs else doc_lengths
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, texts, k1=1.5, b=0.75):
+        postings = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        vocab = {t: i for i, t in enumerate(terms)}
+        offsets = np.cumsum([0] + [len(postings[t]) for t in terms]).astype(np.int64)
+        doc_ids = np.fromiter((d for t in terms for d, _ in postings[t]), dtype=np.int32, count=offsets[-1])
+        tfs = np.fromiter((tf for t in terms for _, tf in postings[t]), dtype=np.float32, count=offsets[-1])
+        return cls(vocab, doc_ids, tfs, offsets, doc_lengths, k1=k1, b=b)
+
+    def scores(self, query):
+        """Dense (num_docs,) array of BM25 scores for the query text."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs, tf = self.doc_ids[start:end], self.tfs[start:end]
+            # doc ids are unique within a postings list, so fancy-index += is safe
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+        return scores
+
+    def search(self, query, k, candidates=None):
+        """
+        Return (row_indices, scores) of the k best-matching rows, best first.
+        Rows with no query term are never returned. If candidates (row ids)
+        is given, only those rows are considered.
+        """
+        scores = self.scores(query)
+        if candidates is not None:
+            masked = np.zeros_like(scores)
+            masked[candidates] = scores[candidates]
+            scores = masked
+        hits = np.flatnonzero(scores)
+        if len(hits) == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        k = min(k, len(hits))
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def save(self, store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+        terms = sorted(self.vocab, key=self.vocab.get)
+        with atomic_write(os.path.join(store_dir, KEYWORD_INDEX_FILE), encoding="utf-8") as f:
+            json.dump({"terms": terms, "k1": self.k1, "b": self.b}, f)
+        with atomic_write(os.path.join(store_dir, KEYWORD_POSTINGS_FILE), "wb") as f:
+            np.savez(f, doc_ids=self.doc_ids, tfs=self.tfs, offsets=self.offsets, doc_lengths=self.doc_lengths)
+
+    @classmethod
+    def load(cls, store_dir):
+        with open(os.path.join(store_dir, KEYWORD_INDEX_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(os.path.join(store_dir, KEYWORD_POSTINGS_FILE)) as arrays:
+            return cls(
+                {t: i for i, t in enumerate(meta["terms"])},
+                arrays["doc_ids"], arrays["tfs"], arrays["offsets"], arrays["doc_lengths"],
+                k1=meta["k1"], b=meta["b"],
+            )
+
+    @staticmethod
+    def exists(store_dir):
+        return os.path.exists(os.path.join(store_dir, KEYWORD_INDEX_FILE))
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several ranked lists of row ids with reciprocal rank fusion:
+    score(row) = sum over lists of 1 / (k + rank), rank starting at 1.
+    Returns (row_indices, fused_scores), best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (k + rank)
+    if not fused:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    rows = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float32, count=len(fused))
+    order = np.argsort(-scores, kind="stable")
+    return rows[order], scores[order]
@@ -0,0 +1,385 @@
+"""
+Chat-completion backends behind openai_utils.llm_call.
+
+A backend takes the keyword arguments of client.chat.completions.create and
+returns what the OpenAI SDK would: a ChatCompletion, or with stream=True an
+iterable (async iterable for complete_async) of ChatCompletionChunk.
+
+  - OpenAIBackend calls the OpenAI API.
+  - FakeLLMBackend answers locally, with no network, key or bill, so the
+    pipeline and the server can be benchmarked and load-tested offline.
+
+LLM_BACKEND=fake selects the fake (default: openai). Its answers are a pure
+function of the request (and FAKE_LLM_SEED): function calls get JSON that
+matches the requested function's schema (e.g. SubQuestionBundleList), other
+requests get plain text built from the words of the prompt. Latency and
+completion length are drawn from configurable distributions, seeded by the
+same request hash, so a load test replays identically.
+"""
+import abc
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+
+# Latency before the first token, in ms, and how it is distributed:
+# constant | uniform (mean ± spread·mean) | normal (sd = spread·mean) |
+# lognormal (median = FAKE_LLM_LATENCY_MS, sigma = spread).
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_LATENCY_DIST = os.getenv("FAKE_LLM_LATENCY_DIST", "lognormal")
+FAKE_LLM_LATENCY_SPREAD = float(os.getenv("FAKE_LLM_LATENCY_SPREAD", "0.4"))
+# Generation time per completion token, in ms (~100 tokens/s by default).
+FAKE_LLM_MS_PER_TOKEN = float(os.getenv("FAKE_LLM_MS_PER_TOKEN", "10"))
+# Completion length of text answers: normal(mean, spread·mean), at least 1.
+FAKE_LLM_COMPLETION_TOKENS = int(os.getenv("FAKE_LLM_COMPLETION_TOKENS", "150"))
+FAKE_LLM_COMPLETION_TOKENS_SPREAD = float(os.getenv("FAKE_LLM_COMPLETION_TOKENS_SPREAD", "0.3"))
+# Changes every answer / latency draw while keeping runs reproducible.
+FAKE_LLM_SEED = os.getenv("FAKE_LLM_SEED", "0")
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal")
+
+# Words left out when picking the topic words of a fake answer.
+_STOPWORDS = set("""
+a an and are as at be by can do does for from has have how i in is it me my of on or
+our that the their them there these this to was what when where which who why will
+with you your about any some into than then they we us use using please help answer
+following question context provided
+""".split())
+
+
+class LLMBackend(abc.ABC):
+    """Interface of a chat-completion backend; see the module docstring."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def complete(self, **request):
+        """ChatCompletion for the request (an iterator of chunks with stream=True)."""
+
+    @abc.abstractmethod
+    async def complete_async(self, **request):
+        """Async complete (an async iterator of chunks with stream=True)."""
+
+
+class OpenAIBackend(LLMBackend):
+    name = "openai"
+
+    def __init__(self, max_retries=0, **client_kwargs):
+        from openai import OpenAI, AsyncOpenAI
+
+        # The SDK's own retries are off so 429s reach openai_utils' shared rate limiter.
+        self.client = OpenAI(max_retries=max_retries, **client_kwargs)
+        self.async_client = AsyncOpenAI(max_retries=max_retries, **client_kwargs)
+
+    def complete(self, **request):
+        return self.client.chat.completions.create(**request)
+
+    async def complete_async(self, **request):
+        return await self.async_client.chat.completions.create(**request)
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Deterministic local stand-in for the OpenAI API. Sleeps for a sampled
+    latency (time to first token + FAKE_LLM_MS_PER_TOKEN per completion
+    token; streams pace their chunks the same way) and reports token usage
+    like the API does, so cost accounting, rate limiting and telemetry see
+    realistic numbers. Arguments default to the FAKE_LLM_* settings.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        latency_ms=FAKE_LLM_LATENCY_MS,
+        latency_dist=FAKE_LLM_LATENCY_DIST,
+        latency_spread=FAKE_LLM_LATENCY_SPREAD,
+        ms_per_token=FAKE_LLM_MS_PER_TOKEN,
+        completion_tokens=FAKE_LLM_COMPLETION_TOKENS,
+        completion_tokens_spread=FAKE_LLM_COMPLETION_TOKENS_SPREAD,
+        seed=FAKE_LLM_SEED,
+    ):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_dist}")
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_spread = latency_spread
+        self.ms_per_token = ms_per_token
+        self.completion_tokens = completion_tokens
+        self.completion_tokens_spread = completion_tokens_spread
+        self.seed = str(seed)
+        self.calls = 0
+
+    # -- sampling -----------------------------------------------------------
+
+    def _rng(self, request):
+        payload = json.dumps(
+            {field: request.get(field) for field in ("model", "messages", "functions", "function_call")},
+            sort_keys=True, default=str,
+        )
+        digest = hashlib.sha256(f"{self.seed}:{payload}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def sample_latency(self, rng):
+        """Seconds before the first token."""
+        mean = self.latency_ms / 1000
+        spread = self.latency_spread
+        if self.latency_dist == "uniform":
+            value = rng.uniform(mean * (1 - spread), mean * (1 + spread))
+        elif self.latency_dist == "normal":
+            value = rng.gauss(mean, mean * spread)
+        elif self.latency_dist == "lognormal":
+            value = mean * math.exp(rng.gauss(0.0, spread))
+        else:
+            value = mean
+        return max(value, 0.0)
+
+    def sample_completion_tokens(self, rng, max_tokens=None):
+        mean = self.completion_tokens
+        value = round(rng.gauss(mean, mean * self.completion_tokens_spread))
+        if max_tokens is not None:
+            value = min(value, max_tokens)
+        return max(int(value), 1)
+
+    # -- answers ------------------------------------------------------------
+
+    def _plan(self, request):
+        """(message dict, usage dict, latency before first token, seconds per token)"""
+        rng = self._rng(request)
+        latency = self.sample_latency(rng)
+        question = _last_user_message(request["messages"])
+
+        if request.get("function_call") or request.get("functions"):
+            function = _requested_function(request)
+            arguments = json.dumps(_fake_instance(function.get("parameters", {}), question, rng))
+            message = {"role": "assistant", "content": None,
+                       "function_call": {"name": function["name"], "arguments": arguments}}
+            completion_tokens = _approx_tokens(arguments)
+        else:
+            completion_tokens = self.sample_completion_tokens(rng, request.get("max_tokens"))
+            message = {"role": "assistant", "content": _fake_text(question, completion_tokens, rng)}
+
+        prompt_texts = [m.get("content") or "" for m in request["messages"]]
+        if request.get("functions"):
+            prompt_texts.append(json.dumps(request["functions"]))
+        prompt_tokens = sum(_approx_tokens(text) for text in prompt_texts) + 4 * len(request["messages"])
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        self.calls += 1
+        return message, usage, latency, self.ms_per_token / 1000
+
+    @staticmethod
+    def _completion(request, message, usage):
+        from openai.types.chat import ChatCompletion
+
+        return ChatCompletion.model_validate({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [{"index": 0, "finish_reason": "function_call" if message.get("function_call") else "stop",
+                         "message": message}],
+            "usage": usage,
+        })
+
+    @staticmethod
+    def _chunks(request, message, usage):
+        """The answer as the ChatCompletionChunks of a stream, one per word, then a usage chunk."""
+        from openai.types.chat import ChatCompletionChunk
+
+        def chunk(choices, usage=None):
+            return ChatCompletionChunk.model_validate({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": choices,
+                "usage": usage,
+            })
+
+        if message.get("function_call"):
+            deltas = [{"function_call": message["function_call"]}]
+        else:
+            deltas = [{"content": word} for word in re.findall(r"\S+\s*", message["content"])]
+        for i, delta in enumerate(deltas):
+            yield chunk([{"index": 0, "delta": ({"role": "assistant"} if i == 0 else {}) | delta}])
+        yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        include_usage = (request.get("stream_options") or {}).get("include_usage")
+        if include_usage:
+            yield chunk([], usage)
+
+    def complete(self, **request):
+        message, usage, latency, per_token = self._plan(request)
+        if not request.get("stream"):
+            time.sleep(latency + per_token * usage["completion_tokens"])
+            return self._completion(request, message, usage)
+        return self._stream(request, message, usage, latency, per_token)
+
+    def _stream(self, request, message, usage, latency, per_token):
+        time.sleep(latency)
+        for chunk in self._chunks(request, message, usage):
+            yield chunk
+            time.sleep(per_token * _chunk_tokens(chunk))
+
+    async def complete_async(self, **request):
+        message, usage, latency, per_token = self._plan(request)
+        if not request.get("stream"):
+            await asyncio.sleep(latency + per_token * usage["completion_tokens"])
+            return self._completion(request, message, usage)
+        return self._stream_async(request, message, usage, latency, per_token)
+
+    async def _stream_async(self, request, message, usage, latency, per_token):
+        await asyncio.sleep(latency)
+        for chunk in self._chunks(request, message, usage):
+            yield chunk
+            await asyncio.sleep(per_token * _chunk_tokens(chunk))
+
+
+def _approx_tokens(text):
+    """About 4 characters per token; avoids a tokenizer download for a fake."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _chunk_tokens(chunk):
+    if not chunk.choices:
+        return 0
+    delta = chunk.choices[0].delta
+    if delta.function_call is not None:
+        return _approx_tokens(delta.function_call.arguments or "")
+    return _approx_tokens(delta.content or "")
+
+
+def _last_user_message(messages):
+    for message in reversed(messages):
+        if message.get("role") == "user" and message.get("content"):
+            return message["content"]
+    return ""
+
+
+def _requested_function(request):
+    functions = request.get("functions") or []
+    wanted = (request.get("function_call") or {}).get("name") if isinstance(request.get("function_call"), dict) else None
+    for function in functions:
+        if function.get("name") == wanted:
+            return function
+    if functions:
+        return functions[0]
+    return {"name": wanted or "function", "parameters": {}}
+
+
+def _question_parts(text):
+    """
+    The question(s) in a user prompt - the text after the last "question:"
+    label (the prompts here all have one), else its last line - split on
+    "?" / " and " into at most three parts.
+    """
+    labelled = re.findall(r"question\s*:\s*(.+)", text, re.IGNORECASE)
+    lines = [line.strip() for line in text.strip().splitlines() if line.strip()]
+    question = labelled[-1].strip() if labelled else (lines[-1] if lines else "")
+    parts = [p.strip(" ,.") for p in re.split(r"\?|\band\b", question) if len(p.strip(" ,.").split()) >= 3]
+    if not parts:
+        return [question or "What roles are open?"]
+    return [p if p.endswith("?") else p + "?" for p in parts[:3]]
+
+
+def _fake_instance(schema, question, rng, root=None, parts=None):
+    """A value matching a JSON schema (as produced by pydantic / instructor)."""
+    root = root if root is not None else schema
+    parts = parts if parts is not None else _question_parts(question)
+    schema = _resolve(schema, root)
+    for combinator in ("anyOf", "oneOf", "allOf"):
+        if combinator in schema:
+            options = [s for s in schema[combinator] if s.get("type") != "null"] or schema[combinator]
+            return _fake_instance(options[0], question, rng, root, parts)
+    if "enum" in schema:
+        # Mostly the first value (e.g. vector_retrieval), sometimes another.
+        values = schema["enum"]
+        return values[0] if len(values) == 1 or rng.random() < 0.8 else rng.choice(values[1:])
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            name: _fake_instance(prop, question, rng, root, parts) if name != "question" else parts[0]
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        items = schema.get("items", {})
+        if _resolve(items, root).get("type") == "object":
+            # One entry per question part (e.g. one sub-question each)
+            return [
+                _fake_instance(items, question, rng, root, parts[i:] or parts)
+                for i in range(len(parts))
+            ]
+        return [_fake_instance(items, question, rng, root, parts)]
+    if kind == "integer":
+        return rng.randint(1, 5)
+    if kind == "number":
+        return round(rng.uniform(0, 1), 3)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    if kind == "string":
+        return parts[0]
+    return None
+
+
+def _resolve(schema, root):
+    while "$ref" in schema:
+        node = root
+        for key in schema["$ref"].lstrip("#/").split("/"):
+            node = node[key]
+        schema = node
+    return schema
+
+
+def _fake_text(prompt, n_tokens, rng):
+    """
+    Roughly n_tokens of answer-shaped text: an opener naming the question's
+    topic, then sentences quoted from the prompt's context (an extractive
+    "answer"), or shuffled prompt words when it has no usable sentences.
+    """
+    question = _question_parts(prompt)[0]
+    topic = [w for w in re.findall(r"[A-Za-z][A-Za-z\-]+", question) if w.lower() not in _STOPWORDS]
+    vocabulary = [w for w in re.findall(r"[A-Za-z][A-Za-z\-]+", prompt) if w.lower() not in _STOPWORDS] or ["role"]
+    topic = topic or vocabulary[:3]
+    context = re.search(r"context\s*:(.*)", prompt, re.IGNORECASE | re.DOTALL)
+    context = context.group(1) if context else prompt
+    sentences = [
+        s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", context)
+        if len(s.split()) >= 5 and not s.strip().startswith("[") and question.rstrip("?") not in s
+    ]
+    rng.shuffle(sentences)
+    openers = [
+        "Based on the retrieved postings,",
+        "According to the context,",
+        "From the job descriptions provided,",
+    ]
+    words = [rng.choice(openers), "here", "is", "what", "they", "say", "about", " ".join(topic[:4]) + "."]
+    n_words = max(1, int(n_tokens * 0.75))
+    i = 0
+    while len(words) < n_words:
+        if sentences:
+            # Every context sentence once (shuffled) before any repeats
+            sentence = sentences[i % len(sentences)].split()
+            i += 1
+        else:
+            sentence = rng.sample(vocabulary, min(len(vocabulary), rng.randint(6, 14)))
+            sentence[0] = sentence[0].capitalize()
+        words.extend(sentence)
+        if not words[-1].endswith((".", "!", "?")):
+            words[-1] += "."
+    return " ".join(" ".join(words).split()[:n_words]).rstrip(".") + "."
+
+
+def create_backend(name, **kwargs):
+    """Backend by LLM_BACKEND name ("openai" or "fake")."""
+    if name == "openai":
+        return OpenAIBackend(**kwargs)
+    if name == "fake":
+        return FakeLLMBackend(**kwargs)
+    raise ValueError(f"Unknown LLM backend: {name}")
@@ -7,22 +7,23 @@ import sys
 import warnings
 warnings.filterwarnings("ignore")
 
-from subquestion_generator import generate_subquestions
-import evadb
-from openai_utils import llm_call
-from palentir_jobs import scrape_palantir_jobs,load_palantir_job_postings
-from vector_store import generate_vector_stores, generate_unified_vector_store
-from retrieval import vector_retrieval, summary_retrieval
-from aggregator import response_aggregator
-from job_seeking import get_user_profile_info, embed_text, retrieve_relevant_jobs, aggregate_job_matches 
-
-
 if not load_dotenv():
     print(
         "Could not load .env file or it is empty. Please check if it exists and is readable."
     )
     exit(1)
 def main():
+    # Imported here rather than at module level: evadb, the OpenAI SDK and
+    # pandas take seconds to import, and the .env check above should fail fast.
+    from subquestion_generator import generate_subquestions
+    import evadb
+    from openai_utils import llm_call
+    from palentir_jobs import scrape_palantir_jobs,load_palantir_job_postings
+    from vector_store import generate_vector_stores, generate_unified_vector_store
+    from retrieval import vector_retrieval, vector_retrieval_batch, summary_retrieval
+    from aggregator import response_aggregator_stream
+    from job_seeking import get_user_profile_info, embed_text, retrieve_relevant_jobs, aggregate_job_matches
+
     cursor = evadb.connect().cursor()
 
     doc_names = [f"PALANTIR_JOBS_{i}" for i in range(1, 85)]
@@ -79,6 +80,13 @@ def main():
             question_cost += cost
             responses = []
 
+            # Retrieve context for all vector_retrieval subquestions in one batch
+            vector_subqs = list(dict.fromkeys(
+                item.question for item in subquestions_bundle_list
+                if item.function.value == "vector_retrieval"
+            ))
+            retrieved = dict(zip(vector_subqs, vector_retrieval_batch(cursor, vector_subqs)))
+
             for q_no, item in enumerate(subquestions_bundle_list):
                 subquestion = item.question
                 selected_func = item.function.value
@@ -89,7 +97,8 @@ def main():
 
                     if selected_func == "vector_retrieval":
                         response, retrieval_cost = vector_retrieval(
-                            cursor, llm_model, subquestion, selected_doc
+                            cursor, llm_model, subquestion, selected_doc,
+                            chunks=retrieved[subquestion],
                         )
                         question_cost += retrieval_cost
                         print(f"✅ Response from vector retrieval: {response}...")
@@ -101,9 +110,13 @@ def main():
                         # responses.append(response)
                         pass
 
-            aggregated_response, cost = response_aggregator(llm_model, question, responses)
+            final_stream = response_aggregator_stream(llm_model, question, responses)
+            print("\n✅ Final response: ", end="", flush=True)
+            for token in final_stream:
+                print(token, end="", flush=True)
+            print()
+            cost = final_stream.cost
             question_cost += cost
-            print(f"\n✅ Final response: {aggregated_response}")
             question_cost += cost
             total_cost += question_cost
 
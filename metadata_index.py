@@ -0,0 +1,176 @@
+"""
+Inverted index over the categorical job columns, used to pre-filter rows
+before vector search.
+
+Questions like "senior engineering roles in London" or "hybrid jobs in Palo
+Alto" are mostly filters on location / department / level / workplace_type.
+At ingestion time we map every value (and, for locations, every
+comma-separated part such as "Palo Alto" in "Palo Alto, CA") to the sorted
+row ids that carry it. At query time the values mentioned in the question
+are looked up, row sets are unioned within a column group and intersected
+across groups, and similarity is only computed for the surviving rows.
+
+Postings are stored CSR-style: one int32 array of row ids per column plus an
+offsets array, so term i's rows are postings[offsets[i]:offsets[i + 1]].
+"""
+import ast
+import json
+import os
+import re
+
+import numpy as np
+
+from atomic_io import atomic_write
+
+METADATA_INDEX_FILE = "metadata_index.json"
+METADATA_POSTINGS_FILE = "metadata_index.npz"
+
+# Column groups: a question can match values of any column in a group
+# (union), and the groups it matches are intersected.
+FILTER_GROUPS = {
+    "location": ["location", "all_locations", "country"],
+    "department": ["department"],
+    "level": ["level"],
+    "workplace_type": ["workplace_type"],
+}
+
+# Parts shorter than this ("CA", "NY", "US") match too many unrelated words.
+MIN_TERM_LENGTH = 3
+
+
+def normalize_term(text):
+    return " ".join(str(text).lower().split())
+
+
+def field_values(value):
+    """
+    The plain strings held by a metadata field.
+
+    palentir_jobs.transform_job_posting wraps every field in a set literal,
+    so a chunk row carries {'Design'} in memory and "{'Design'}" once it has
+    been through the CSV / EvaDB. Both are unwrapped; plain strings pass through.
+    """
+    if value is None:
+        return []
+    if isinstance(value, (set, frozenset, list, tuple)):
+        return [str(v) for v in value]
+    text = str(value).strip()
+    if text.startswith("{") and text.endswith("}"):
+        try:
+            parsed = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            parsed = None
+        if isinstance(parsed, set):
+            return [str(v) for v in parsed]
+    return [text]
+
+
+def value_terms(value):
+    """The whole value plus each comma-separated part, e.g. 'Palo Alto, CA' -> {'palo alto, ca', 'palo alto'}."""
+    terms = set()
+    for text in field_values(value):
+        whole = normalize_term(text)
+        if len(whole) >= MIN_TERM_LENGTH:
+            terms.add(whole)
+        for part in whole.split(","):
+            part = part.strip()
+            if len(part) >= MIN_TERM_LENGTH:
+                terms.add(part)
+    return terms
+
+
+class MetadataIndex:
+    def __init__(self, num_rows, vocab, postings, offsets):
+        """
+        vocab: column -> list of terms.
+        postings / offsets: column -> CSR arrays (see module docstring).
+        """
+        self.num_rows = num_rows
+        self.vocab = vocab
+        self.postings = postings
+        self.offsets = offsets
+        self._term_ids = {col: {t: i for i, t in enumerate(terms)} for col, terms in vocab.items()}
+        self._patterns = {}
+        for group, cols in FILTER_GROUPS.items():
+            terms = sorted({t for c in cols for t in vocab.get(c, [])}, key=len, reverse=True)
+            if terms:
+                self._patterns[group] = re.compile(
+                    r"(?<!\w)(" + "|".join(re.escape(t) for t in terms) + r")(?!\w)"
+                )
+
+    @classmethod
+    def build(cls, columns):
+        """Build the index from the parallel metadata columns (column -> sequence of values)."""
+        num_rows = len(next(iter(columns.values()))) if columns else 0
+        vocab, postings, offsets = {}, {}, {}
+        for cols in FILTER_GROUPS.values():
+            for col in cols:
+                if col not in columns:
+                    continue
+                rows_by_term = {}
+                for row_id, value in enumerate(columns[col]):
+                    for term in value_terms(value):
+                        rows_by_term.setdefault(term, []).append(row_id)
+                terms = sorted(rows_by_term)
+                lists = [np.asarray(rows_by_term[t], dtype=np.int32) for t in terms]
+                vocab[col] = terms
+                postings[col] = np.concatenate(lists) if lists else np.zeros(0, dtype=np.int32)
+                offsets[col] = np.cumsum([0] + [len(l) for l in lists]).astype(np.int64)
+        return cls(num_rows, vocab, postings, offsets)
+
+    def rows_for(self, column, term):
+        term_id = self._term_ids.get(column, {}).get(term)
+        if term_id is None:
+            return np.zeros(0, dtype=np.int32)
+        return self.postings[column][self.offsets[column][term_id]:self.offsets[column][term_id + 1]]
+
+    def match_filters(self, question):
+        """Return {group: set of matched terms} for the filter values mentioned in the question."""
+        text = normalize_term(question)
+        matched = {}
+        for group, pattern in self._patterns.items():
+            terms = set(pattern.findall(text))
+            if terms:
+                matched[group] = terms
+        return matched
+
+    def candidates(self, question):
+        """
+        Sorted row ids that satisfy every filter mentioned in the question,
+        or None if the question mentions no filter value (search everything).
+        An empty array means the filters are contradictory for this corpus.
+        """
+        matched = self.match_filters(question)
+        if not matched:
+            return None
+        result = None
+        for group, terms in matched.items():
+            group_rows = np.unique(np.concatenate(
+                [self.rows_for(col, t) for col in FILTER_GROUPS[group] for t in terms]
+            ))
+            result = group_rows if result is None else np.intersect1d(result, group_rows, assume_unique=True)
+        return result
+
+    def save(self, store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+        with atomic_write(os.path.join(store_dir, METADATA_INDEX_FILE), encoding="utf-8") as f:
+            json.dump({"num_rows": self.num_rows, "vocab": self.vocab}, f)
+        arrays = {}
+        for col in self.vocab:
+            arrays[f"{col}.postings"] = self.postings[col]
+            arrays[f"{col}.offsets"] = self.offsets[col]
+        with atomic_write(os.path.join(store_dir, METADATA_POSTINGS_FILE), "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, store_dir):
+        with open(os.path.join(store_dir, METADATA_INDEX_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(os.path.join(store_dir, METADATA_POSTINGS_FILE)) as arrays:
+            postings = {col: arrays[f"{col}.postings"] for col in meta["vocab"]}
+            offsets = {col: arrays[f"{col}.offsets"] for col in meta["vocab"]}
+        return cls(meta["num_rows"], meta["vocab"], postings, offsets)
+
+    @staticmethod
+    def exists(store_dir):
+        return os.path.exists(os.path.join(store_dir, METADATA_INDEX_FILE))
@@ -1,20 +1,42 @@
 # main_offline_setup.py
+"""
+Scrape the job postings and (re)build the vector store:
 
-from palentir_jobs import scrape_palantir_jobs, load_palantir_job_postings
-from vector_store import generate_vector_stores, generate_unified_vector_store
-import evadb
+    python offline_setup.py                 # full rebuild of the EvaDB tables + matrix store
+    python offline_setup.py --incremental   # only embed new / changed chunks (matrix store)
+    python offline_setup.py --matrix-only   # matrix store only, embedded by a pool of encoder processes
+"""
+import argparse
 
-def offline_setup():
-    # 1) Connect to EvaDB
-    cursor = evadb.connect("./evadb_data").cursor()  # use a consistent path
+from palentir_jobs import scrape_palantir_jobs, bulk_load_palantir_job_postings
+from vector_store import generate_embedding_store, generate_unified_vector_store, update_unified_vector_store
+
+def offline_setup(incremental=False, matrix_only=False):
     print("Scraping job postings...")
     postings = scrape_palantir_jobs()
     print(f"Scraped {len(postings)} postings.")
 
-    # 2) Create CSVs
-    print("Creating CSVs from job postings...")
-    doc_names = load_palantir_job_postings(postings)
-    print(f"Created CSVs for {len(doc_names)} docs: {doc_names[:5]}...")
+    # 1) Write every chunk into one CSV, loaded with a single LOAD CSV
+    print("Creating the job postings CSV...")
+    doc_names = bulk_load_palantir_job_postings(postings)
+    print(f"Created {doc_names[0]}.csv for {len(postings)} postings.")
+
+    if incremental:
+        # 2) Re-embed only what changed since the last build
+        print("Updating the embedding store in place...")
+        update_unified_vector_store(doc_names)
+        return
+
+    if matrix_only:
+        # 2) Embed straight into the matrix store (INGEST_EMBED_BATCH_SIZE / INGEST_EMBED_WORKERS)
+        print("Embedding chunks into the embedding store...")
+        generate_embedding_store(doc_names)
+        return
+
+    # 2) Connect to EvaDB
+    import evadb
+
+    cursor = evadb.connect("./evadb_data").cursor()  # use a consistent path
 
     # 3) Build vector store
     print("Initializing EvaDB vector store & indexes...")
@@ -26,4 +48,10 @@ def offline_setup():
     print("Tables in EvaDB now:", df)
 
 if __name__ == "__main__":
-    offline_setup()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incremental", action="store_true",
+                        help="embed only new or changed chunks and drop closed postings")
+    parser.add_argument("--matrix-only", action="store_true",
+                        help="build only the matrix store (RETRIEVAL_BACKEND=matrix), skipping EvaDB")
+    args = parser.parse_args()
+    offline_setup(incremental=args.incremental, matrix_only=args.matrix_only)
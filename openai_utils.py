@@ -1,12 +1,18 @@
 import os
 import sys
+import json
+import time
+import asyncio
+import hashlib
+import functools
 import logging
+import sqlite3
+import threading
+import weakref
 
-from openai import OpenAI
 from dotenv import load_dotenv
+# Before any setting below is read; only the SDK and its client are lazy.
 load_dotenv()
-client = OpenAI()
-import tiktoken
 
 from tenacity import (
     retry,
@@ -15,9 +21,43 @@ from tenacity import (
     after_log,
 )  # for exponential backoff
 
+from llm_backends import create_backend
+from rate_limiter import RateLimiter, SingleFlight, AsyncSingleFlight
+from telemetry import LLM_CALLS, record_span, span
+
 logging.basicConfig(stream=sys.stderr, level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Where chat completions come from: "openai", or "fake" for the offline
+# FakeLLMBackend (see llm_backends.py).
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+
+# Upper bound on llm_call_async requests in flight at once (per event loop).
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+
+# Persistent response cache (every call uses temperature=0, so identical
+# requests get identical answers). LLM_CACHE=0 bypasses it for every call.
+# Off by default with the fake backend, so fake answers never mix with real ones.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "1" if LLM_BACKEND == "openai" else "0") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.sqlite")
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "10000"))
+
+# Client-side limits shared by every call in the process (0 = not enforced).
+# The fake backend has no quota, so they default to off for it.
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "3500" if LLM_BACKEND == "openai" else "0"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "60000" if LLM_BACKEND == "openai" else "0"))
+# Completion tokens assumed for a request that doesn't set max_tokens.
+LLM_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", "256"))
+
+# Built on first use by get_llm_backend(): importing the OpenAI SDK and
+# constructing its clients takes ~0.5 s, which shouldn't delay process start.
+llm_backend = None
+_llm_backend_lock = threading.Lock()
+rate_limiter = RateLimiter(OPENAI_RPM, OPENAI_TPM)
+# Concurrent identical (non-streaming) requests share one API call.
+llm_singleflight = SingleFlight()
+llm_singleflight_async = AsyncSingleFlight()
+
 OPENAI_PRICING = {
     "gpt-3.5-turbo": {"prompt": 0.0015, "completion": 0.002},
     "gpt-3.5-turbo-0125": {"prompt": 0.0015, "completion": 0.002},
@@ -36,13 +76,100 @@ OPENAI_MODEL_CONTEXT_LENGTH = {
 }
 
 
+def get_llm_backend():
+    """The process-wide LLM backend, created on first call."""
+    global llm_backend
+    if llm_backend is None:
+        with _llm_backend_lock:
+            if llm_backend is None:
+                llm_backend = create_backend(LLM_BACKEND)
+    return llm_backend
+
+
+def _is_rate_limit(error):
+    from openai import RateLimitError
+
+    return isinstance(error, RateLimitError)
+
+
+def retry_after_seconds(error):
+    """Retry-After of a 429 response in seconds, or None if the server sent none."""
+    response = getattr(error, "response", None)
+    headers = response.headers if response is not None else {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+_random_backoff = wait_random_exponential(min=1, max=60)
+
+
+def wait_for_retry(retry_state):
+    """
+    After a 429 with Retry-After the rate limiter is already paused for every
+    caller, so retry right away (the next acquire waits). Otherwise back off.
+    """
+    error = retry_state.outcome.exception()
+    if _is_rate_limit(error) and retry_after_seconds(error) is not None:
+        return 0
+    return _random_backoff(retry_state)
+
+
+def _on_rate_limited(error):
+    seconds = retry_after_seconds(error)
+    logger.warning(f"OpenAI rate limit hit; pausing LLM calls for {seconds}s.")
+    if seconds is not None:
+        rate_limiter.pause(seconds)
+
+
 @retry(
-    wait=wait_random_exponential(min=1, max=60),
+    wait=wait_for_retry,
     stop=stop_after_attempt(6),
     after=after_log(logger, logging.INFO),
 )
 def completion_with_backoff(**kwargs):
-    return client.chat.completions.create(**kwargs)
+    backend = get_llm_backend()
+    rate_limiter.acquire(estimate_request_tokens(kwargs))
+    try:
+        return backend.complete(**kwargs)
+    except Exception as e:
+        if _is_rate_limit(e):
+            _on_rate_limited(e)
+        raise
+
+
+@retry(
+    wait=wait_for_retry,
+    stop=stop_after_attempt(6),
+    after=after_log(logger, logging.INFO),
+)
+async def completion_with_backoff_async(**kwargs):
+    backend = get_llm_backend()
+    await rate_limiter.acquire_async(estimate_request_tokens(kwargs))
+    async with _llm_semaphore():
+        try:
+            return await backend.complete_async(**kwargs)
+        except Exception as e:
+            if _is_rate_limit(e):
+                _on_rate_limited(e)
+            raise
+
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _llm_semaphore():
+    """The LLM_MAX_CONCURRENCY semaphore of the running event loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return semaphore
 
 
 def llm_call_cost(response):
@@ -56,14 +183,102 @@ def llm_call_cost(response):
     return prompt_token_cost + completion_token_cost
 
 
-def llm_call(
-    model,
-    function_schema=None,
-    output_schema=None,
-    system_prompt="You are an AI assistant that answers user questions using the context provided.",
-    user_prompt="Please help me answer the following question:",
-    few_shot_examples=None,
-):
+class LLMResponseCache:
+    """
+    SQLite-backed cache of chat completions, keyed by a hash of the request
+    (model, messages, functions, function_call, temperature). Holds at most
+    max_entries rows; the least recently used ones are evicted first.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.cost_saved = 0.0
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, cost REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        return self._conn
+
+    @staticmethod
+    def make_key(request):
+        payload = json.dumps(
+            {field: request.get(field) for field in ("model", "temperature", "messages", "functions", "function_call")},
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return (ChatCompletion, original cost) or None."""
+        from openai.types.chat import ChatCompletion
+
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT response, cost FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self.hits += 1
+            self.cost_saved += row[1]
+        return ChatCompletion.model_validate_json(row[0]), row[1]
+
+    def put(self, key, response, cost):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, cost, last_used) VALUES (?, ?, ?, ?)",
+                (key, response.model_dump_json(), cost, time.time()),
+            )
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+            self.hits = 0
+            self.misses = 0
+            self.cost_saved = 0.0
+
+    def stats(self):
+        with self._lock:
+            size = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "enabled": LLM_CACHE_ENABLED,
+                "size": size,
+                "max_size": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "cost_saved": round(self.cost_saved, 6),
+            }
+
+
+llm_cache = LLMResponseCache()
+
+
+def build_request(model, function_schema, output_schema, system_prompt, user_prompt, few_shot_examples):
+    """Chat completion kwargs shared by llm_call and llm_call_async."""
     kwargs = {}
     if function_schema is not None:
         kwargs["functions"] = function_schema
@@ -78,21 +293,279 @@ def llm_call(
     if user_prompt is not None:
         messages.append({"role": "user", "content": user_prompt})
 
-    response = completion_with_backoff(
-        model=model,
-        temperature=0,
-        messages=messages,
-        **kwargs
-    )
+    return dict(model=model, temperature=0, messages=messages, **kwargs)
+
+
+class _StreamedCompletion:
+    """
+    Shared state of LLMStream / AsyncLLMStream: collects the text deltas and
+    the usage chunk, and prices the call once the stream is exhausted.
+    """
 
-    # print cost of call
-    call_cost = llm_call_cost(response)
-    print(f"🤑 LLM call cost: ${call_cost:.4f}")
-    return response, call_cost
+    def __init__(self, request, chunks, cache_key=None, cached=None):
+        self.request = request
+        self.model = request["model"]
+        self.usage = None
+        self.cost = None
+        self.done = False
+        self._chunks = chunks
+        self._cache_key = cache_key
+        self._parts = []
+        self._started = time.perf_counter()
+        if cached is not None:
+            # Replay of a cached completion: one delta with the whole answer, free.
+            self.model = cached.model
+            self.usage = cached.usage
+            self._parts.append(cached.choices[0].message.content or "")
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def _consume(self, chunk):
+        """Record one ChatCompletionChunk; return its text delta (or None)."""
+        self.model = chunk.model or self.model
+        if chunk.usage is not None:
+            self.usage = chunk.usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            self._parts.append(chunk.choices[0].delta.content)
+            return chunk.choices[0].delta.content
+        return None
+
+    def _finish(self):
+        self.done = True
+        if self._chunks is None:
+            self.cost = 0.0
+            print("🤑 LLM call cost: $0.0000 (cached)")
+            LLM_CALLS.inc(model=self.model, source="cache")
+            record_span("llm_call", time.perf_counter() - self._started)
+            return
+        if self.usage is None:
+            # No usage chunk from the server: count the tokens ourselves
+            from openai.types import CompletionUsage
+
+            prompt_tokens = sum(
+                get_num_tokens_simple(self.request["model"], m["content"] or "") for m in self.request["messages"]
+            )
+            completion_tokens = get_num_tokens_simple(self.request["model"], self.text)
+            self.usage = CompletionUsage(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            )
+        self.cost = llm_call_cost(self)
+        print(f"🤑 LLM call cost: ${self.cost:.4f}")
+        LLM_CALLS.inc(model=self.model, source="api")
+        record_span(
+            "llm_call", time.perf_counter() - self._started, self.cost,
+            prompt_tokens=self.usage.prompt_tokens, completion_tokens=self.usage.completion_tokens,
+        )
+
+    def _store(self):
+        """Cache the finished answer (SQLite write; async streams run it off the event loop)."""
+        if self._chunks is not None and self._cache_key is not None:
+            llm_cache.put(self._cache_key, self.to_completion(), self.cost)
+
+    def to_completion(self):
+        """The streamed answer as a regular ChatCompletion."""
+        from openai.types.chat import ChatCompletion
+
+        return ChatCompletion.model_validate({
+            "id": "stream",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": self.model,
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": self.text},
+            }],
+            "usage": self.usage.model_dump() if self.usage is not None else None,
+        })
+
+
+class LLMStream(_StreamedCompletion):
+    """
+    Iterate to get the answer's text deltas as they arrive. After the last
+    one, .text is the full answer and .usage / .cost are set.
+    """
+
+    def __iter__(self):
+        if self._chunks is not None:
+            for chunk in self._chunks:
+                delta = self._consume(chunk)
+                if delta:
+                    yield delta
+        elif self._parts:
+            yield self.text
+        self._finish()
+        self._store()
+
+
+class AsyncLLMStream(_StreamedCompletion):
+    """LLMStream for `async for`."""
+
+    async def __aiter__(self):
+        if self._chunks is not None:
+            async for chunk in self._chunks:
+                delta = self._consume(chunk)
+                if delta:
+                    yield delta
+        elif self._parts:
+            yield self.text
+        self._finish()
+        await asyncio.to_thread(self._store)
+
+
+def _stream_kwargs():
+    # Ask for a final chunk with the token usage so streamed calls can be priced
+    return dict(stream=True, stream_options={"include_usage": True})
+
+
+def llm_call(
+    model,
+    function_schema=None,
+    output_schema=None,
+    system_prompt="You are an AI assistant that answers user questions using the context provided.",
+    user_prompt="Please help me answer the following question:",
+    few_shot_examples=None,
+    use_cache=True,
+    stream=False,
+):
+    """
+    Chat completion at temperature 0. Identical requests are answered from
+    llm_cache (cost 0.0) unless use_cache=False or LLM_CACHE=0.
+    With stream=True, returns an LLMStream instead of (response, cost).
+    """
+    request = build_request(model, function_schema, output_schema, system_prompt, user_prompt, few_shot_examples)
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    key = LLMResponseCache.make_key(request)
+    cached = llm_cache.get(key) if use_cache else None
+
+    if stream:
+        if cached is not None:
+            return LLMStream(request, None, cached=cached[0])
+        chunks = completion_with_backoff(**request, **_stream_kwargs())
+        return LLMStream(request, chunks, cache_key=key if use_cache else None)
+
+    with span("llm_call") as call_span:
+        if cached is not None:
+            print(f"🤑 LLM call cost: $0.0000 (cached, saved ${cached[1]:.4f})")
+            LLM_CALLS.inc(model=model, source="cache")
+            return cached[0], 0.0
+
+        response, shared = llm_singleflight.do(key, lambda: completion_with_backoff(**request))
+        if shared:
+            print("🤑 LLM call cost: $0.0000 (shared an identical in-flight request)")
+            LLM_CALLS.inc(model=model, source="coalesced")
+            return response, 0.0
+
+        # print cost of call
+        call_cost = llm_call_cost(response)
+        print(f"🤑 LLM call cost: ${call_cost:.4f}")
+        LLM_CALLS.inc(model=response.model, source="api")
+        call_span.record(
+            call_cost, prompt_tokens=response.usage.prompt_tokens, completion_tokens=response.usage.completion_tokens
+        )
+        if use_cache:
+            llm_cache.put(key, response, call_cost)
+        return response, call_cost
+
+
+async def llm_call_async(
+    model,
+    function_schema=None,
+    output_schema=None,
+    system_prompt="You are an AI assistant that answers user questions using the context provided.",
+    user_prompt="Please help me answer the following question:",
+    few_shot_examples=None,
+    use_cache=True,
+    stream=False,
+):
+    """
+    Async llm_call on the backend's async client. At most LLM_MAX_CONCURRENCY
+    requests run at once; await several with asyncio.gather to overlap them.
+    Shares llm_cache with llm_call; its SQLite reads and writes run in a
+    worker thread so they don't block the event loop.
+    With stream=True, returns an AsyncLLMStream.
+    """
+    request = build_request(model, function_schema, output_schema, system_prompt, user_prompt, few_shot_examples)
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    key = LLMResponseCache.make_key(request)
+    cached = await asyncio.to_thread(llm_cache.get, key) if use_cache else None
+
+    if stream:
+        if cached is not None:
+            return AsyncLLMStream(request, None, cached=cached[0])
+        chunks = await completion_with_backoff_async(**request, **_stream_kwargs())
+        return AsyncLLMStream(request, chunks, cache_key=key if use_cache else None)
+
+    with span("llm_call") as call_span:
+        if cached is not None:
+            print(f"🤑 LLM call cost: $0.0000 (cached, saved ${cached[1]:.4f})")
+            LLM_CALLS.inc(model=model, source="cache")
+            return cached[0], 0.0
+
+        response, shared = await llm_singleflight_async.do(key, lambda: completion_with_backoff_async(**request))
+        if shared:
+            print("🤑 LLM call cost: $0.0000 (shared an identical in-flight request)")
+            LLM_CALLS.inc(model=model, source="coalesced")
+            return response, 0.0
+
+        call_cost = llm_call_cost(response)
+        print(f"🤑 LLM call cost: ${call_cost:.4f}")
+        LLM_CALLS.inc(model=response.model, source="api")
+        call_span.record(
+            call_cost, prompt_tokens=response.usage.prompt_tokens, completion_tokens=response.usage.completion_tokens
+        )
+        if use_cache:
+            await asyncio.to_thread(llm_cache.put, key, response, call_cost)
+        return response, call_cost
+
+
+def get_context_length(model):
+    """Context window of the model (longest matching name prefix; 4097 if unknown)."""
+    matches = [name for name in OPENAI_MODEL_CONTEXT_LENGTH if model.startswith(name)]
+    if not matches:
+        return OPENAI_MODEL_CONTEXT_LENGTH["gpt-3.5-turbo"]
+    return OPENAI_MODEL_CONTEXT_LENGTH[max(matches, key=len)]
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model):
+    """tiktoken encoder for the model, built once per process (loading one takes ~100 ms)."""
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
 
 
 def get_num_tokens_simple(model, prompt):
     """Estimate the number of tokens in the prompt using tiktoken"""
-    encoding = tiktoken.encoding_for_model(model)
+    encoding = get_encoding(model)
     num_tokens = len(encoding.encode(prompt))
-    return num_tokens
\ No newline at end of file
+    return num_tokens
+
+
+def estimate_request_tokens(request):
+    """Tokens a chat request will count against the TPM limit: prompt + expected completion."""
+    texts = [message.get("content") or "" for message in request["messages"]]
+    if request.get("functions"):
+        texts.append(json.dumps(request["functions"]))
+    try:
+        prompt_tokens = sum(get_num_tokens_simple(request["model"], text) for text in texts)
+    except Exception:
+        # Tokenizer files unavailable (e.g. offline): about 4 characters per token
+        prompt_tokens = sum(len(text) for text in texts) // 4
+    prompt_tokens += 4 * len(request["messages"])
+    return prompt_tokens + request.get("max_tokens", LLM_COMPLETION_TOKEN_ESTIMATE)
+
+
+def truncate_to_tokens(model, text, max_tokens):
+    """Cut text to at most max_tokens tokens."""
+    tokens = get_encoding(model).encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return get_encoding(model).decode(tokens[:max(max_tokens, 0)])
\ No newline at end of file
@@ -71,27 +71,27 @@ def transform_job_posting(posting_dict):
 
 
 import os
-import requests
 
-def scrape_palantir_jobs(url=None):
+from job_fetcher import JobBoardFetcher
+
+def scrape_palantir_jobs(url=None, fetcher=None):
     """
-    Simple GET call to the Palantir (or Lever-based) jobs API.
-    Returns a list of raw posting dictionaries.
+    Fetch every page of the Palantir (or Lever-based) jobs API, following
+    its offset cursor. Returns a list of raw posting dictionaries.
+
+    Pages are cached on disk and revalidated with ETag / If-Modified-Since
+    (see job_fetcher), so a refresh only downloads the pages that changed;
+    unchanged pages come back as concurrent 304s.
     """
     if url is None:
         url = "https://www.palantir.com/api/lever/v1/postings?state=published&offset=%5B1696975658415%2C%2264602c2e-4581-46eb-822d-e2172ee85937%22%5D"
 
-    resp = requests.get(url)
-    resp.raise_for_status()
-    data = resp.json()
-    # Often the JSON might be a dict with a 'postings' key or it might be a list.
-    # Adapt accordingly:
-    if isinstance(data, dict) and "data" in data:
-        return data["data"]
-    elif isinstance(data, list):
-        return data
-    else:
-        return []
+    if fetcher is not None:
+        return fetcher.walk(url)
+    with JobBoardFetcher() as fetcher:
+        postings = fetcher.walk(url)
+        print(f"Fetched {len(postings)} postings: {fetcher.stats()}")
+    return postings
 
 # def chunk_text_and_attach_metadata(post_dict):
 #     """
@@ -172,6 +172,13 @@ def sentence_aware_chunker(text, max_chunk_size=500):
     return chunks
 
 import csv
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker processes for cleaning + chunking postings: 1 runs them serially in
+# this process, 0 starts one per core.
+TRANSFORM_WORKERS = int(os.getenv("TRANSFORM_WORKERS", "1"))
+# Postings sent to a worker per task; 0 picks about four tasks per worker.
+TRANSFORM_CHUNKSIZE = int(os.getenv("TRANSFORM_CHUNKSIZE", "0"))
 
 # def write_job_chunks_to_csv(filename, row_dicts):
 #     if not row_dicts:
@@ -264,47 +271,105 @@ def write_job_chunks_to_csv(filename, row_dicts):
         return
     os.makedirs(os.path.dirname(filename), exist_ok=True)
 
+    # Write CSV
+    with open(filename, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=_csv_field_names(row_dicts[0]))
+        writer.writeheader()
+        for row in row_dicts:
+            writer.writerow(row)
+
+
+def _csv_field_names(row):
+    """Field names of a chunk row, with doc_name forced to be the first column."""
     # Extract the field names from the first row
-    all_fields = list(row_dicts[0].keys())
+    all_fields = list(row.keys())
 
     # Force doc_name to be the first column if present
     if "doc_name" in all_fields:
         # Remove doc_name then prepend it
         all_fields.remove("doc_name")
-        field_names = ["doc_name"] + all_fields
-    else:
-        field_names = all_fields
+        return ["doc_name"] + all_fields
+    return all_fields
 
-    # Write CSV
-    with open(filename, mode='w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=field_names)
-        writer.writeheader()
-        for row in row_dicts:
-            writer.writerow(row)
+
+def _posting_rows(numbered_posting):
+    """Worker task: chunk rows of the (i, post_dict) posting."""
+    i, post_dict = numbered_posting
+    return chunk_text_and_attach_metadata(post_dict, f"PALANTIR_JOBS_{i}")
+
+
+def iter_posting_rows(postings, workers=TRANSFORM_WORKERS, chunksize=TRANSFORM_CHUNKSIZE):
+    """
+    Yield the chunk rows of each posting (see chunk_text_and_attach_metadata),
+    in the order of `postings`; posting i (from 1) is doc PALANTIR_JOBS_<i>.
+
+    With workers != 1 the HTML cleaning and chunking run in a process pool:
+    postings are handed out `chunksize` at a time, so the per-task overhead
+    (pickling, IPC) is paid per batch rather than per posting, and results
+    come back in input order.
+    """
+    numbered = list(enumerate(postings, start=1))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(numbered) < 2:
+        yield from map(_posting_rows, numbered)
+        return
+    workers = min(workers, len(numbered))
+    chunksize = chunksize or max(1, len(numbered) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_posting_rows, numbered, chunksize=chunksize)
 
 
 # ------------------------------------------------------------------
 # 3) load_palantir_job_postings to produce CSVs with doc_name inside
 # ------------------------------------------------------------------
-def load_palantir_job_postings(postings):
+def load_palantir_job_postings(postings, workers=TRANSFORM_WORKERS, chunksize=TRANSFORM_CHUNKSIZE):
     """
     postings is a list of raw job data.
 
     For each post_dict:
-      - chunk the text (and add doc_name)
+      - chunk the text (and add doc_name), in `workers` processes
+        (see iter_posting_rows)
       - write out a CSV with doc_name as the first column.
 
     Returns a list of doc_names (the base file names).
     """
     doc_names = []
-    for i, post_dict in enumerate(postings, start=1):
+    for i, rows in enumerate(iter_posting_rows(postings, workers, chunksize), start=1):
         doc_name = f"PALANTIR_JOBS_{i}"
-        # chunk + attach doc_name + metadata
-        rows = chunk_text_and_attach_metadata(post_dict, doc_name)
 
         # write CSV
         file_path = f"data/palantir_careers/{doc_name}.csv"
         write_job_chunks_to_csv(file_path, rows)
 
         doc_names.append(doc_name)
-    return doc_names
\ No newline at end of file
+    return doc_names
+
+
+# ------------------------------------------------------------------
+# 4) bulk_load_palantir_job_postings: every chunk in one CSV
+# ------------------------------------------------------------------
+# One consolidated CSV (and so one LOAD CSV) for all postings. The rows keep
+# their per-posting doc_name; only the file is shared.
+BULK_DOC_NAME = "ALL_JOBS"
+
+
+def bulk_load_palantir_job_postings(postings, workers=TRANSFORM_WORKERS, chunksize=TRANSFORM_CHUNKSIZE):
+    """
+    Like load_palantir_job_postings, but the chunk rows of all postings are
+    streamed (in posting order) into the single file
+    data/palantir_careers/ALL_JOBS.csv instead of one CSV per posting.
+
+    Returns [BULK_DOC_NAME], the doc list to pass to generate_unified_vector_store.
+    """
+    file_path = f"data/palantir_careers/{BULK_DOC_NAME}.csv"
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, mode='w', newline='', encoding='utf-8') as f:
+        writer = None
+        for rows in iter_posting_rows(postings, workers, chunksize):
+            if not rows:
+                continue
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=_csv_field_names(rows[0]))
+                writer.writeheader()
+            writer.writerows(rows)
+    return [BULK_DOC_NAME]
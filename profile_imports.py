@@ -0,0 +1,111 @@
+# profile_imports.py
+"""
+Import-time profile of the project's modules. Each module is imported cold,
+in a fresh interpreter run with `python -X importtime`, so its time includes
+every dependency it pulls in:
+
+    python profile_imports.py                       # all project modules
+    python profile_imports.py server openai_utils   # just these
+    python profile_imports.py server --top 15       # + its 15 slowest dependencies
+
+Prints, per module, the wall time of `import <module>` (or the error if it
+can't be imported here) and, with --top, the packages that contribute most
+to it (cumulative time of each top-level package, counted where it is first
+imported). Use it to check that the modules the server imports at startup
+stay cheap and the heavy ones (evadb, openai, torch...) are only imported
+by the background warm-up.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Project modules, roughly in dependency order.
+DEFAULT_MODULES = [
+    "telemetry",
+    "warmup",
+    "rate_limiter",
+    "llm_backends",
+    "openai_utils",
+    "embeddings",
+    "quantization",
+    "metadata_index",
+    "keyword_index",
+    "ivf_index",
+    "embedding_store",
+    "vector_store",
+    "context_packer",
+    "retrieval",
+    "subquestion_generator",
+    "aggregator",
+    "job_seeking",
+    "palentir_jobs",
+    "server",
+]
+
+
+def importtime(module):
+    """Run `import module` cold; return (rows, error). rows: [(depth, self_us, cumulative_us, name)]."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    rows = []
+    other = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            other.append(line)
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((depth, int(fields[0]), int(fields[1]), name.strip()))
+    error = other[-1] if proc.returncode != 0 and other else None
+    return rows, error
+
+
+def top_packages(rows, module, n):
+    """Cumulative microseconds per top-level package imported by `module`."""
+    # Children are listed before their parent: the module's imports are the
+    # nested rows just above its own top-level row (the rest is interpreter startup).
+    end = next((i for i, row in enumerate(rows) if row[0] == 0 and row[3] == module), 0)
+    start = end
+    while start > 0 and rows[start - 1][0] > 0:
+        start -= 1
+    totals = {}
+    for depth, _, cumulative, name in rows[start:end]:
+        package = name.split(".")[0]
+        if package == module:
+            continue
+        # Only the outermost import of each package: nested ones are inside its cumulative time
+        if package not in totals or depth < totals[package][0]:
+            totals[package] = (depth, cumulative)
+        elif depth == totals[package][0]:
+            totals[package] = (depth, totals[package][1] + cumulative)
+    return sorted(((us, package) for package, (_, us) in totals.items()), reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--top", type=int, default=0, help="show the N slowest packages each module imports")
+    args = parser.parse_args()
+
+    print(f"{'module':<24}  {'import (ms)':>11}")
+    for module in args.modules:
+        rows, error = importtime(module)
+        if error is not None:
+            print(f"{module:<24}  {'failed':>11}  {error}")
+            continue
+        total = next((cumulative for depth, _, cumulative, name in rows if depth == 0 and name == module), 0)
+        print(f"{module:<24}  {total / 1000:>11.1f}")
+        for us, package in top_packages(rows, module, args.top):
+            print(f"{'':<4}{package:<20}  {us / 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compact (float16 / int8) copies of the embedding matrix.
+
+The float32 matrix stays on disk (memory-mapped, only the rows we touch get
+paged in); the search scans a compact in-memory copy and the best few hundred
+candidates are rescored exactly against the float32 rows.
+
+int8 uses one scale per dimension: scale[d] = max |x[:, d]| / 127 and
+codes = round(x / scale). Since q . x ~= (q * scale) . codes, scoring never
+needs to de-quantize the whole matrix.
+"""
+import os
+
+import numpy as np
+
+from atomic_io import atomic_write
+
+QUANTIZATIONS = ("none", "float16", "int8")
+
+# Rows converted to float32 at a time while scoring, to bound the scratch memory.
+SCORE_BLOCK_ROWS = 8192
+
+
+def compact_file(dtype):
+    return f"embeddings.{dtype}.npy"
+
+
+def scales_file(dtype):
+    return f"embeddings.{dtype}.scales.npy"
+
+
+class QuantizedMatrix:
+    def __init__(self, codes, scales=None):
+        """codes: (n, dim) float16 or int8; scales: (dim,) float32 for int8."""
+        self.codes = codes
+        self.scales = scales
+        self.dtype = "int8" if codes.dtype == np.int8 else "float16"
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    @classmethod
+    def quantize(cls, matrix, dtype):
+        """Quantize a (possibly memory-mapped) float32 matrix block by block."""
+        n = len(matrix)
+        if dtype == "float16":
+            codes = np.empty(matrix.shape, dtype=np.float16)
+            for start in range(0, n, SCORE_BLOCK_ROWS):
+                codes[start:start + SCORE_BLOCK_ROWS] = matrix[start:start + SCORE_BLOCK_ROWS]
+            return cls(codes)
+        if dtype == "int8":
+            max_abs = np.zeros(matrix.shape[1], dtype=np.float32)
+            for start in range(0, n, SCORE_BLOCK_ROWS):
+                np.maximum(max_abs, np.abs(matrix[start:start + SCORE_BLOCK_ROWS]).max(axis=0), out=max_abs)
+            scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            codes = np.empty(matrix.shape, dtype=np.int8)
+            for start in range(0, n, SCORE_BLOCK_ROWS):
+                block = np.asarray(matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+                codes[start:start + SCORE_BLOCK_ROWS] = np.clip(np.rint(block / scales), -127, 127)
+            return cls(codes, scales)
+        raise ValueError(f"Unknown quantization: {dtype}")
+
+    def scores(self, query_vector, rows=None):
+        """Approximate dot products of query_vector with every row (or the given rows)."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        if self.scales is not None:
+            query = query * self.scales
+        codes = self.codes if rows is None else self.codes[rows]
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+            block = codes[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+            out[start:start + SCORE_BLOCK_ROWS] = block @ query
+        return out
+
+    def save(self, store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+        with atomic_write(os.path.join(store_dir, compact_file(self.dtype)), "wb") as f:
+            np.save(f, self.codes)
+        if self.scales is not None:
+            with atomic_write(os.path.join(store_dir, scales_file(self.dtype)), "wb") as f:
+                np.save(f, self.scales)
+
+    @classmethod
+    def load(cls, store_dir, dtype):
+        codes = np.load(os.path.join(store_dir, compact_file(dtype)))
+        scales = np.load(os.path.join(store_dir, scales_file(dtype))) if dtype == "int8" else None
+        return cls(codes, scales)
+
+    @staticmethod
+    def exists(store_dir, dtype):
+        return os.path.exists(os.path.join(store_dir, compact_file(dtype)))
@@ -0,0 +1,167 @@
+"""
+Client-side rate limiting and request coalescing for the OpenAI layer.
+
+RateLimiter keeps one token bucket for requests/minute and one for
+tokens/minute. A caller reserves 1 request + its estimated tokens up front
+and sleeps until the buckets can cover them, so workers queue locally
+instead of all hitting the API and collecting 429s. When a 429 does come
+back, pause() holds every caller until the server's Retry-After has passed.
+
+SingleFlight / AsyncSingleFlight let concurrent identical requests share
+one in-flight call: the first caller (leader) makes it, the others wait for
+its result.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+
+class TokenBucket:
+    """
+    Bucket refilled at rate_per_minute up to `capacity`. reserve() may drive
+    the level negative (a debt), and returns how long the caller must wait
+    for the debt to be repaid - callers are served in reservation order.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def reserve(self, amount, now):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        """Limits <= 0 are not enforced."""
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.paused_until = 0.0
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self.pauses = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens):
+        """Book one request of `tokens` tokens; return the seconds to wait before sending it."""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self.paused_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            if wait > 0:
+                self.waits += 1
+                self.waited_seconds += wait
+            return wait
+
+    def acquire(self, tokens):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold every caller for `seconds` (e.g. the Retry-After of a 429)."""
+        with self._lock:
+            self.pauses += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests_per_minute": self.requests.rate * 60 if self.requests else None,
+                "tokens_per_minute": self.tokens.rate * 60 if self.tokens else None,
+                "waits": self.waits,
+                "waited_seconds": round(self.waited_seconds, 3),
+                "pauses": self.pauses,
+            }
+
+
+class SingleFlight:
+    """Thread-safe single-flight: concurrent do(key, fn) calls share one fn() run."""
+
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return (result, shared); shared is True if another caller made the call."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines; in-flight calls are tracked per event loop.
+
+    The shared call runs in its own task that every caller (the leader
+    included) awaits through asyncio.shield, so cancelling one caller, e.g.
+    a client disconnecting, does not fail the others. The task is cancelled
+    only when every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._calls = weakref.WeakKeyDictionary()  # loop -> {key: [task, waiters]}
+
+    async def do(self, key, coro_fn):
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        call = calls.get(key)
+        leader = call is None
+        if leader:
+            call = calls[key] = [asyncio.ensure_future(coro_fn()), 0]
+            call[0].add_done_callback(lambda task: self._finished(calls, key, call))
+        else:
+            self.shared += 1
+        task = call[0]
+        call[1] += 1
+        try:
+            return await asyncio.shield(task), not leader
+        except asyncio.CancelledError:
+            if not task.done() and call[1] == 1:
+                task.cancel()  # nobody is left waiting for the result
+                if calls.get(key) is call:
+                    del calls[key]  # a new caller starts a fresh call
+            raise
+        finally:
+            call[1] -= 1
+
+    @staticmethod
+    def _finished(calls, key, call):
+        if calls.get(key) is call:
+            del calls[key]
+        task = call[0]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; the waiters re-raise it
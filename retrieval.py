@@ -1,4 +1,15 @@
-from openai_utils import llm_call
+from openai_utils import llm_call, llm_call_async, get_num_tokens_simple
+from context_packer import context_budget, pack_chunks, pack_text
+from vector_store import ALL_JOBS_COLUMNS, similarity_search_query
+from embedding_store import (
+    RETRIEVAL_BACKEND,
+    RETRIEVAL_DISTINCT_JOBS,
+    RETRIEVAL_MODE,
+    RETRIEVAL_MODES,
+    get_embedding_store,
+)
+from embeddings import embed_texts
+from telemetry import span
 # def vector_retrieval(cursor, llm_model, question, doc_name):
 #     """
 #     Returns the answer to a factoid question using vector retrieval,
@@ -80,79 +91,97 @@ from openai_utils import llm_call
 #     answer = response.choices[0].message.content
 #     return answer, cost
 
-def vector_retrieval(cursor, llm_model, question, doc_name=None):
+# The EvaDB backend can't group inside the index scan, so it over-fetches
+# chunks and keeps the best one per job_id.
+EVADB_DISTINCT_OVERFETCH = 4
+
+def retrieve_chunks(cursor, question, k=3, backend=None, mode=None, distinct_jobs=None):
     """
-    Returns the answer to a question using vector retrieval from the unified `all_jobs_features` table.
-    If doc_name is provided, we filter on that. Otherwise, we search across all doc_names.
+    Returns the top-k chunks for the question as a dataframe with the all_jobs columns.
+
+    backend="evadb" runs the FAISS-indexed SQL query; backend="matrix" searches the
+    in-process EmbeddingStore (pre-filtered by its MetadataIndex) and skips EvaDB
+    entirely. Defaults to RETRIEVAL_BACKEND.
+    mode="hybrid" fuses BM25 keyword and dense rankings (matrix backend only).
+    Defaults to RETRIEVAL_MODE.
+    distinct_jobs=True returns the best chunk of k different postings rather than
+    possibly several chunks of one posting. Defaults to RETRIEVAL_DISTINCT_JOBS.
+    """
+    return vector_retrieval_batch(
+        cursor, [question], k=k, backend=backend, mode=mode, distinct_jobs=distinct_jobs
+    )[0]
+
+
+def vector_retrieval_batch(cursor, questions, k=3, backend=None, mode=None, distinct_jobs=None):
     """
+    Retrieves the top-k chunks for several questions (e.g. the sub-questions of
+    one request) at once. With the matrix backend all questions are embedded in
+    one encoder call and scored against the corpus in one matrix-matrix product.
 
-    # 2. Construct the query
-    #    Ensure 'SentenceFeatureExtractor(data)' is the same column name you used
-    #    when creating the FAISS index.
-    sql_query = f"""
-        SELECT
-            doc_name,
-            job_id,
-            job_title,
-            commitment,
-            department,
-            team,
-            level,
-            location,
-            all_locations,
-            country,
-            workplace_type,
-            tags,
-            description,
-            bullet_sections,
-            closing_text,
-            chunk_id,
-            data,
-            Similarity(
-                SentenceFeatureExtractor('{question}'),
-                SentenceFeatureExtractor(data)
-            )
-        FROM all_jobs_features
-        ORDER BY Similarity(
-        SentenceFeatureExtractor('{question}'),
-        SentenceFeatureExtractor(data)
-    ) DESC
-        LIMIT 3;
+    Returns one ranked dataframe per question, in the order of `questions`.
     """
+    questions = list(questions)
+    if not questions:
+        return []
+    backend = backend or RETRIEVAL_BACKEND
+    mode = mode or RETRIEVAL_MODE
+    distinct_jobs = RETRIEVAL_DISTINCT_JOBS if distinct_jobs is None else distinct_jobs
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode}")
 
-    # 3. Execute the query
-    res_batch = cursor.query(sql_query).df()
+    if backend == "matrix":
+        store = get_embedding_store()
+        vectors = embed_texts(questions)
+        with span("retrieval_query"):
+            return _matrix_retrieval(store, questions, vectors, k, mode, distinct_jobs)
 
-    # 4. Build the context string
-    context_list = []
-    for i in range(len(res_batch)):
-        row = res_batch.iloc[i]
-        metadata_str = f"""[METADATA]
-Source Doc: {row["doc_name"]}
-Job Title: {row["job_title"]}
-Department: {row["department"]}
-Location: {row["location"]}
-Workplace Type: {row["workplace_type"]}
-Tags: {row["tags"]}
+    if backend == "evadb":
+        if mode == "hybrid":
+            raise ValueError("Hybrid retrieval needs the matrix backend (RETRIEVAL_BACKEND=matrix).")
+        # Each question is embedded once and searched against the stored
+        # embeddings through the all_jobs_index FAISS index.
+        fetch = k * EVADB_DISTINCT_OVERFETCH if distinct_jobs else k
+        results = []
+        for q in questions:
+            with span("retrieval_query"):
+                df = cursor.query(similarity_search_query(q, ALL_JOBS_COLUMNS, fetch)).df()
+            if distinct_jobs:
+                # Rows are closest-first, so the first row of each job is its best chunk
+                df = df.drop_duplicates(subset="job_id", keep="first").head(k).reset_index(drop=True)
+            results.append(df)
+        return results
+    raise ValueError(f"Unknown retrieval backend: {backend}")
 
-[DESCRIPTION]
-{row["description"]}
 
-[BULLET SECTIONS]
-{row["bullet_sections"]}
+def _matrix_retrieval(store, questions, vectors, k, mode, distinct_jobs):
+    """Matrix-backend part of vector_retrieval_batch, once the questions are embedded."""
+    # Narrow to rows matching any location/department/level/workplace
+    # filters in the question before computing similarity.
+    candidates = [store.filter_candidates(q) for q in questions]
 
-[CLOSING TEXT]
-{row["closing_text"]}
+    results = [None] * len(questions)
+    if mode == "hybrid":
+        for i, q in enumerate(questions):
+            results[i] = store.rows(*store.hybrid_search(
+                vectors[i], q, k, candidates=candidates[i], distinct_jobs=distinct_jobs
+            ))
+        return results
 
-[CHUNK DATA]
-{row["data"]}
-"""
-        context_list.append(metadata_str)
+    # Unfiltered questions share one matrix-matrix product; filtered ones
+    # are scored only against their (much smaller) candidate sets.
+    unfiltered = [i for i, c in enumerate(candidates) if c is None]
+    if unfiltered:
+        indices, scores = store.search_batch(vectors[unfiltered], k, distinct_jobs=distinct_jobs)
+        for i, idx, sc in zip(unfiltered, indices, scores):
+            results[i] = store.rows(idx, sc)
+    for i, c in enumerate(candidates):
+        if c is not None:
+            results[i] = store.rows(*store.search(vectors[i], k, candidates=c, distinct_jobs=distinct_jobs))
+    return results
 
-    context = "\n---\n".join(context_list)
 
-    # 5. Construct the LLM prompt
-    user_prompt = f"""
+
+VECTOR_RETRIEVAL_TEMPLATE = """
 You are an assistant for question-answering tasks.
 Use the following pieces of retrieved context to answer the question.
 If you don't know the answer, just say that you don't know.
@@ -165,6 +194,30 @@ Context:
 Answer:
 """
 
+
+def vector_retrieval_prompt(question, res_batch, llm_model):
+    """
+    LLM prompt answering `question` from the retrieved chunks (a dataframe,
+    best first), packed into the model's token budget.
+    """
+    prompt_tokens = get_num_tokens_simple(llm_model, VECTOR_RETRIEVAL_TEMPLATE.format(question=question, context=""))
+    context, _ = pack_chunks(res_batch, llm_model, context_budget(llm_model, prompt_tokens))
+    return VECTOR_RETRIEVAL_TEMPLATE.format(question=question, context=context)
+
+
+def vector_retrieval(cursor, llm_model, question, doc_name=None, k=3, backend=None, chunks=None, mode=None):
+    """
+    Returns the answer to a question using vector retrieval from the unified `all_jobs_features` table.
+    If doc_name is provided, we filter on that. Otherwise, we search across all doc_names.
+    Pass `chunks` (one entry of vector_retrieval_batch) to skip the retrieval step.
+    """
+
+    # 2-3. Retrieve the top-k chunks
+    res_batch = chunks if chunks is not None else retrieve_chunks(cursor, question, k=k, backend=backend, mode=mode)
+
+    # 4-5. Pack the chunks into the token budget and build the LLM prompt
+    user_prompt = vector_retrieval_prompt(question, res_batch, llm_model)
+
     # 6. Call the LLM
     response, cost = llm_call(model=llm_model, user_prompt=user_prompt)
 
@@ -173,16 +226,46 @@ Answer:
     return answer, cost
 
 
-def summary_retrieval(llm_model, question, doc):
-    """Returns the answer to a summarization question over the document using summary retrieval.
+async def vector_retrieval_async(cursor, llm_model, question, doc_name=None, k=3, backend=None, chunks=None,
+                                 mode=None):
     """
-    # context_length = OPENAI_MODEL_CONTEXT_LENGTH[llm_model]
-    # total_tokens = get_num_tokens_simple(llm_model, wiki_docs[doc])
-    user_prompt = f"""Here is some context: {doc}
+    vector_retrieval with the LLM call made through llm_call_async, so several
+    sub-questions can be answered concurrently. Pass `chunks` to skip retrieval
+    (retrieval itself is synchronous).
+    """
+    res_batch = chunks if chunks is not None else retrieve_chunks(cursor, question, k=k, backend=backend, mode=mode)
+    user_prompt = vector_retrieval_prompt(question, res_batch, llm_model)
+    response, cost = await llm_call_async(model=llm_model, user_prompt=user_prompt)
+    answer = response.choices[0].message.content
+    return answer, cost
+
+
+SUMMARY_RETRIEVAL_TEMPLATE = """Here is some context: {doc}
                 Use only the provided context to answer the question.
                 Here is the question: {question}"""
 
+
+def summary_retrieval_prompt(llm_model, question, doc):
+    """Summary prompt with the document cut (on line boundaries) to the model's token budget."""
+    prompt_tokens = get_num_tokens_simple(llm_model, SUMMARY_RETRIEVAL_TEMPLATE.format(doc="", question=question))
+    doc = pack_text(doc, llm_model, context_budget(llm_model, prompt_tokens, max_tokens=0))
+    return SUMMARY_RETRIEVAL_TEMPLATE.format(doc=doc, question=question)
+
+
+def summary_retrieval(llm_model, question, doc):
+    """Returns the answer to a summarization question over the document using summary retrieval.
+    """
+    user_prompt = summary_retrieval_prompt(llm_model, question, doc)
+
     response, cost = llm_call(model=llm_model, user_prompt=user_prompt)
     answer = response.choices[0].message.content
     return answer, cost
-    # load max of context_length tokens from the document
\ No newline at end of file
+
+
+async def summary_retrieval_async(llm_model, question, doc):
+    """summary_retrieval with the LLM call made through llm_call_async."""
+    user_prompt = summary_retrieval_prompt(llm_model, question, doc)
+
+    response, cost = await llm_call_async(model=llm_model, user_prompt=user_prompt)
+    answer = response.choices[0].message.content
+    return answer, cost
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""
+Semantic cache of final answers, in front of the question-answering endpoint.
+
+Users ask the same things in different words ("hybrid jobs?" / "are there
+hybrid opportunities"). SemanticCache keeps the embeddings of recently
+answered questions in a small in-memory matrix; a new question whose cosine
+similarity to a cached one is at least `threshold` gets that question's
+final answer back without retrieval or any LLM call.
+
+Two questions only share an answer within the same scope: the request
+parameters (k) and the metadata filters the question mentions, so "jobs in
+London" never answers "jobs in Paris" however close their embeddings are.
+The filters are detected with the MetadataIndex saved in the cache's
+store_dir, which ingestion writes whatever the retrieval backend.
+
+The cache holds at most `capacity` answers, evicting the least recently
+used. It empties itself when the index is rebuilt: in this process through
+embedding_store.on_index_rebuilt, and in other processes (the server while
+ingestion runs elsewhere) by checking the store's index version on lookup.
+An answer computed across a rebuild is not stored: callers pass put() the
+version() they read before answering.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from embedding_store import index_version, on_index_rebuilt
+from metadata_index import MetadataIndex
+from telemetry import SEMANTIC_CACHE_LOOKUPS
+
+# SEMANTIC_CACHE=0 answers every question from scratch.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "1") == "1"
+# Minimum cosine similarity for a cached question to count as the same question.
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.88"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+
+logger = logging.getLogger(__name__)
+
+
+def answer_scope(question, metadata_index=None, **params):
+    """
+    Hashable scope of a question: the request parameters plus the metadata
+    filters (location, department, ...) it mentions, when a metadata index
+    is given to detect them.
+    """
+    filters = ()
+    if metadata_index is not None:
+        matched = metadata_index.match_filters(question)
+        filters = tuple(sorted((group, tuple(sorted(terms))) for group, terms in matched.items()))
+    return tuple(sorted(params.items())), filters
+
+
+class SemanticCache:
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, capacity=SEMANTIC_CACHE_SIZE, store_dir=None):
+        """
+        store_dir: index whose version is checked on lookup and whose metadata
+        index scopes the answers (None: only in-process invalidation, and
+        scopes without filters).
+        """
+        self.threshold = threshold
+        self.capacity = capacity
+        self.store_dir = store_dir
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._vectors = None  # (capacity, dim) float32, unit rows; rows >= len(self._entries) are unused
+        self._entries = []  # [{"question", "answer", "scope"}], row i <-> self._vectors[i]
+        self._last_used = np.zeros(0)
+        self._version = index_version(store_dir) if store_dir else None
+        self._generation = 0  # bumped on every invalidation, see version()
+        self._metadata_index = None
+        self._metadata_version = None
+        self._lock = threading.Lock()
+        self._metadata_lock = threading.Lock()
+        on_index_rebuilt(self._on_index_rebuilt)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _on_index_rebuilt(self, store_dir):
+        self.clear()
+
+    def _check_version(self):
+        """Empty the cache if the index on disk was rebuilt since we last looked (lock held)."""
+        if not self.store_dir:
+            return
+        version = index_version(self.store_dir)
+        if version != self._version:
+            if self._entries:
+                logger.info("Index rebuilt; clearing the semantic answer cache.")
+                self.invalidations += 1
+            self._entries = []
+            self._version = version
+            self._generation += 1
+
+    def version(self):
+        """Token to pass to put(); an answer is only stored if no rebuild happened in between."""
+        with self._lock:
+            self._check_version()
+            return self._generation
+
+    def metadata_index(self):
+        """The MetadataIndex of store_dir, reloaded after a rebuild, or None if there is none."""
+        if not self.store_dir:
+            return None
+        with self._metadata_lock:
+            version = index_version(self.store_dir)
+            if self._metadata_index is None or version != self._metadata_version:
+                self._metadata_index = (
+                    MetadataIndex.load(self.store_dir) if MetadataIndex.exists(self.store_dir) else None
+                )
+                self._metadata_version = version
+            return self._metadata_index
+
+    def scope(self, question, **params):
+        """answer_scope of the question, with filters detected by store_dir's metadata index."""
+        return answer_scope(question, self.metadata_index(), **params)
+
+    def get(self, vector, scope):
+        """Return (answer, similarity, cached question) of the closest cached question in scope, or None."""
+        with self._lock:
+            self._check_version()
+            n = len(self._entries)
+            if n:
+                similarities = self._vectors[:n] @ np.asarray(vector, dtype=np.float32)
+                for row in np.argsort(-similarities):
+                    if similarities[row] < self.threshold:
+                        break
+                    entry = self._entries[row]
+                    if entry["scope"] == scope:
+                        self._last_used[row] = time.monotonic()
+                        self.hits += 1
+                        SEMANTIC_CACHE_LOOKUPS.inc(result="hit")
+                        return entry["answer"], float(similarities[row]), entry["question"]
+            self.misses += 1
+            SEMANTIC_CACHE_LOOKUPS.inc(result="miss")
+            return None
+
+    def put(self, question, vector, scope, answer, version=None):
+        """Cache the answer; skipped if the index was rebuilt since `version` (see version())."""
+        if self.capacity <= 0:
+            return
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._check_version()
+            if version is not None and version != self._generation:
+                return
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._vectors = np.zeros((self.capacity, len(vector)), dtype=np.float32)
+                self._last_used = np.zeros(self.capacity)
+                self._entries = []
+            if len(self._entries) < self.capacity:
+                row = len(self._entries)
+                self._entries.append(None)
+            else:
+                row = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._vectors[row] = vector
+            self._last_used[row] = time.monotonic()
+            self._entries[row] = {"question": question, "answer": answer, "scope": scope}
+
+    def clear(self):
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries = []
+            self._version = index_version(self.store_dir) if self.store_dir else None
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": SEMANTIC_CACHE_ENABLED,
+                "size": len(self._entries),
+                "max_size": self.capacity,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -1,16 +1,24 @@
 # server.py
 
 import os
-import evadb
+import json
+import asyncio
 from fastapi import FastAPI, Body, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from typing import List, Optional
-
-from vector_store import table_exists  # or define a helper
-from retrieval import vector_retrieval, summary_retrieval
-from subquestion_generator import generate_subquestions
-from aggregator import response_aggregator
-from job_seeking import aggregate_job_matches
+from dotenv import load_dotenv
+
+# Settings in .env (LLM_BACKEND, EMBEDDING_STORE_DIR, ...) are read when the
+# project modules are imported, so load it before any of them.
+load_dotenv()
+
+# Only light modules are imported here so the server is up (and /health
+# answers) within a fraction of a second. The pipeline - evadb, the OpenAI
+# client, the encoder, retrieval - is imported and loaded by the background
+# warm-up started at startup; endpoints import it once warm-up is done.
+from telemetry import render_metrics, span, trace_request
+from warmup import Warmup, import_step
 import time
 
 # We'll have a global cursor for reuse
@@ -30,12 +38,63 @@ import logging
 
 logging.basicConfig(level=logging.INFO)
 
-@app.on_event("startup")
-def startup_event():
+DB_PATH = "/home/vhsingh/rag-demystified-main/evadb_data"
+
+WARMUP = Warmup()
+# SemanticCache of final answers, created during warm-up (None if SEMANTIC_CACHE=0)
+semantic_cache = None
+
+
+def warm_llm_client():
+    from openai_utils import get_llm_backend
+
+    get_llm_backend()
+
+
+def warm_embedding_model():
+    # Load the sentence encoder once and run a dummy encode so the first
+    # request doesn't pay for model load + first-call overhead.
+    from embeddings import model_registry
+
+    model_registry.warm_up()
+
+
+def warm_intent_router():
+    from intent_router import SUBQUESTION_ROUTER_ENABLED, intent_router
+
+    if SUBQUESTION_ROUTER_ENABLED:
+        intent_router.warm_up()
+
+
+def create_semantic_cache():
+    global semantic_cache
+    from embedding_store import DEFAULT_STORE_DIR
+    from semantic_cache import SEMANTIC_CACHE_ENABLED, SemanticCache
+
+    if SEMANTIC_CACHE_ENABLED:
+        # The store ingestion rebuilds (and bumps the index version of)
+        semantic_cache = SemanticCache(store_dir=DEFAULT_STORE_DIR)
+        semantic_cache.metadata_index()  # load it now rather than on the first question
+
+
+def open_index():
     global cursor
-    db_path = "/home/vhsingh/rag-demystified-main/evadb_data"
+    from embedding_store import DEFAULT_STORE_DIR, RETRIEVAL_BACKEND, load_embedding_store
+
+    db_path = DB_PATH
     start_time = time.perf_counter()
-    
+    if RETRIEVAL_BACKEND == "matrix":
+        # The matrix backend answers queries in-process from the memory-mapped
+        # embedding store, so we don't need to pay for an EvaDB connection.
+        logging.info("Loading in-process embedding store...")
+        # Where ingestion writes it: EMBEDDING_STORE_DIR (default ./evadb_data/all_jobs_matrix)
+        store = load_embedding_store(DEFAULT_STORE_DIR)
+        logging.info(f"Loaded {len(store)} embeddings in {time.perf_counter() - start_time:.2f} seconds.")
+        return
+
+    import evadb
+    from vector_store import table_exists
+
     logging.info("Connecting to EvaDB...")
     connection = evadb.connect(db_path)
     logging.info(f"Done connecting to EvaDB in {time.perf_counter() - start_time:.2f} seconds.")
@@ -55,12 +114,63 @@ def startup_event():
     logging.info(f"Check took {time.perf_counter() - start_time:.2f} seconds.")
 
 
+@app.on_event("startup")
+def startup_event():
+    WARMUP.start([
+        import_step("openai_utils"),
+        ("llm client", warm_llm_client),
+        import_step("subquestion_generator"),
+        import_step("retrieval"),
+        import_step("aggregator"),
+        import_step("job_seeking"),
+        ("embedding model", warm_embedding_model),
+        ("intent router", warm_intent_router),
+        ("index", open_index),
+        ("semantic cache", create_semantic_cache),
+    ])
+
+
+async def wait_until_warm():
+    """Hold a request until warm-up is done; 503 if it failed."""
+    if not await WARMUP.wait_async():
+        raise HTTPException(status_code=503, detail=f"Server warm-up failed: {WARMUP.error}")
+
+
 @app.get("/health")
 def health_check():
     """
-    Simple health check endpoint.
+    Simple health check endpoint; answers as soon as the process is up.
+    Reports warm-up progress and, once warm, whether the embedding model is
+    loaded and warm, and cache stats.
     """
-    return {"status": "OK"}
+    health = {"status": "OK", "ready": WARMUP.ready, "warmup": WARMUP.status()}
+    if not WARMUP.ready:
+        # Don't touch modules the warm-up thread may still be importing
+        return health
+
+    from embedding_store import RETRIEVAL_BACKEND
+    from embeddings import embedding_cache, model_registry
+    from openai_utils import LLM_BACKEND, llm_cache, llm_singleflight, llm_singleflight_async, rate_limiter
+
+    return {
+        **health,
+        "retrieval_backend": RETRIEVAL_BACKEND,
+        "embedding_model": model_registry.status(),
+        "embedding_cache": embedding_cache.stats(),
+        "llm_backend": LLM_BACKEND,
+        "llm_cache": llm_cache.stats(),
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else {"enabled": False},
+        "llm_rate_limiter": {
+            **rate_limiter.stats(),
+            "coalesced_requests": llm_singleflight.shared + llm_singleflight_async.shared,
+        },
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Per-stage latency histograms and token / cost counters in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 
 @app.post("/job_matches")
 def get_job_matches(
@@ -71,38 +181,85 @@ def get_job_matches(
     """
     Returns job matches based on the user's profile text.
     """
-    if cursor is None:
+    if not WARMUP.wait():
+        raise HTTPException(status_code=503, detail=f"Server warm-up failed: {WARMUP.error}")
+    from embedding_store import RETRIEVAL_BACKEND
+    from job_seeking import aggregate_job_matches
+
+    if cursor is None and RETRIEVAL_BACKEND != "matrix":
         raise HTTPException(status_code=500, detail="Cursor not initialized. Check server startup logs.")
     
-    matches = aggregate_job_matches(
-        cursor=cursor,
-        user_profile_text=user_profile_text,
-    )
+    with trace_request("job_matches"):
+        matches = aggregate_job_matches(
+            cursor=cursor,
+            user_profile_text=user_profile_text,
+        )
     if not matches:
         return "No matches found."
     return matches
 
-@app.post("/ask_question")
-def ask_question(
-    question: str = Body(...),
-    doc_name: Optional[str] = Body(None),
-    k: int = Body(3)
-):
-    if cursor is None:
-        return {"error": "Cursor not initialized. Check server startup logs."}
-
-    user_task = """We have a database of job postings from Palantir.
+USER_TASK = """We have a database of job postings from Palantir.
                    We are building an application to answer questions about these jobs.
                    The documents are each representing a single job with fields like job title, location, etc."""
-    subquestions_list, cost_gs = generate_subquestions(
-        question=question, 
-        file_names=DOC_NAMES, 
-        user_task=user_task,
-        llm_model=LLM_MODEL
-    )
+
+
+async def _answer_span(call):
+    with span("answer"):
+        return await call
+
+
+def semantic_lookup(question, k):
+    """
+    Look the question up in the semantic answer cache.
+    Returns (cached answer or None, key to store the new answer under).
+    The key carries the cache's index version, so an answer computed across
+    a rebuild is not stored.
+    """
+    if semantic_cache is None:
+        return None, None
+    from embeddings import embed_texts
+
+    with span("semantic_cache"):
+        version = semantic_cache.version()
+        # Same cached query embedding the router and retrieval use
+        vector = embed_texts([question])[0]
+        scope = semantic_cache.scope(question, k=k)
+        cached = semantic_cache.get(vector, scope)
+    if cached is not None:
+        answer, similarity, cached_question = cached
+        logging.info(f"Semantic cache hit ({similarity:.3f}): {question!r} ~ {cached_question!r}")
+        return answer, None
+    return None, {"question": question, "vector": vector, "scope": scope, "version": version}
+
+
+async def answer_subquestions(question, k):
+    """
+    Decompose the question and answer every subquestion concurrently.
+    Returns (responses, cost) ready for the aggregator.
+    """
+    from retrieval import summary_retrieval_async, vector_retrieval_async, vector_retrieval_batch
+    from subquestion_generator import generate_subquestions
+
+    with span("subquestion_generation"):
+        subquestions_list, cost_gs = await run_in_threadpool(
+            generate_subquestions,
+            question=question, 
+            file_names=DOC_NAMES, 
+            user_task=USER_TASK,
+            llm_model=LLM_MODEL
+        )
 
     question_cost = cost_gs
-    responses = []
+    calls = []
+
+    # Retrieve context for every vector_retrieval subquestion in one batch
+    # (one encoder call + one scoring pass) before answering them.
+    vector_subqs = list(dict.fromkeys(
+        item.question for item in subquestions_list
+        if item.function == "vector_retrieval" or getattr(item.function, "value", None) == "vector_retrieval"
+    ))
+    with span("retrieval"):
+        retrieved = dict(zip(vector_subqs, await run_in_threadpool(vector_retrieval_batch, cursor, vector_subqs, k=k)))
 
     # Iterate over each subquestion bundle using dot notation:
     for item in subquestions_list:
@@ -112,25 +269,120 @@ def ask_question(
         for doc in item.file_names:
             selected_doc = doc.value
             if func == "vector_retrieval" or (hasattr(func, "value") and func.value == "vector_retrieval"):
-                start_time = time.time()
-                resp, retrieval_cost = vector_retrieval(cursor, LLM_MODEL, subq, selected_doc)
-                question_cost += retrieval_cost
-                responses.append(resp)
+                calls.append(vector_retrieval_async(
+                    cursor, LLM_MODEL, subq, selected_doc, k=k, chunks=retrieved[subq]
+                ))
             elif func == "llm_retrieval" or (hasattr(func, "value") and func.value == "llm_retrieval"):
                 # If you're storing doc text in memory or somewhere
-                resp, sum_cost = summary_retrieval(LLM_MODEL, subq, "SOME_DOC_TEXT")
-                question_cost += sum_cost
-                responses.append(resp)
+                calls.append(summary_retrieval_async(LLM_MODEL, subq, "SOME_DOC_TEXT"))
             else:
-                responses.append("Unknown function call.")
+                calls.append(None)
 
-    final_answer, agg_cost = response_aggregator(LLM_MODEL, question, responses)
-    elapsed = time.time() - start_time
-    print(f"The elapsed time is {elapsed}")
-    question_cost += agg_cost
+    # Answer all subquestions concurrently: latency ~ slowest subquestion, not the sum.
+    answered = await asyncio.gather(*(_answer_span(call) for call in calls if call is not None))
+    answered = iter(answered)
+    responses = []
+    for call in calls:
+        if call is None:
+            responses.append("Unknown function call.")
+            continue
+        resp, call_cost = next(answered)
+        question_cost += call_cost
+        responses.append(resp)
+    return responses, question_cost
+
+
+@app.post("/ask_question")
+async def ask_question(
+    question: str = Body(...),
+    doc_name: Optional[str] = Body(None),
+    k: int = Body(3)
+):
+    await wait_until_warm()
+    from aggregator import response_aggregator_async
+    from embedding_store import RETRIEVAL_BACKEND
+
+    if cursor is None and RETRIEVAL_BACKEND != "matrix":
+        return {"error": "Cursor not initialized. Check server startup logs."}
+
+    with trace_request("ask_question"):
+        start_time = time.time()
+        cached_answer, cache_key = await run_in_threadpool(semantic_lookup, question, k)
+        if cached_answer is not None:
+            return cached_answer
+        responses, question_cost = await answer_subquestions(question, k)
+
+        with span("aggregation"):
+            final_answer, agg_cost = await response_aggregator_async(LLM_MODEL, question, responses)
+        elapsed = time.time() - start_time
+        print(f"The elapsed time is {elapsed}")
+        question_cost += agg_cost
+        if cache_key is not None:
+            semantic_cache.put(answer=final_answer, **cache_key)
 
     return final_answer
 
+
+def sse_event(data, event=None):
+    """One Server-Sent Event; data is JSON-encoded so newlines in tokens survive."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+@app.post("/ask_question_stream")
+async def ask_question_stream(
+    question: str = Body(...),
+    doc_name: Optional[str] = Body(None),
+    k: int = Body(3)
+):
+    """
+    Same pipeline as /ask_question, streamed as Server-Sent Events:
+    `status` events while the subquestions are answered, one unnamed event
+    per answer token ({"token": ...}), then `done` with the cost and timings.
+    """
+    await wait_until_warm()
+    from aggregator import response_aggregator_stream_async
+    from embedding_store import RETRIEVAL_BACKEND
+
+    if cursor is None and RETRIEVAL_BACKEND != "matrix":
+        return {"error": "Cursor not initialized. Check server startup logs."}
+
+    async def events():
+        with trace_request("ask_question_stream"):
+            start_time = time.time()
+            cached_answer, cache_key = await run_in_threadpool(semantic_lookup, question, k)
+            if cached_answer is not None:
+                elapsed = time.time() - start_time
+                yield sse_event({"token": cached_answer})
+                yield sse_event({"cost": 0.0, "elapsed": elapsed, "time_to_first_token": elapsed}, event="done")
+                return
+            yield sse_event({"message": "Answering subquestions..."}, event="status")
+            try:
+                responses, question_cost = await answer_subquestions(question, k)
+                yield sse_event({"message": "Writing the answer..."}, event="status")
+                with span("aggregation"):
+                    final_stream = await response_aggregator_stream_async(LLM_MODEL, question, responses)
+                    first_token = None
+                    async for token in final_stream:
+                        if first_token is None:
+                            first_token = time.time() - start_time
+                        yield sse_event({"token": token})
+            except Exception as e:
+                logging.exception("Streaming answer failed")
+                yield sse_event({"message": str(e)}, event="error")
+                return
+            question_cost += final_stream.cost
+            if cache_key is not None:
+                semantic_cache.put(answer=final_stream.text, **cache_key)
+            elapsed = time.time() - start_time
+            print(f"The elapsed time is {elapsed} (first token after {first_token})")
+            yield sse_event(
+                {"cost": question_cost, "elapsed": elapsed, "time_to_first_token": first_token},
+                event="done",
+            )
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 # Inside server.py (keep the rest of your API endpoints as before)
 
 # In server.py, within your HTML UI returned by GET /
@@ -307,6 +559,46 @@ def index():
             document.getElementById("question").value = text;
           }
           
+          // Read the Server-Sent Events of /ask_question_stream, showing
+          // tokens as they arrive. Returns the full answer.
+          async function readAnswerStream(response) {
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            const resultEl = document.getElementById("result");
+            let buffer = "";
+            let answer = "";
+            resultEl.innerText = "";
+            while (true) {
+              const { value, done } = await reader.read();
+              if (done) break;
+              buffer += decoder.decode(value, { stream: true });
+              let boundary;
+              while ((boundary = buffer.indexOf("\\n\\n")) >= 0) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let eventName = "message";
+                let data = "";
+                for (const line of rawEvent.split("\\n")) {
+                  if (line.startsWith("event: ")) eventName = line.slice(7);
+                  else if (line.startsWith("data: ")) data += line.slice(6);
+                }
+                const payload = JSON.parse(data);
+                if (eventName === "status") {
+                  document.getElementById("thinking-text").innerText = payload.message;
+                } else if (eventName === "error") {
+                  answer += "\\nError: " + payload.message;
+                } else if (eventName === "message") {
+                  // First token: stop the "thinking" messages
+                  clearInterval(thinkingInterval);
+                  document.getElementById("thinking-section").style.display = "none";
+                  answer += payload.token;
+                  resultEl.innerText = answer;
+                }
+              }
+            }
+            return answer;
+          }
+
           async function submitForm() {
             // Display the "thinking" section
             document.getElementById("thinking-section").style.display = "block";
@@ -344,13 +636,12 @@ def index():
                 resultText = JSON.stringify(data, null, 2);
               } else {
                 const question = document.getElementById("question").value;
-                const response = await fetch("/ask_question", {
+                const response = await fetch("/ask_question_stream", {
                   method: "POST",
                   headers: { "Content-Type": "application/json" },
                   body: JSON.stringify({ question: question, k: 3 })
                 });
-                const data = await response.json();
-                resultText = JSON.stringify(data, null, 2);
+                resultText = await readAnswerStream(response);
               }
             } catch (e) {
               resultText = "Error fetching data. " + e;
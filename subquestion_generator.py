@@ -1,3 +1,4 @@
+import functools
 import json
 from typing import List
 from enum import Enum
@@ -5,6 +6,7 @@ from enum import Enum
 from instructor import OpenAISchema
 from pydantic import Field, create_model
 from openai_utils import llm_call
+from intent_router import SUBQUESTION_ROUTER_ENABLED, intent_router
 
 
 # DEFAULT_SUBQUESTION_GENERATOR_PROMPT = """
@@ -43,47 +45,19 @@ class FunctionEnum(str, Enum):
 
 all_jobs_NAME = "all_jobs"
 
-def generate_subquestions(
-    question: str,
-    file_names: List[str],
-    system_prompt: str = "You are a subquestion generator.",
-    user_task: str = (
-        "You are an AI assistant that helps candidates find and understand "
-        "job postings at Palantir. All job data is stored in a single table called all_jobs. "
-        "Your job is to figure out which function to use (vector_retrieval or llm_retrieval) "
-        "to answer the user's question."
-    ),
-    llm_model: str = "gpt-3.5-turbo",
-):
+@functools.lru_cache(maxsize=32)
+def subquestion_schema(valid_file_names):
     """
-    Generates a list of subquestions from a user's question along with
-    the file name(s) and the function to use to answer the question, using OpenAI LLM.
-
-    - 'file_names': a list of possible document names
-      (e.g. ["PALANTIR_JOBS_1", "PALANTIR_JOBS_2", ..., "PALANTIR_JOBS_84"]).
-    - 'FunctionEnum': an enum with "vector_retrieval" or "llm_retrieval".
-
-    Returns:
-      (subquestions_list, cost)
-      - subquestions_list: list of pydantic-validated subquestions with structure:
-        [
-          {
-            "question": "...",
-            "function": "vector_retrieval" or "llm_retrieval",
-            "file_names": ["PALANTIR_JOBS_12", "PALANTIR_JOBS_13", ...]
-          },
-          ...
-        ]
-      - cost: an approximate token cost (depending on your LLM usage tracking)
+    (SubQuestionBundleList model, its OpenAI function schema) for sub-questions
+    whose file_names must come from valid_file_names (a tuple). Built once per
+    file-name set: creating the Enum and models and rendering the schema costs
+    more than the rest of the request preparation together.
     """
-
     # ---------------------------------------------------------------------
     # 1) Dynamically create an Enum from the file_names
     # ---------------------------------------------------------------------
-    # valid_file_names = file_names  # e.g. ["PALANTIR_JOBS_1", ..., "PALANTIR_JOBS_84"]
-    # FilenameEnum = Enum("FilenameEnum", {x.upper(): x for x in valid_file_names})
-
-    ValidFilenameEnum = Enum("FilenameEnum", {"all_jobs": all_jobs_NAME})
+    # e.g. ("all_jobs",) or ("PALANTIR_JOBS_1", ..., "PALANTIR_JOBS_84")
+    ValidFilenameEnum = Enum("FilenameEnum", {name: name for name in valid_file_names})
 
     # ---------------------------------------------------------------------
     # 2) Create pydantic classes for subquestions & the top-level container
@@ -116,114 +90,161 @@ def generate_subquestions(
         __base__=OpenAISchema,
     )
 
-    # ---------------------------------------------------------------------
-    # 3) Build the user prompt
-    # ---------------------------------------------------------------------
-    user_prompt = f"{user_task}\nUser's question: {question}"
+    return SubQuestionBundleList, SubQuestionBundleList.openai_schema
 
-    # ---------------------------------------------------------------------
-    # 4) Provide a few-shot conversation history (job-focused only)
-    # ---------------------------------------------------------------------
-    # This helps the LLM see how we want the final JSON structured
-    # and how to decide on function usage + doc names.
-    few_shot_examples = [
-        # Example 1: Filter by location and seniority
-        {
-            "role": "user",
-            "content": "I'm looking for senior engineering roles in London. What do you have?"
-        },
+
+# Few-shot conversation history (job-focused only) sent with every
+# decomposition call. This helps the LLM see how we want the final JSON structured
+# and how to decide on function usage + doc names.
+FEW_SHOT_EXAMPLES = [
+    # Example 1: Filter by location and seniority
+    {
+        "role": "user",
+        "content": "I'm looking for senior engineering roles in London. What do you have?"
+    },
+    {
+        "role": "function",
+        "name": "SubQuestionBundleList",
+        "content": """
         {
-            "role": "function",
-            "name": "SubQuestionBundleList",
-            "content": """
+          "subquestion_bundle_list": [
             {
-              "subquestion_bundle_list": [
-                {
-                  "question": "Which open roles mention senior or lead engineering positions in London?",
-                  "function": "vector_retrieval",
-                  "file_names": ["all_jobs"]
-                }
-              ]
+              "question": "Which open roles mention senior or lead engineering positions in London?",
+              "function": "vector_retrieval",
+              "file_names": ["all_jobs"]
             }
-            """
-        },
+          ]
+        }
+        """
+    },
 
-        # Example 2: Ask about responsibilities and job description
-        {
-            "role": "user",
-            "content": "What are the responsibilities for a Data Scientist role at Palantir?"
-        },
+    # Example 2: Ask about responsibilities and job description
+    {
+        "role": "user",
+        "content": "What are the responsibilities for a Data Scientist role at Palantir?"
+    },
+    {
+        "role": "function",
+        "name": "SubQuestionBundleList",
+        "content": """
         {
-            "role": "function",
-            "name": "SubQuestionBundleList",
-            "content": """
+          "subquestion_bundle_list": [
             {
-              "subquestion_bundle_list": [
-                {
-                  "question": "What do the job descriptions say about responsibilities for Data Scientist positions?",
-                  "function": "vector_retrieval",
-                  "file_names": ["all_jobs"]
-                }
-              ]
+              "question": "What do the job descriptions say about responsibilities for Data Scientist positions?",
+              "function": "vector_retrieval",
+              "file_names": ["all_jobs"]
             }
-            """
-        },
+          ]
+        }
+        """
+    },
 
-        # Example 3: Summarizing multiple postings
-        {
-            "role": "user",
-            "content": "Can you summarize the different internship roles offered in the US?"
-        },
+    # Example 3: Summarizing multiple postings
+    {
+        "role": "user",
+        "content": "Can you summarize the different internship roles offered in the US?"
+    },
+    {
+        "role": "function",
+        "name": "SubQuestionBundleList",
+        "content": """
         {
-            "role": "function",
-            "name": "SubQuestionBundleList",
-            "content": """
+          "subquestion_bundle_list": [
             {
-              "subquestion_bundle_list": [
-                {
-                  "question": "Summarize internship positions for US-based roles.",
-                  "function": "llm_retrieval",
-                  "file_names": ["all_jobs"]
-                }
-              ]
+              "question": "Summarize internship positions for US-based roles.",
+              "function": "llm_retrieval",
+              "file_names": ["all_jobs"]
             }
-            """
-        },
-        {
-            "role": "user",
-            "content": "What's the company's official stance on crocheting hats in the office?"
-        },
+          ]
+        }
+        """
+    },
+    {
+        "role": "user",
+        "content": "What's the company's official stance on crocheting hats in the office?"
+    },
+    {
+        "role": "function",
+        "name": "SubQuestionBundleList",
+        "content": """
         {
-            "role": "function",
-            "name": "SubQuestionBundleList",
-            "content": """
+          "subquestion_bundle_list": [
             {
-              "subquestion_bundle_list": [
-                {
-                  "question": "We do not have any data on crocheting hats in the office.",
-                  "function": "llm_retrieval",
-                  "file_names": []
-                }
-              ]
+              "question": "We do not have any data on crocheting hats in the office.",
+              "function": "llm_retrieval",
+              "file_names": []
             }
-            """
+          ]
         }
-    ]
+        """
+    }
+]
+
+
+def generate_subquestions(
+    question: str,
+    file_names: List[str],
+    system_prompt: str = "You are a subquestion generator.",
+    user_task: str = (
+        "You are an AI assistant that helps candidates find and understand "
+        "job postings at Palantir. All job data is stored in a single table called all_jobs. "
+        "Your job is to figure out which function to use (vector_retrieval or llm_retrieval) "
+        "to answer the user's question."
+    ),
+    llm_model: str = "gpt-3.5-turbo",
+    use_router: bool = SUBQUESTION_ROUTER_ENABLED,
+):
+    """
+    Generates a list of subquestions from a user's question along with
+    the file name(s) and the function to use to answer the question, using OpenAI LLM.
+    With use_router, questions intent_router judges single-intent skip the LLM
+    call and come back as one vector_retrieval subquestion (cost 0.0).
+
+    - 'file_names': a list of possible document names
+      (e.g. ["PALANTIR_JOBS_1", "PALANTIR_JOBS_2", ..., "PALANTIR_JOBS_84"]).
+    - 'FunctionEnum': an enum with "vector_retrieval" or "llm_retrieval".
+
+    Returns:
+      (subquestions_list, cost)
+      - subquestions_list: list of pydantic-validated subquestions with structure:
+        [
+          {
+            "question": "...",
+            "function": "vector_retrieval" or "llm_retrieval",
+            "file_names": ["PALANTIR_JOBS_12", "PALANTIR_JOBS_13", ...]
+          },
+          ...
+        ]
+      - cost: an approximate token cost (depending on your LLM usage tracking)
+    """
+
+    SubQuestionBundleList, openai_schema = subquestion_schema((all_jobs_NAME,))
+
+    # Single-intent questions skip the decomposition call: the answer would
+    # be the question itself, as one vector_retrieval bundle over all_jobs.
+    if use_router and intent_router.is_simple(question):
+        bundle = {"question": question, "function": FunctionEnum.VECTOR_RETRIEVAL.value, "file_names": [all_jobs_NAME]}
+        return SubQuestionBundleList(subquestion_bundle_list=[bundle]).subquestion_bundle_list, 0.0
+
+    # ---------------------------------------------------------------------
+    # 1) Build the user prompt
+    # ---------------------------------------------------------------------
+    user_prompt = f"{user_task}\nUser's question: {question}"
 
     # ---------------------------------------------------------------------
-    # 5) Call your LLM with the function schema
+    # 2) Call your LLM with the function schema
     # ---------------------------------------------------------------------
     response, cost = llm_call(
         model=llm_model,
-        function_schema=[SubQuestionBundleList.openai_schema],
-        output_schema={"name": SubQuestionBundleList.openai_schema["name"]},
+        function_schema=[openai_schema],
+        output_schema={"name": openai_schema["name"]},
         system_prompt=system_prompt,
         user_prompt=user_prompt,
-        few_shot_examples=few_shot_examples,
+        few_shot_examples=FEW_SHOT_EXAMPLES,
     )
 
     # ---------------------------------------------------------------------
-    # 6) Parse the JSON response into Pydantic
+    # 3) Parse the JSON response into Pydantic
     # ---------------------------------------------------------------------
     # The LLM should respond with JSON that matches SubQuestionBundleList
     # e.g. {"subquestion_bundle_list": [ {...}, {...} ]}
@@ -0,0 +1,199 @@
+"""
+In-process latency / token / cost telemetry, exposed in Prometheus text format.
+
+Code paths wrap their work in spans:
+
+    with span("retrieval") as s:
+        ...
+        s.record(cost=0.0012, prompt_tokens=850, completion_tokens=120)
+
+Each span adds its duration to the rag_stage_duration_seconds histogram and
+its tokens / cost to counters, all labelled by stage. Spans nest: tokens and
+cost recorded in an inner span (an LLM call) also count for the outer ones
+(the aggregation step that made it), just as their durations overlap. Inside trace_request()
+the spans of one request are also collected and logged as a single JSON
+line when the request ends, so a slow request can be broken down by stage.
+render_metrics() returns everything for a /metrics endpoint.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers cache hits (ms) up to slow multi-call LLM requests.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger(__name__)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', f'{bound:g}')])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+STAGE_DURATION = Histogram("rag_stage_duration_seconds", "Duration of a pipeline stage.", ["stage"])
+STAGE_TOKENS = Counter("rag_stage_tokens_total", "Tokens used by a pipeline stage.", ["stage", "kind"])
+STAGE_COST = Counter("rag_stage_cost_dollars_total", "LLM cost of a pipeline stage in dollars.", ["stage"])
+STAGE_ERRORS = Counter("rag_stage_errors_total", "Pipeline stages that raised.", ["stage"])
+REQUEST_DURATION = Histogram("rag_request_duration_seconds", "End-to-end request duration.", ["endpoint"])
+REQUEST_COST = Counter("rag_request_cost_dollars_total", "LLM cost of requests in dollars.", ["endpoint"])
+LLM_CALLS = Counter("rag_llm_calls_total", "LLM calls by model and how they were served.", ["model", "source"])
+ROUTER_DECISIONS = Counter("rag_router_decisions_total", "Sub-question router decisions.", ["route"])
+SEMANTIC_CACHE_LOOKUPS = Counter("rag_semantic_cache_lookups_total", "Semantic answer cache lookups.", ["result"])
+
+METRICS = [
+    STAGE_DURATION, STAGE_TOKENS, STAGE_COST, STAGE_ERRORS, REQUEST_DURATION, REQUEST_COST, LLM_CALLS,
+    ROUTER_DECISIONS, SEMANTIC_CACHE_LOOKUPS,
+]
+
+# Spans finished so far in the current request (set by trace_request)
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+# Innermost open span; tasks and threads started inside a span inherit it
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, stage, parent=None):
+        self.stage = stage
+        self.parent = parent
+        self.duration = None
+        self.cost = 0.0
+        self.tokens = {}
+
+    def record(self, cost=None, **tokens):
+        """
+        Attribute LLM cost and token counts (e.g. prompt_tokens=...) to this
+        span and every enclosing one, so "aggregation" includes the cost of
+        the LLM call made inside it.
+        """
+        s = self
+        while s is not None:
+            if cost:
+                s.cost += cost
+                STAGE_COST.inc(cost, stage=s.stage)
+            for kind, count in tokens.items():
+                if count:
+                    s.tokens[kind] = s.tokens.get(kind, 0) + count
+                    STAGE_TOKENS.inc(count, stage=s.stage, kind=kind)
+            s = s.parent
+
+
+def _finish(s, duration):
+    s.duration = duration
+    STAGE_DURATION.observe(duration, stage=s.stage)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append(s)
+
+
+@contextmanager
+def span(stage):
+    s = Span(stage, parent=_current_span.get())
+    token = _current_span.set(s)
+    start = time.perf_counter()
+    try:
+        yield s
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(s, time.perf_counter() - start)
+
+
+def record_span(stage, duration, cost=None, **tokens):
+    """Record a span timed elsewhere, e.g. an LLM stream consumed after the call returned."""
+    s = Span(stage, parent=_current_span.get())
+    s.record(cost, **tokens)
+    _finish(s, duration)
+    return s
+
+
+@contextmanager
+def trace_request(endpoint):
+    """Time a request and log the breakdown of its spans as one JSON line."""
+    spans = []
+    token = _request_spans.set(spans)
+    start = time.perf_counter()
+    try:
+        yield spans
+    finally:
+        duration = time.perf_counter() - start
+        _request_spans.reset(token)
+        # Enclosing spans include their children's cost; count each LLM call once
+        cost = sum(s.cost for s in spans if s.stage == "llm_call")
+        REQUEST_DURATION.observe(duration, endpoint=endpoint)
+        REQUEST_COST.inc(cost, endpoint=endpoint)
+        logger.info(json.dumps({
+            "endpoint": endpoint,
+            "duration": round(duration, 4),
+            "cost": round(cost, 6),
+            "spans": [
+                {"stage": s.stage, "duration": round(s.duration, 4), "cost": round(s.cost, 6), **s.tokens}
+                for s in spans
+            ],
+        }))
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
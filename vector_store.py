@@ -1,8 +1,60 @@
+import hashlib
 import os
-import evadb
 import tqdm
 import time
 
+import numpy as np
+import pandas as pd
+
+from embedding_store import (
+    DEFAULT_STORE_DIR,
+    EMBEDDINGS_FILE,
+    EmbeddingStore,
+    export_embedding_store,
+    mark_index_rebuilt,
+    update_embedding_store,
+)
+from embeddings import INGEST_EMBED_BATCH_SIZE, INGEST_EMBED_WORKERS, corpus_workers, embed_corpus
+from metadata_index import MetadataIndex
+from keyword_index import BM25Index
+
+# Column that SentenceFeatureExtractor writes its embedding into when we build
+# `all_jobs_features` with `SELECT SentenceFeatureExtractor(data), ...`.
+FEATURES_COLUMN = "features"
+
+# Metadata + text columns of the unified all_jobs / all_jobs_features tables.
+ALL_JOBS_COLUMNS = [
+    "doc_name",
+    "job_id",
+    "job_title",
+    "commitment",
+    "department",
+    "team",
+    "level",
+    "location",
+    "all_locations",
+    "country",
+    "workplace_type",
+    "tags",
+    "description",
+    "bullet_sections",
+    "closing_text",
+    "chunk_id",
+    "data",
+]
+
+# Everything that goes into a chunk's content hash. doc_name is left out: it is
+# the posting's position in the scrape (PALANTIR_JOBS_<i>), not its content.
+HASHED_COLUMNS = [c for c in ALL_JOBS_COLUMNS if c != "doc_name"]
+
+def _evadb_path():
+    """Install dir of evadb (for its bundled functions); imported here, not at
+    module load, so query helpers don't pull in all of evadb."""
+    import evadb
+
+    return os.path.dirname(evadb.__file__)
+
+
 def generate_vector_stores(cursor, docs):
     """
     For each doc in docs:
@@ -15,7 +67,7 @@ def generate_vector_stores(cursor, docs):
 
     Finally, print the columns of the first doc's features table for verification.
     """
-    evadb_path = os.path.dirname(evadb.__file__)
+    evadb_path = _evadb_path()
     cursor.query(
         f"""
         CREATE FUNCTION IF NOT EXISTS SentenceFeatureExtractor
@@ -89,24 +141,16 @@ def generate_vector_stores(cursor, docs):
         elapsed = time.time() - start_time
         print(f"✅ Finished {doc} in {elapsed:.2f} seconds.\n")
 
-def generate_unified_vector_store(cursor, docs):
+def load_all_jobs(cursor, docs):
     """
-    Create one global table (all_jobs), load every CSV into it,
-    then build a single features table (all_jobs_features) with a single FAISS index.
-    This version omits "AS features" to avoid EVA binding errors.
+    Drop and re-create the all_jobs table and LOAD every doc's CSV into it.
+    doc_name is a column of the CSVs, so the docs can be one file per posting
+    or the single consolidated file of bulk_load_palantir_job_postings (one LOAD).
     """
-    evadb_path = os.path.dirname(evadb.__file__)
-
-    # 1) Create the feature extraction function if not already present
-    cursor.query(f"""
-        CREATE FUNCTION IF NOT EXISTS SentenceFeatureExtractor
-        IMPL '{evadb_path}/functions/sentence_feature_extractor.py';
-    """).df()
-
-    # 2) Drop the "all_jobs" table if it already exists
+    # 1) Drop the "all_jobs" table if it already exists
     cursor.query("DROP TABLE IF EXISTS all_jobs;").df()
 
-    # 3) Create a single table for *all* job postings
+    # 2) Create a single table for *all* job postings
     cursor.query(f"""
         CREATE TABLE all_jobs (
             doc_name TEXT,
@@ -129,12 +173,31 @@ def generate_unified_vector_store(cursor, docs):
         );
     """).df()
 
-    # 4) For each CSV doc, load into a TEMP table, then insert into all_jobs with doc_name
+    # 3) LOAD each CSV doc into all_jobs
     for doc in tqdm.tqdm(docs, desc="Loading docs into 'all_jobs'"):
-        start_time = time.time()
         file_path = f"data/palantir_careers/{doc}.csv"
         cursor.query(f"LOAD CSV '{file_path}' INTO all_jobs;").df()
 
+def generate_unified_vector_store(cursor, docs, store_dir=DEFAULT_STORE_DIR):
+    """
+    Create one global table (all_jobs), load every CSV into it,
+    then build a single features table (all_jobs_features) with a single FAISS index.
+    This version omits "AS features" to avoid EVA binding errors.
+
+    The embeddings + metadata are also exported to an EmbeddingStore in
+    `store_dir` for the in-process "matrix" retrieval backend.
+    """
+    evadb_path = _evadb_path()
+
+    # 1) Create the feature extraction function if not already present
+    cursor.query(f"""
+        CREATE FUNCTION IF NOT EXISTS SentenceFeatureExtractor
+        IMPL '{evadb_path}/functions/sentence_feature_extractor.py';
+    """).df()
+
+    # 2-4) (Re)create all_jobs and load every CSV doc into it
+    load_all_jobs(cursor, docs)
+
     # 5) Create the "all_jobs_features" table by extracting embeddings
     #    Notice we do NOT use "AS features" here
     cursor.query("DROP TABLE IF EXISTS all_jobs_features;").df()
@@ -162,16 +225,214 @@ def generate_unified_vector_store(cursor, docs):
         FROM all_jobs;
     """).df()
 
-    # 6) Create a single FAISS index on the function call directly
-    #    This references the auto-generated column name, e.g. "SentenceFeatureExtractor(data)"
-    cursor.query("""
-        CREATE INDEX IF NOT EXISTS all_jobs_index
-        ON all_jobs_features (SentenceFeatureExtractor(data))
+    # 6) Create a single FAISS index on the stored embedding column.
+    #    Indexing the stored column (instead of SentenceFeatureExtractor(data))
+    #    means neither the index build nor a query has to re-encode the chunks.
+    cursor.query("DROP INDEX IF EXISTS all_jobs_index;").df()
+    cursor.query(f"""
+        CREATE INDEX all_jobs_index
+        ON all_jobs_features ({FEATURES_COLUMN})
         USING FAISS;
     """).df()
 
+    # 7) Export the embeddings into the in-process matrix store
+    store = export_embedding_store(cursor, store_dir, FEATURES_COLUMN, ALL_JOBS_COLUMNS)
+    print(f"✅ Exported {len(store)} embeddings to {store_dir}.")
+
+    # 8-11) Compact copies, metadata / BM25 / IVF indexes, new index version
+    build_store_indexes(store, store_dir)
+
     print("\n✅ Finished creating unified vector store (all_jobs_features + single FAISS index).")
 
+def build_store_indexes(store, store_dir):
+    """Save the compact copies and search indexes of a freshly written store, and bump its version."""
+    for dtype in ("float16", "int8"):
+        store.quantize(dtype).save(store_dir)
+    print("✅ Saved float16 / int8 copies of the embeddings (EMBEDDING_QUANTIZATION).")
+
+    # Metadata inverted index used to pre-filter vector search
+    MetadataIndex.build(store.columns).save(store_dir)
+    print("✅ Built metadata filter index (location, department, level, workplace type).")
+
+    # BM25 keyword index over the chunk text for hybrid retrieval
+    BM25Index.build(store.columns["data"]).save(store_dir)
+    print("✅ Built BM25 keyword index over chunk text.")
+
+    # IVF coarse quantizer for approximate search (IVF_NPROBE > 0)
+    if len(store):
+        store.build_ivf().save(store_dir)
+        print(f"✅ Built IVF index with {store.ivf_index.n_lists} cells.")
+
+    # New index version: answers cached against the old index are stale
+    mark_index_rebuilt(store_dir)
+
+
+def _report_stage(name, count, seconds):
+    print(f"✅ {name}: {count} chunks in {seconds:.2f} seconds ({count / max(seconds, 1e-9):.1f} chunks/s).")
+
+
+def generate_embedding_store(docs, store_dir=DEFAULT_STORE_DIR, batch_size=INGEST_EMBED_BATCH_SIZE,
+                             workers=INGEST_EMBED_WORKERS):
+    """
+    Build the matrix store straight from the docs' CSVs, without EvaDB:
+    chunks are encoded by embeddings.embed_corpus (length-bucketed batches
+    of batch_size, over `workers` encoder processes) and written directly
+    into the EmbeddingStore in store_dir, instead of going through
+    `CREATE TABLE all_jobs_features AS SELECT SentenceFeatureExtractor(data)`
+    and an export. Serves RETRIEVAL_BACKEND=matrix; the EvaDB tables are
+    not touched. Prints the throughput of every stage.
+    """
+    start = time.perf_counter()
+    columns = read_doc_rows(docs)
+    n = len(columns["data"])
+    _report_stage("Read CSVs", n, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    embeddings = embed_corpus(columns["data"], batch_size=batch_size, workers=workers)
+    _report_stage(f"Embedded (batch size {batch_size}, {corpus_workers(n, batch_size, workers)} workers)", n,
+                  time.perf_counter() - start)
+
+    start = time.perf_counter()
+    store = EmbeddingStore(
+        embeddings, columns, MetadataIndex.build(columns), BM25Index.build(columns["data"]),
+    )
+    if n:
+        store.build_ivf()
+    _report_stage("Built indexes", n, time.perf_counter() - start)
+
+    # Files are replaced atomically, so a server reading store_dir is not disturbed
+    start = time.perf_counter()
+    update_embedding_store(store, store_dir)
+    mark_index_rebuilt(store_dir)
+    _report_stage(f"Wrote {store_dir}", n, time.perf_counter() - start)
+    return store
+
+
+def chunk_hash(row):
+    """Content hash of one chunk row (a mapping with the HASHED_COLUMNS)."""
+    values = []
+    for column in HASHED_COLUMNS:
+        value = row[column]
+        values.append("" if value is None or value != value else str(value))  # None / NaN -> ""
+    return hashlib.sha256("\x1f".join(values).encode("utf-8")).hexdigest()
+
+
+def read_doc_rows(docs):
+    """The chunk rows of the docs' CSVs as ALL_JOBS_COLUMNS -> list of values."""
+    frames = [
+        pd.read_csv(f"data/palantir_careers/{doc}.csv", dtype=str, keep_default_na=False)
+        for doc in docs
+    ]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ALL_JOBS_COLUMNS)
+    df["chunk_id"] = df["chunk_id"].astype(int)
+    return {column: df[column].tolist() for column in ALL_JOBS_COLUMNS}
+
+
+def update_unified_vector_store(docs, store_dir=DEFAULT_STORE_DIR):
+    """
+    Incremental refresh of the matrix store in store_dir from the docs' CSVs.
+
+    Every chunk is keyed on its job_id plus a content hash. Chunks whose key
+    is already in the store keep their embedding, only new or changed chunks
+    are encoded, and chunks of postings that were closed (or of old versions
+    of changed ones) are dropped. The IVF index keeps its trained centroids,
+    so the cost of a refresh is proportional to the diff rather than the
+    corpus; run generate_unified_vector_store now and then to retrain it.
+
+    This updates the in-process "matrix" backend only: the EvaDB tables
+    (all_jobs, all_jobs_features and its FAISS index) are left as they are
+    until the next full build.
+    """
+    if not os.path.exists(os.path.join(store_dir, EMBEDDINGS_FILE)):
+        raise FileNotFoundError(f"No embedding store in {store_dir}; run a full build first.")
+    start_time = time.time()
+    old = EmbeddingStore.load(store_dir, mmap=False, quantization="none")
+    old_keys = {}
+    for row, job_id in enumerate(old.columns["job_id"]):
+        old_row = {column: old.columns[column][row] for column in HASHED_COLUMNS}
+        old_keys.setdefault((str(job_id), chunk_hash(old_row)), row)
+
+    columns = read_doc_rows(docs)
+    reuse_rows = np.full(len(columns["data"]), -1, dtype=np.int64)
+    for i in range(len(reuse_rows)):
+        row = {column: columns[column][i] for column in HASHED_COLUMNS}
+        reuse_rows[i] = old_keys.get((str(row["job_id"]), chunk_hash(row)), -1)
+
+    to_embed = np.flatnonzero(reuse_rows < 0)
+    removed = len(old) - len(set(reuse_rows[reuse_rows >= 0].tolist()))
+    closed = set(map(str, old.columns["job_id"])) - set(map(str, columns["job_id"]))
+    print(
+        f"Incremental refresh: {len(reuse_rows) - len(to_embed)} chunks unchanged, "
+        f"{len(to_embed)} new or changed, {removed} removed ({len(closed)} closed postings)."
+    )
+    if not len(to_embed) and not removed:
+        print("✅ Embedding store is up to date.")
+        return old
+
+    if len(to_embed):
+        new_embeddings = embed_corpus([columns["data"][i] for i in to_embed])
+    else:
+        new_embeddings = np.zeros((0, old.embeddings.shape[1]), dtype=np.float32)
+    store = old.apply_delta(columns, reuse_rows, new_embeddings)
+    update_embedding_store(store, store_dir)
+    mark_index_rebuilt(store_dir)
+    print(f"✅ Updated {store_dir} in {time.time() - start_time:.2f} seconds ({len(store)} chunks).")
+    return store
+
+
+def sanitize_eva_string(input_str: str) -> str:
+    """
+    Replace single quotes with double single-quotes
+    and remove newline characters, which can break EVA's parser.
+    """
+    # Replace any single quote ' with ''
+    sanitized = input_str.replace("'", "''")
+    # Replace or remove newline characters
+    sanitized = sanitized.replace("\n", " ")
+    return sanitized
+
+def similarity_search_query(text, columns, k, table="all_jobs_features", with_distance=False):
+    """
+    Build a top-k query that EvaDB can answer with the FAISS index.
+
+    The question is embedded once by SentenceFeatureExtractor('...') and compared
+    against the stored FEATURES_COLUMN. Ordering ascending (closest first) with a
+    LIMIT lets the optimizer turn this into an index scan, so only the k nearest
+    rows are read back instead of scoring every chunk.
+
+    with_distance also selects the Similarity(...) value (after `columns`),
+    see similarity_scores.
+    """
+    safe_text = sanitize_eva_string(text)
+    similarity = f"""Similarity(
+            SentenceFeatureExtractor('{safe_text}'),
+            {FEATURES_COLUMN}
+        )"""
+    select_list = ",\n            ".join(list(columns) + ([similarity] if with_distance else []))
+    return f"""
+        SELECT
+            {select_list}
+        FROM {table}
+        ORDER BY {similarity}
+        LIMIT {k};
+    """
+
+
+def distance_to_similarity(distance):
+    """
+    Cosine similarity from the squared L2 distance that EvaDB's Similarity
+    (faiss IndexFlatL2) returns. The embeddings are unit vectors, so
+    |a - b|^2 = 2 - 2 cos(a, b): the same score the matrix backend reports.
+    """
+    return 1.0 - float(distance) / 2.0
+
+
+def similarity_scores(df):
+    """Cosine scores of the rows of a with_distance similarity_search_query result."""
+    distance_columns = [c for c in df.columns if str(c).lower().endswith("distance")]
+    distances = df[distance_columns[0]] if distance_columns else df.iloc[:, -1]
+    return [distance_to_similarity(d) for d in distances]
+
 def table_exists(cursor, table_name: str) -> bool:
     df = cursor.query("SHOW TABLES;").df()  # no LIKE here!
     # 'name' is typically the column with the table names.
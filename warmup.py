@@ -0,0 +1,110 @@
+"""
+Background warm-up of the expensive parts of the server.
+
+Importing the pipeline (OpenAI SDK, instructor, pandas, evadb), loading the
+sentence encoder and opening the index take seconds. Rather than hold the
+server's startup until they are done, Warmup runs them as named steps on a
+daemon thread: /health answers immediately and reports progress, and
+endpoints that need the pipeline wait for it.
+
+Step timings double as an import-time profile of the running process: each
+"import <module>" step measures what that module added on top of the ones
+imported before it. (profile_imports.py gives a cold, per-module breakdown.)
+"""
+import asyncio
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def import_step(module_name):
+    """A warm-up step that imports module_name."""
+    return f"import {module_name}", lambda: importlib.import_module(module_name)
+
+
+class Warmup:
+    def __init__(self):
+        self.state = "pending"  # pending -> running -> ready | failed
+        self.steps = []  # [(name, seconds)] of the finished steps
+        self.current = None
+        self.error = None
+        self.seconds = None
+        self._done = threading.Event()
+        self._waiters = []  # [(loop, future)] of wait_async callers
+        self._lock = threading.Lock()
+
+    def start(self, steps):
+        """Run the (name, fn) steps in order on a background thread."""
+        self.state = "running"
+        threading.Thread(target=self.run, args=(steps,), name="warmup", daemon=True).start()
+
+    def run(self, steps):
+        self.state = "running"
+        start = time.perf_counter()
+        try:
+            for name, fn in steps:
+                self.current = name
+                step_start = time.perf_counter()
+                fn()
+                self.steps.append((name, time.perf_counter() - step_start))
+                logger.info(f"Warm-up: {name} took {self.steps[-1][1]:.2f} seconds.")
+        except Exception as e:
+            logger.exception(f"Warm-up failed during {self.current}")
+            self.error = f"{self.current}: {e}"
+            self.state = "failed"
+        else:
+            self.state = "ready"
+        finally:
+            self.current = None
+            self.seconds = time.perf_counter() - start
+            logger.info("Warm-up %s in %.2f seconds:\n%s", self.state, self.seconds, self.report())
+            with self._lock:
+                self._done.set()
+                waiters, self._waiters = self._waiters, []
+            for loop, future in waiters:
+                loop.call_soon_threadsafe(_resolve, future)
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def wait(self, timeout=None):
+        """Block until warm-up has finished; return True if it succeeded."""
+        self._done.wait(timeout)
+        return self.ready
+
+    async def wait_async(self):
+        """wait() for coroutines, without tying up a thread per waiting request."""
+        with self._lock:
+            if not self._done.is_set():
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            else:
+                future = None
+        if future is not None:
+            await asyncio.shield(future)
+        return self.ready
+
+    def report(self):
+        """The step timings as a table, slowest first."""
+        width = max((len(name) for name, _ in self.steps), default=4)
+        lines = [f"  {name:<{width}}  {seconds:8.3f}s" for name, seconds in sorted(self.steps, key=lambda s: -s[1])]
+        return "\n".join(lines)
+
+    def status(self):
+        return {
+            "state": self.state,
+            "current_step": self.current,
+            "steps": {name: round(seconds, 3) for name, seconds in self.steps},
+            "seconds": round(self.seconds, 3) if self.seconds is not None else None,
+            "error": self.error,
+        }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)